@@ -4,9 +4,9 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import Optional, List
-from pydantic import BaseModel, UUID4
+from pydantic import BaseModel, Field, UUID4
 from core.database import get_db
-from core.middleware import require_ai_company, require_publisher
+from core.middleware import publisher_keys, require_ai_company, require_publisher, require_publisher_key
 from core.models.access_tokens import AccessTokenStatus
 from .services import AccessTokenService
 import logging
@@ -33,6 +33,20 @@ class UsageRecord(BaseModel):
     is_success: bool
     error_message: Optional[str]
 
+class UsageEvent(BaseModel):
+    token: str
+    timestamp: float # Unix seconds
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    path: Optional[str] = None
+    ai_tokens_processed: int = 0
+    content_type: Optional[str] = None
+    content_size_bytes: Optional[int] = None
+
+class UsageReport(BaseModel):
+    publisher_id: str
+    events: List[UsageEvent] = Field(..., max_length=1000)
+
 @router.post("/company/{company_id}", response_model=TokenCreationResponse)
 async def create_company_token(
     company_id: str,
@@ -100,6 +114,85 @@ async def validate_token(
             detail="Error validating token"
         )
 
+def check_publisher(session: dict, publisher_id: str) -> None:
+    """Reject a publisher credential used for another publisher"""
+    if str(session["user_id"]) != str(publisher_id):
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized for this publisher"
+        )
+
+@router.post("/publisher/{publisher_id}/api-key")
+async def create_publisher_api_key(
+    publisher_id: str,
+    session: dict = Depends(require_publisher)
+):
+    """Issue the API key a publisher's edge middleware sends, revoking the previous one"""
+    check_publisher(session, publisher_id)
+    
+    try:
+        return {"api_key": await publisher_keys.create_key(publisher_id)}
+    
+    except Exception as e:
+        logger.error(f"Error issuing publisher API key: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error issuing API key"
+        )
+
+@router.get("/publisher/{publisher_id}/whitelist")
+async def get_publisher_whitelist(
+    publisher_id: str,
+    publisher: dict = Depends(require_publisher_key),
+    db: Session = Depends(get_db)
+):
+    """Get digests of a publisher's whitelisted tokens for edge middleware"""
+    check_publisher(publisher, publisher_id)
+    
+    try:
+        token_service = AccessTokenService(db)
+        digests = await token_service.get_publisher_token_digests(publisher_id)
+        
+        return {
+            "algorithm": "sha256",
+            "digests": digests
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting publisher whitelist: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error retrieving publisher whitelist"
+        )
+
+@router.post("/usage/report")
+async def report_usage(
+    report: UsageReport,
+    publisher: dict = Depends(require_publisher_key),
+    db: Session = Depends(get_db)
+):
+    """Record a batch of token usage events reported by edge middleware"""
+    check_publisher(publisher, report.publisher_id)
+    
+    try:
+        token_service = AccessTokenService(db)
+        recorded = await token_service.record_usage_batch(
+            publisher_id=report.publisher_id,
+            events=[event.model_dump() for event in report.events]
+        )
+        
+        return {
+            "status": "success",
+            "recorded": recorded
+        }
+        
+    except Exception as e:
+        logger.error(f"Error recording usage report: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error recording usage"
+        )
+
 @router.post("/publisher/{publisher_id}/block-company")
 async def block_company_access(
     publisher_id: str,
@@ -9,6 +9,8 @@ import jwt
 import json
 import redis
 import secrets
+import hashlib
+import uuid
 from redis.exceptions import RedisError
 from core.redis_client import RedisClientFactory
 from core.models.access_tokens import AccessToken, AccessTokenStatus, APIUsageRecord
@@ -18,6 +20,10 @@ from core.logging_config import get_logger, LogOperation
 logger = get_logger(__name__)
 settings = get_settings()
 
+def token_digest(token: str) -> str:
+    """Hex SHA-256 of an access token, as shared with edge middleware"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
 class AccessTokenService:
     def __init__(self, db: Session):
         self.db = db
@@ -25,7 +31,7 @@ class AccessTokenService:
         
         try: 
             # Initialize Redis connection
-            self.redis = RedisClientFactory.get_client()
+            self.redis = RedisClientFactory.get_async_client()
         except RedisError as e:
             logger.error(f"Failed to initialize Redis connection: {str(e)}")
             raise
@@ -104,7 +110,7 @@ class AccessTokenService:
                     return False
                 
                 # Use pipeline for atomic operations
-                with self.redis.pipeline() as pipe:
+                async with self.redis.pipeline() as pipe:
                     
                     # Add to publisher whitelist
                     whitelist_key = f"publisher:{publisher_id}:allowed_tokens"
@@ -118,7 +124,7 @@ class AccessTokenService:
                     }
                     pipe.set(token_info_key, json.dumps(access_data))
                     
-                    pipe.execute()
+                    await pipe.execute()
                     
                 logger.info("token_added_to_publisher", 
                           publisher_id=publisher_id, 
@@ -141,6 +147,14 @@ class AccessTokenService:
                            exc_info=True)
                 return False
     
+    async def get_publisher_token_digests(self, publisher_id: str) -> List[str]:
+        """
+        SHA-256 digests of the tokens in a publisher's whitelist, so edge
+        middleware can check tokens locally without holding the tokens
+        """
+        tokens = await self.redis.smembers(f"publisher:{publisher_id}:allowed_tokens")
+        return sorted(token_digest(token) for token in tokens)
+    
     async def remove_token_from_publisher(
         self,
         publisher_id: str,
@@ -151,10 +165,10 @@ class AccessTokenService:
         """
         try:
             # Remove from whitelist and clean up token info
-            pipe = self.redis.pipeline()
-            pipe.srem(f"publisher:{publisher_id}:allowed_tokens", token)
-            pipe.delete(f"publisher:{publisher_id}:token:{token}")
-            pipe.execute()
+            async with self.redis.pipeline() as pipe:
+                pipe.srem(f"publisher:{publisher_id}:allowed_tokens", token)
+                pipe.delete(f"publisher:{publisher_id}:token:{token}")
+                await pipe.execute()
             
             logger.info(f"Removed token from publisher {publisher_id} whitelist")
             return True
@@ -176,7 +190,7 @@ class AccessTokenService:
             try:
                 # Check if token exists in publisher's whitelist
                 whitelist_key = f"publisher:{publisher_id}:allowed_tokens"
-                if not self.redis.sismember(whitelist_key, token):
+                if not await self.redis.sismember(whitelist_key, token):
                     logger.warning("token_not_in_whitelist", 
                                  publisher_id=publisher_id, 
                                  token=token[:10])
@@ -220,7 +234,7 @@ class AccessTokenService:
                 "created_at": token.created_at.isoformat()
             }
 
-            self.redis.set(
+            await self.redis.set(
                 token_key,
                 json.dumps(token_data),
                 ex=30 * 24 * 60 * 60  # 30 days
@@ -235,7 +249,7 @@ class AccessTokenService:
         """Get token information from Redis cache"""
         try:
             token_key = f"token_info:{token}"
-            token_data = self.redis.get(token_key)
+            token_data = await self.redis.get(token_key)
             return json.loads(token_data) if token_data else None
         except Exception as e:
             logger.error(f"Error getting cached token info: {str(e)}")
@@ -250,7 +264,7 @@ class AccessTokenService:
         try:
             now = datetime.now(timezone.utc)
             
-            with self.redis.pipeline() as pipe:
+            async with self.redis.pipeline() as pipe:
                 
                 # Keys for different time windows
                 minute_key = f"rate_limits:{token}:{publisher_id}:minute:{now.strftime('%Y%m%d%H%M')}"
@@ -267,7 +281,7 @@ class AccessTokenService:
                 pipe.incr(monthly_key)
                 pipe.expire(monthly_key, 2592000)  # Expire after 30 days
                 
-                results = pipe.execute()
+                results = await pipe.execute()
             
             minute_count, _, daily_count, _, monthly_count, _ = results
 
@@ -350,6 +364,72 @@ class AccessTokenService:
                            error=str(e),
                            exc_info=True)
     
+    async def record_usage_batch(self, publisher_id: str, events: List[Dict]) -> int:
+        """ 
+        Record a batch of token usage events reported by edge middleware.
+        
+        Tokens are checked against the publisher's whitelist in one round
+        trip, resolved with one query, and all usage rows are written in
+        one commit. Events for tokens that are unknown or not whitelisted
+        for the publisher are skipped.
+        
+        Returns:
+            Number of usage records written
+        """
+        with LogOperation("record_usage_batch", publisher_id=publisher_id, count=len(events)):
+            try:
+                tokens = list({event['token'] for event in events})
+                if tokens:
+                    whitelisted = await self.redis.smismember(f"publisher:{publisher_id}:allowed_tokens", tokens)
+                    tokens = [token for token, allowed in zip(tokens, whitelisted) if allowed]
+                token_records = {
+                    record.token: record
+                    for record in self.db.query(AccessToken).filter(AccessToken.token.in_(tokens))
+                }
+                
+                publisher_uuid = uuid.UUID(str(publisher_id))
+                usage_records = []
+                for event in events:
+                    token_record = token_records.get(event['token'])
+                    if token_record is None:
+                        continue
+                    
+                    tokens_processed = event.get('ai_tokens_processed') or 0
+                    usage_records.append(APIUsageRecord(
+                        access_token_id=token_record.id,
+                        publisher_id=publisher_uuid,
+                        timestamp=datetime.fromtimestamp(event['timestamp'], timezone.utc),
+                        ip_address=event.get('ip_address'),
+                        user_agent=event.get('user_agent'),
+                        request_path=event.get('path'),
+                        ai_tokens_processed=tokens_processed,
+                        content_type=event.get('content_type'),
+                        content_size_bytes=event.get('content_size_bytes'),
+                        usage_metadata={"source": "edge"}
+                    ))
+                    token_record.total_api_requests += 1
+                    token_record.total_ai_tokens_processed += tokens_processed
+                
+                self.db.add_all(usage_records)
+                self.db.commit()
+                
+                skipped = len(events) - len(usage_records)
+                if skipped:
+                    logger.warning("usage_events_for_unknown_or_unlisted_tokens",
+                                 publisher_id=publisher_id,
+                                 skipped=skipped)
+                
+                return len(usage_records)
+            
+            except Exception as e:
+                self.db.rollback()
+                logger.error("usage_batch_recording_failed",
+                           publisher_id=publisher_id,
+                           count=len(events),
+                           error=str(e),
+                           exc_info=True)
+                raise
+    
     async def revoke_token(self, token_id: str) -> bool:
         """Revoke access token and remove from all publisher whitelists"""
         with LogOperation("revoke_token", token_id=token_id):
@@ -369,12 +449,12 @@ class AccessTokenService:
 
                 # Remove from all publisher whitelists
                 pattern = "publisher:*:allowed_tokens"
-                for key in self.redis.scan_iter(pattern):
-                    self.redis.srem(key, token.token)
+                async for key in self.redis.scan_iter(pattern):
+                    await self.redis.srem(key, token.token)
 
                 # Update cached token info
                 token_key = f"token_info:{token.token}"
-                self.redis.delete(token_key)
+                await self.redis.delete(token_key)
                 
                 logger.info("token_revoked", 
                           token_id=token_id, 
@@ -415,7 +495,3 @@ class AccessTokenService:
         except Exception as e:
             logger.error(f"Error getting token usage: {str(e)}")
             return []
-        
-    def __del__(self):
-        """Cleanup when the AccessTokenService is destroyed"""
-        RedisClientFactory.close_connection()
\ No newline at end of file
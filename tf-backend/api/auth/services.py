@@ -68,7 +68,7 @@ class AuthService:
                           user_id=str(user.id),
                           user_type=user_type)
                 try:
-                    session_id = self.session_manager.create_session(user_data)
+                    session_id = await self.session_manager.create_session(user_data)
                     logger.info("session_created", 
                               session_id=session_id,
                               user_id=str(user.id))
@@ -104,9 +104,9 @@ class AuthService:
         with LogOperation("logout", session_id=session_id):
             try: 
                 # Get session data before ending it for logging
-                session_data = self.session_manager.get_session(session_id)
+                session_data = await self.session_manager.get_session(session_id)
                 
-                if self.session_manager.end_session(session_id):
+                if await self.session_manager.end_session(session_id):
                     if session_data:
                         logger.info("logout_successful",
                                     session_id=session_id,
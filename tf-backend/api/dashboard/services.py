@@ -1,19 +1,25 @@
 # tf-backend/api/dashboard/services.py
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, cast, Integer
 from fastapi import HTTPException
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List
+from typing import Dict, List, Optional
 import json
+from redis.exceptions import RedisError
 from core.models.detection import RequestLog
 from core.models.publisher import Publisher
 from core.models.aicompany import AICompany
 from core.logging_config import get_logger, LogOperation
+from core.unique_ips import get_unique_ip_counter
 from core.models.payment import UsageRecord, UsageStatus, PaymentTransaction, PublisherStripeAccount, AICompanyPaymentAccount
 
 logger = get_logger(__name__)
 
+def weighted_count():
+    """Number of requests the matching RequestLog rows stand for"""
+    return cast(func.coalesce(func.sum(RequestLog.sample_weight), 0), Integer)
+
 class DashboardService:
     def __init__(self, db: Session):
         self.db = db
@@ -148,39 +154,37 @@ class DashboardService:
                 detail="Error retrieving user profile"
             )
     
-    async def get_publisher_stats(self, publisher_id: str, since: datetime) -> Dict:
+    async def get_publisher_stats(self, publisher_id: str, since: Optional[datetime] = None) -> Dict:
         """
-        Get basic statistics for a publisher
+        Get basic statistics for a publisher, over the last 24 hours by default
         """
         with LogOperation("get_publisher_stats", publisher_id=publisher_id):
             try:
                 now = datetime.now(timezone.utc)
-                last_24h = now - timedelta(hours=24)
-                last_hour = now - timedelta(hours=1)
+                if since is None:
+                    since = now - timedelta(hours=24)
                 
-                # Calculate basic stats
-                total_requests = self.db.query(RequestLog).filter(
+                # Calculate basic stats; non-bot rows are sampled, so
+                # requests are counted by their sample weights
+                total_requests = self.db.query(weighted_count()).filter(
                     RequestLog.publisher_id == publisher_id,
                     RequestLog.timestamp >= since
-                ).count()
+                ).scalar()
                 
-                bot_requests = self.db.query(RequestLog).filter(
+                bot_requests = self.db.query(weighted_count()).filter(
                     RequestLog.publisher_id == publisher_id,
                     RequestLog.timestamp >= since,
                     RequestLog.is_bot == True
-                ).count()
-                
-                unique_ips = self.db.query(func.count(func.distinct(RequestLog.ip_address))).filter(
-                    RequestLog.publisher_id == publisher_id,
-                    RequestLog.timestamp >= since,
                 ).scalar()
                 
-                active_threats = self.db.query(RequestLog).filter(
+                unique_ips = await self.get_unique_ips(publisher_id, since, now)
+                
+                active_threats = self.db.query(weighted_count()).filter(
                     RequestLog.publisher_id == publisher_id,
                     RequestLog.timestamp >= since,
                     RequestLog.is_bot == True,
                     RequestLog.confidence_score >= 0.8
-                ).count()
+                ).scalar()
                 
                 stats = {
                     "totalRequests": total_requests,
@@ -205,6 +209,24 @@ class DashboardService:
                            exc_info=True)
                 raise
     
+    async def get_unique_ips(self, publisher_id: str, since: datetime, until: datetime) -> int:
+        """
+        Approximate distinct IPs for a publisher from the hourly
+        HyperLogLogs (about 1% error, window rounded out to whole hours),
+        falling back to an exact count when Redis is unavailable
+        """
+        try:
+            return await get_unique_ip_counter().count(publisher_id, since, until)
+        except RedisError as e:
+            logger.warning("unique_ips_sketch_unavailable",
+                         publisher_id=publisher_id,
+                         error=str(e))
+        
+        return self.db.query(func.count(func.distinct(RequestLog.ip_address))).filter(
+            RequestLog.publisher_id == publisher_id,
+            RequestLog.timestamp >= since,
+        ).scalar()
+    
     async def get_publisher_time_series_data(self, publisher_id: str, since: datetime) -> List[Dict]:
         """ 
         Get time series data for a publisher
@@ -216,16 +238,16 @@ class DashboardService:
             hour_start = now - timedelta(hours=i+1)
             hour_end = now - timedelta(hours=i)
             
-            total = self.db.query(RequestLog).filter(
+            total = self.db.query(weighted_count()).filter(
                 RequestLog.publisher_id == publisher_id,
                 RequestLog.timestamp.between(hour_start, hour_end)
-            ).count()
+            ).scalar()
             
-            bots = self.db.query(RequestLog).filter(
+            bots = self.db.query(weighted_count()).filter(
                 RequestLog.publisher_id == publisher_id,
                 RequestLog.timestamp.between(hour_start, hour_end),
                 RequestLog.is_bot == True
-            ).count()
+            ).scalar()
             
             time_series.append({
                 "time": hour_start.strftime("%H:00"),
@@ -291,7 +313,7 @@ class DashboardService:
       
         bot_types = self.db.query(
             RequestLog.bot_name,
-            func.count(RequestLog.id).label('count')
+            weighted_count().label('count')
         ).filter(
             RequestLog.publisher_id == publisher_id,
             RequestLog.timestamp >= since,
@@ -0,0 +1,215 @@
+# tf-backend/api/detection/classifier.py
+
+from typing import Dict, List, Optional
+from core.logging_config import get_logger
+from core.metrics import get_stage_metrics
+from .utils import UserAgentAnalyzer, BotPatternIndex, BROWSER_HEADERS, get_pattern_index, timing_regularity
+from .utils import CrawlerRangeRegistry, get_crawler_ranges
+from .utils.timing import CONSISTENT_TIMING_CV
+from .utils.fingerprint import DISTRIBUTED_FINGERPRINT_IPS, header_order_fingerprint, header_names
+from .scoring import ScoringEngine, get_scoring_engine
+
+logger = get_logger(__name__)
+
+class RequestClassifier:
+    """
+    Detection checks that need nothing but the request and its timing
+    features, shared by BotDetectorService and the embeddable edge
+    middleware.
+
+    Checks only record the signals they find in detection_methods;
+    is_bot and confidence_score are set by the scoring engine in
+    finalize.
+    """
+
+    def __init__(self, ua_analyzer: Optional[UserAgentAnalyzer] = None,
+                 pattern_index: Optional[BotPatternIndex] = None,
+                 crawler_ranges: Optional[CrawlerRangeRegistry] = None,
+                 scoring: Optional[ScoringEngine] = None):
+        self.ua_analyzer = ua_analyzer or UserAgentAnalyzer()
+        self.pattern_index = pattern_index or get_pattern_index()
+        self.crawler_ranges = crawler_ranges or get_crawler_ranges()
+        self.scoring = scoring or get_scoring_engine()
+        self.metrics = get_stage_metrics()
+        self.BROWSER_HEADERS = BROWSER_HEADERS
+
+    def analyze_client(self, descriptor: Dict) -> Dict:
+        """
+        Run the checks that only depend on the request itself
+        (user agent and headers)
+        """
+        detection_results = {
+            'is_bot': False,
+            'confidence_score': 0.0,
+            'detection_methods': [],
+            'bot_name': None,
+            'bot_type': None,
+            'is_ai_crawler': False,
+            'crawler_verified': None,
+            'pattern_confidence': None,
+            'header_fingerprint': None,
+            'client_hints': None,
+            'client_info': None
+        }
+
+        user_agent = descriptor['user_agent']
+        metrics = self.metrics
+
+        # UA analysis
+        started = metrics.start()
+        client_info = self.ua_analyzer.analyze_user_agent(user_agent)
+        detection_results['client_info'] = client_info
+        metrics.observe("ua_parse", started)
+
+        logger.debug("user_agent_analysis_complete",
+                    is_bot=client_info['is_bot'],
+                    is_mobile=client_info['is_mobile'])
+
+        if client_info['is_bot']:
+            detection_results['detection_methods'].append('us_parser')
+            if detection_results['bot_type'] is None:
+                detection_results['bot_type'] = 'Generic Bot'
+
+        # 1. Check known patterns
+        started = metrics.start()
+        self.check_known_patterns(user_agent, detection_results)
+        metrics.observe("pattern_match", started)
+
+        started = metrics.start()
+        self.verify_crawler_ip(descriptor['ip'], detection_results)
+        metrics.observe("crawler_ip", started)
+
+        # 2. Analyze browser fingerprint
+        started = metrics.start()
+        self.analyze_browser_fingerprint(descriptor['headers'], detection_results, client_info)
+        detection_results['header_fingerprint'], detection_results['client_hints'] = \
+            self.fingerprint(descriptor, client_info)
+        metrics.observe("fingerprint", started)
+
+        return detection_results
+
+    def fingerprint(self, descriptor: Dict, client_info: Optional[Dict] = None):
+        """
+        Header-order fingerprint of a request
+
+        Returns:
+            Tuple of (64-bit fingerprint as hex, client hint state)
+        """
+        if client_info is None:
+            client_info = self.ua_analyzer.analyze_user_agent(descriptor['user_agent'])
+        return header_order_fingerprint(header_names(descriptor), descriptor['headers'], client_info)
+
+    def check_known_patterns(self, user_agent: str, results: Dict):
+        """
+        Checks user agent against known bot patterns
+        """
+
+        matches = self.pattern_index.match(user_agent)
+        if not matches:
+            return
+
+        # Matches are ordered most specific first
+        best = matches[0]
+        results['detection_methods'].append('known_pattern')
+        results['pattern_confidence'] = best.confidence
+        results['bot_name'] = best.company
+        results['bot_type'] = best.type
+
+        if best.type == 'AI Training':
+            results['is_ai_crawler'] = True
+            results['detection_methods'].append('ai_crawler')
+
+        logger.info("known_bot_pattern_matched",
+                  pattern=best.pattern,
+                  company=best.company,
+                  type=best.type,
+                  confidence=best.confidence,
+                  matched_patterns=[match.pattern for match in matches])
+
+    def verify_crawler_ip(self, ip: str, results: Dict):
+        """
+        Check a claimed crawler's IP against its operator's published ranges
+        """
+        operator = results['bot_name']
+        if operator is None:
+            return
+
+        verified = self.crawler_ranges.verify(ip, operator)
+        results['crawler_verified'] = verified
+
+        if verified is True:
+            results['detection_methods'].append('verified_crawler_ip')
+        elif verified is False:
+            # Claims a crawler whose ranges we know, from somewhere else
+            results['detection_methods'].append('crawler_ip_mismatch')
+            logger.info("crawler_ip_mismatch",
+                      ip=ip,
+                      claimed_operator=operator)
+
+    def analyze_browser_fingerprint(self, headers: Dict, results: Dict, client_info: Dict):
+        """
+        Analyze browser fingerprint for bot-like characteristics
+        """
+        # Check if this is an API call vs browser request
+        is_api_call = headers.get('content-type') == 'application/json'
+
+        if not is_api_call:
+
+            missing_headers = [header for header in self.BROWSER_HEADERS
+                            if header not in headers]
+
+            if len(missing_headers) >= 5:
+                results['detection_methods'].append('browser_fingerprint')
+
+        if client_info['is_mobile']:
+            if 'sec-ch-ua-mobile' in headers and headers['sec-ch-ua-mobile'] != '?1':
+                results['detection_methods'].append('mobile_mismatch')
+
+    def evaluate_request_patterns(self, features: Dict, results: Dict):
+        """
+        Score request rate and timing regularity from streaming timing features
+        """
+        requests_per_second = features.get('requests_per_second')
+
+        # Only set when there are enough requests to judge
+        if requests_per_second is not None and requests_per_second > 10:
+            results['detection_methods'].append('high_frequency')
+            logger.info("high_frequency_detected",
+                      requests_per_second=requests_per_second)
+
+        # Near-constant intervals, tolerant of scheduler and network jitter
+        interval_cv = features.get('interval_cv')
+        if interval_cv is not None and interval_cv <= CONSISTENT_TIMING_CV:
+            results['detection_methods'].append('consistent_timing')
+            logger.info("consistent_timing_detected",
+                      interval=features.get('interval_mean'),
+                      interval_cv=interval_cv,
+                      regularity=timing_regularity(interval_cv))
+
+        # One HTTP stack spread over many IPs. Popular browsers share
+        # fingerprints too, so only requests that don't look like a
+        # browser count
+        fingerprint_ips = features.get('fingerprint_ips')
+        if fingerprint_ips is not None and fingerprint_ips >= DISTRIBUTED_FINGERPRINT_IPS:
+            hints = results.get('client_hints')
+            if 'browser_fingerprint' in results['detection_methods'] or hints not in (None, 'n', 'c'):
+                results['detection_methods'].append('distributed_fingerprint')
+                logger.info("distributed_fingerprint_detected",
+                          fingerprint=results.get('header_fingerprint'),
+                          distinct_ips=fingerprint_ips,
+                          distinct_publishers=features.get('fingerprint_publishers'),
+                          client_hints=hints)
+
+    def finalize(self, detection_results: Dict) -> Dict:
+        """Score recorded signals into a verdict"""
+        started = self.metrics.start()
+        detection_results = self.scoring.score(detection_results)
+        self.metrics.observe("scoring", started)
+        return detection_results
+
+    def finalize_batch(self, batch: List[Dict]) -> List[Dict]:
+        """Score a batch of recorded signals with one matrix operation"""
+        started = self.metrics.start()
+        batch = self.scoring.score_results(batch)
+        self.metrics.observe("scoring_batch", started)
+        return batch
@@ -0,0 +1,302 @@
+# tf-backend/api/detection/leaderboard.py
+
+"""
+Per-publisher leaderboard of high-risk IPs.
+
+Each bot verdict adds its confidence to the IP's risk score, and the
+score decays exponentially with a configurable half-life. Decay is
+applied forward: an observation at time t is stored as
+log(confidence) + lambda * t and merged into the member's score with
+log-add-exp. Every member decays at the same rate, so the sorted set
+order is the decayed order at any time and nothing is rewritten as time
+passes. The decayed score at time now is exp(stored - lambda * now).
+
+Keys:
+
+    high_risk_ips:{publisher}          sorted set of IPs by stored score
+    high_risk_ips:{publisher}:details  hash of IP to JSON details
+    high_risk_ips:publishers           set of publishers with a board
+
+Top-K reads are one ZREVRANGE and one HMGET, O(log n + K). Boards are
+capped at max_size members, dropping the lowest scores. A background
+sweep removes members whose decayed score fell below min_score, a
+bounded number per board per pass.
+"""
+
+import asyncio
+import ipaddress
+import json
+import math
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+import redis.asyncio
+from redis.exceptions import RedisError
+from core.config import get_settings
+from core.logging_config import get_logger
+from core.redis_client import RedisClientFactory
+
+logger = get_logger(__name__)
+
+PUBLISHERS_KEY = "high_risk_ips:publishers"
+
+# Fold one bot verdict into an IP's decayed risk score and details.
+#
+# KEYS[1] leaderboard, KEYS[2] details hash, KEYS[3] publisher set
+# ARGV[1] IP, ARGV[2] timestamp, ARGV[3] decay rate (1/s),
+# ARGV[4] confidence, ARGV[5] publisher, ARGV[6] max board size,
+# ARGV[7] bot name, ARGV[8] bot type
+#
+# Returns the stored score as a string.
+RISK_UPDATE_LUA = """
+local ts = tonumber(ARGV[2])
+local confidence = tonumber(ARGV[4])
+local score = math.log(confidence) + tonumber(ARGV[3]) * ts
+
+local current = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if current then
+    current = tonumber(current)
+    local high, low = math.max(current, score), math.min(current, score)
+    score = high + math.log(1 + math.exp(low - high))
+end
+score = string.format('%.17g', score)
+redis.call('ZADD', KEYS[1], score, ARGV[1])
+
+local details = {detections = 0, max_confidence = 0}
+local stored = redis.call('HGET', KEYS[2], ARGV[1])
+if stored then
+    local ok, decoded = pcall(cjson.decode, stored)
+    if ok and type(decoded) == 'table' then
+        details = decoded
+    end
+end
+details.detections = (details.detections or 0) + 1
+details.last_seen = ts
+details.confidence = confidence
+details.max_confidence = math.max(details.max_confidence or 0, confidence)
+if ARGV[7] ~= '' then
+    details.bot_name = ARGV[7]
+end
+if ARGV[8] ~= '' then
+    details.bot_type = ARGV[8]
+end
+redis.call('HSET', KEYS[2], ARGV[1], cjson.encode(details))
+redis.call('SADD', KEYS[3], ARGV[5])
+
+-- Adds are one member at a time, so the overflow is small
+local overflow = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[6])
+if overflow > 0 then
+    local dropped = redis.call('ZRANGE', KEYS[1], 0, overflow - 1)
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, overflow - 1)
+    redis.call('HDEL', KEYS[2], unpack(dropped))
+end
+
+return score
+"""
+
+# Remove up to a batch of members whose stored score is below the
+# cutoff, forgetting the board once it is empty.
+#
+# KEYS[1] leaderboard, KEYS[2] details hash, KEYS[3] publisher set
+# ARGV[1] stored score cutoff, ARGV[2] batch size, ARGV[3] publisher
+#
+# Returns the number of members removed.
+RISK_SWEEP_LUA = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #stale > 0 then
+    redis.call('ZREM', KEYS[1], unpack(stale))
+    redis.call('HDEL', KEYS[2], unpack(stale))
+end
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('DEL', KEYS[2])
+    redis.call('SREM', KEYS[3], ARGV[3])
+end
+return #stale
+"""
+
+def leaderboard_keys(publisher_id: str) -> List[str]:
+    board = f"high_risk_ips:{publisher_id}"
+    return [board, f"{board}:details", PUBLISHERS_KEY]
+
+def _in_network(ip: str, network) -> bool:
+    try:
+        return ipaddress.ip_address(ip) in network
+    except ValueError:
+        return False
+
+class RiskLeaderboard:
+    """Decayed risk leaderboards of IPs, one per publisher"""
+
+    def __init__(self, client: redis.asyncio.Redis, half_life: float = 3600.0,
+                 max_size: int = 10000, min_score: float = 0.05,
+                 sweep_interval: float = 60.0, sweep_batch: int = 500):
+        """
+        Args:
+            client: Async Redis client
+            half_life: Seconds for a risk score to halve
+            max_size: Most IPs kept per publisher
+            min_score: Decayed score below which an IP is stale
+            sweep_interval: Seconds between stale sweeps
+            sweep_batch: Most IPs removed per publisher per sweep
+        """
+        self.client = client
+        self.decay_rate = math.log(2) / half_life
+        self.max_size = max_size
+        self.min_score = min_score
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+
+        self._update = client.register_script(RISK_UPDATE_LUA)
+        self._sweep = client.register_script(RISK_SWEEP_LUA)
+        self._task: Optional[asyncio.Task] = None
+
+    async def record(self, client, publisher_id: str, ip: str, results: Dict, timestamp: float):
+        """
+        Add a bot verdict to an IP's risk score, or queue it when given a
+        pipeline. Verdicts that are not bots or have no confidence are
+        ignored.
+        """
+        confidence = results.get('confidence_score') or 0.0
+        if not results.get('is_bot') or confidence <= 0:
+            return None
+
+        return await self._update(
+            keys=leaderboard_keys(publisher_id),
+            args=[
+                ip, timestamp, self.decay_rate, confidence, publisher_id, self.max_size,
+                results.get('bot_name') or "", results.get('bot_type') or ""
+            ],
+            client=client
+        )
+
+    async def top(self, publisher_id: str, limit: int = 50, min_confidence: float = 0.0,
+                  now: Optional[float] = None) -> List[Dict]:
+        """
+        Highest-risk IPs for a publisher, most risky first
+
+        Args:
+            publisher_id: Unique identifier for the publisher
+            limit: Most IPs to return
+            min_confidence: Leave out IPs whose highest confidence is lower
+            now: Time to decay scores to, the current time by default
+
+        Returns:
+            List of IPs with their decayed risk score and latest verdict
+        """
+        now = time.time() if now is None else now
+        offset = self.decay_rate * now
+        board, details_key, _ = leaderboard_keys(publisher_id)
+
+        # Read a page at a time, so filtered-out IPs only cost another page
+        risky = []
+        start = 0
+        while len(risky) < limit:
+            members = await self.client.zrevrange(board, start, start + limit - 1, withscores=True)
+            if not members:
+                break
+            details = await self.client.hmget(details_key, [ip for ip, _ in members])
+
+            for (ip, stored), raw in zip(members, details):
+                info = json.loads(raw) if raw else {}
+                if info.get('max_confidence', 0.0) < min_confidence:
+                    continue
+                risky.append({
+                    "ip": ip,
+                    "risk_score": round(math.exp(stored - offset), 4),
+                    "detections": info.get('detections', 0),
+                    "confidence": info.get('confidence'),
+                    "max_confidence": info.get('max_confidence'),
+                    "bot_name": info.get('bot_name'),
+                    "bot_type": info.get('bot_type'),
+                    "last_seen": info.get('last_seen')
+                })
+                if len(risky) == limit:
+                    break
+
+            if len(members) < limit:
+                break
+            start += limit
+
+        return risky
+
+    async def forget(self, publisher_id: str, network) -> int:
+        """
+        Remove a publisher's IPs within a network, for reports that they
+        were wrongly flagged
+
+        Args:
+            publisher_id: Unique identifier for the publisher
+            network: ipaddress network to clear
+
+        Returns:
+            Number of IPs removed
+        """
+        board, details_key, _ = leaderboard_keys(publisher_id)
+        if network.num_addresses == 1:
+            ips = [str(network.network_address)]
+        else:
+            ips = [ip for ip in await self.client.zrange(board, 0, -1)
+                   if _in_network(ip, network)]
+        if not ips:
+            return 0
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zrem(board, *ips)
+            pipe.hdel(details_key, *ips)
+            removed, _ = await pipe.execute()
+        return removed
+
+    async def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Remove stale IPs from every board, at most sweep_batch per board
+
+        Returns:
+            Number of IPs removed
+        """
+        now = time.time() if now is None else now
+        cutoff = repr(math.log(self.min_score) + self.decay_rate * now)
+
+        removed = 0
+        async for publisher_id in self.client.sscan_iter(PUBLISHERS_KEY, count=100):
+            removed += await self._sweep(
+                keys=leaderboard_keys(publisher_id),
+                args=[cutoff, self.sweep_batch, publisher_id]
+            )
+        return removed
+
+    async def start(self) -> None:
+        """Run the stale sweep in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info("high_risk_ips_swept", removed=removed)
+            except RedisError as e:
+                logger.error("redis_error_sweeping_high_risk_ips",
+                            error=str(e))
+
+@lru_cache()
+def get_risk_leaderboard() -> RiskLeaderboard:
+    """Process-wide risk leaderboard on the detection state Redis client"""
+    settings = get_settings()
+    return RiskLeaderboard(
+        RedisClientFactory.get_detection_client(),
+        half_life=settings.HIGH_RISK_HALF_LIFE,
+        max_size=settings.HIGH_RISK_MAX_IPS,
+        min_score=settings.HIGH_RISK_MIN_SCORE,
+        sweep_interval=settings.HIGH_RISK_SWEEP_INTERVAL
+    )
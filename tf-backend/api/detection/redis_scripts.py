@@ -0,0 +1,249 @@
+# tf-backend/api/detection/redis_scripts.py
+
+"""
+Server-side Lua scripts for the per-request detection state in Redis.
+
+Request timing for a publisher and IP lives at requests:{publisher}:{ip}
+as a hash of streaming estimator state (see utils/timing.py for the
+recurrences):
+
+    n     requests seen
+    last  latest request timestamp
+    c, t  decayed request count and decayed elapsed time
+    mean  mean inter-arrival interval
+    var   variance of inter-arrival intervals
+
+Older deployments stored the same key as a list of JSON entries or as a
+string of packed timestamps. Those keys are converted the first time a
+script touches them by replaying their timestamps into a hash.
+
+Each header-order fingerprint (see utils/fingerprint.py) has two
+HyperLogLogs counting the distinct IPs and publishers it was seen from,
+at fingerprint_ips:{fingerprint} and fingerprint_publishers:{fingerprint}.
+Each takes at most 12KB however much traffic it sees, and idle
+fingerprints expire.
+"""
+
+from typing import Dict, Optional, Tuple
+import redis.asyncio
+from .utils.timing import timing_features
+
+_TIMING_STATE_LUA = """
+local function fmt(x)
+    return string.format('%.17g', x)
+end
+
+local function update(state, ts, rate_window, window)
+    if state.n == 0 then
+        state.n = 1
+        state.last = ts
+        state.c = 1
+        return
+    end
+
+    local interval = ts - state.last
+    if interval < 0 then
+        interval = 0
+    else
+        state.last = ts
+    end
+
+    local decay = math.exp(-interval / rate_window)
+    state.c = state.c * decay + 1
+    state.t = state.t * decay + interval
+
+    local weight = 1 / math.min(state.n, window)
+    local delta = interval - state.mean
+    state.mean = state.mean + weight * delta
+    state.var = (1 - weight) * (state.var + weight * delta * delta)
+
+    state.n = state.n + 1
+end
+
+local function legacy_timestamps(key, kind)
+    local timestamps = {}
+    if kind == 'list' then
+        local entries = redis.call('LRANGE', key, 0, -1)
+        for i = #entries, 1, -1 do
+            local ok, entry = pcall(cjson.decode, entries[i])
+            if ok and type(entry) == 'table' and tonumber(entry['timestamp']) then
+                timestamps[#timestamps + 1] = tonumber(entry['timestamp'])
+            end
+        end
+    else
+        local data = redis.call('GET', key)
+        for pos = 1, #data - 7, 8 do
+            timestamps[#timestamps + 1] = struct.unpack('<d', data, pos)
+        end
+    end
+    return timestamps
+end
+
+-- Returns the state and, for converted legacy keys, their remaining TTL
+local function load_state(key, rate_window, window)
+    local state = {n = 0, last = 0, c = 0, t = 0, mean = 0, var = 0}
+    local kind = redis.call('TYPE', key)['ok']
+
+    if kind == 'hash' then
+        local v = redis.call('HMGET', key, 'n', 'last', 'c', 't', 'mean', 'var')
+        state.n = tonumber(v[1]) or 0
+        state.last = tonumber(v[2]) or 0
+        state.c = tonumber(v[3]) or 0
+        state.t = tonumber(v[4]) or 0
+        state.mean = tonumber(v[5]) or 0
+        state.var = tonumber(v[6]) or 0
+    elseif kind == 'list' or kind == 'string' then
+        local ttl = redis.call('TTL', key)
+        local timestamps = legacy_timestamps(key, kind)
+        redis.call('DEL', key)
+        for _, ts in ipairs(timestamps) do
+            update(state, ts, rate_window, window)
+        end
+        return state, ttl
+    end
+
+    return state, nil
+end
+
+local function save_state(key, state, ttl)
+    redis.call('HSET', key,
+        'n', state.n, 'last', fmt(state.last), 'c', fmt(state.c),
+        't', fmt(state.t), 'mean', fmt(state.mean), 'var', fmt(state.var))
+    if ttl and ttl > 0 then
+        redis.call('EXPIRE', key, ttl)
+    end
+end
+"""
+
+# Fold the new request into the timing state, read the IP reputation
+# and, when given fingerprint sketch keys, add the IP and publisher to the
+# header fingerprint's HyperLogLogs, all in one round trip.
+#
+# KEYS[1] request timing hash, KEYS[2] IP reputation,
+# KEYS[3] fingerprint IP sketch, KEYS[4] fingerprint publisher sketch
+# (optional)
+# ARGV[1] request timestamp, ARGV[2] rate window (s),
+# ARGV[3] timing window (intervals), ARGV[4] state TTL (s),
+# ARGV[5] IP, ARGV[6] publisher, ARGV[7] sketch TTL (s)
+#
+# Returns {n, c, t, mean, var, reputation[, fingerprint IPs, fingerprint
+# publishers]}. Floats are returned as strings since Redis truncates Lua
+# numbers to integers.
+DETECTION_STATE_LUA = _TIMING_STATE_LUA + """
+local rate_window = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+
+local state = load_state(KEYS[1], rate_window, window)
+update(state, tonumber(ARGV[1]), rate_window, window)
+save_state(KEYS[1], state, tonumber(ARGV[4]))
+
+local reputation = redis.call('GET', KEYS[2])
+local reply = {state.n, fmt(state.c), fmt(state.t), fmt(state.mean), fmt(state.var), reputation}
+
+if #KEYS >= 4 then
+    local sketch_ttl = tonumber(ARGV[7])
+    for i = 3, 4 do
+        -- PFCOUNT on an unmodified sketch is served from its cached cardinality
+        if redis.call('PFADD', KEYS[i], ARGV[i + 2]) == 1 or redis.call('TTL', KEYS[i]) < 0 then
+            redis.call('EXPIRE', KEYS[i], sketch_ttl)
+        end
+        reply[i + 4] = redis.call('PFCOUNT', KEYS[i])
+    end
+end
+
+return reply
+"""
+
+# Convert one legacy history key (JSON list or packed timestamps) into a
+# timing hash, keeping its TTL.
+#
+# KEYS[1] request timing key
+# ARGV[1] rate window (s), ARGV[2] timing window (intervals)
+#
+# Returns the number of requests replayed, or -1 if the key was already a
+# hash or missing.
+MIGRATE_HISTORY_LUA = _TIMING_STATE_LUA + """
+local kind = redis.call('TYPE', KEYS[1])['ok']
+if kind ~= 'list' and kind ~= 'string' then
+    return -1
+end
+
+local state, ttl = load_state(KEYS[1], tonumber(ARGV[1]), tonumber(ARGV[2]))
+if state.n > 0 then
+    save_state(KEYS[1], state, ttl)
+end
+return state.n
+"""
+
+# Store a new reputation record and return the one it replaced.
+#
+# A crawler verification result in the previous record is carried over
+# when the new record has none, so a request that was scored before a
+# background DNS check finished cannot erase its outcome.
+#
+# KEYS[1] IP reputation
+# ARGV[1] reputation record (JSON), ARGV[2] TTL (s)
+REPUTATION_UPDATE_LUA = """
+local previous = redis.call('GET', KEYS[1])
+local record = ARGV[1]
+
+if previous then
+    local ok, old = pcall(cjson.decode, previous)
+    if ok and type(old) == 'table' and type(old['crawler_verified']) == 'boolean' then
+        local new = cjson.decode(record)
+        if new['crawler_verified'] == nil then
+            new['crawler_verified'] = old['crawler_verified']
+            new['verified_operator'] = old['verified_operator']
+            if old['crawler_verified'] then
+                new['score'] = 1.0
+            end
+            record = cjson.encode(new)
+        end
+    end
+end
+
+redis.call('SET', KEYS[1], record, 'EX', tonumber(ARGV[2]))
+return previous
+"""
+
+class DetectionScripts:
+    """
+    Detection scripts registered against a Redis client.
+
+    Scripts are invoked with EVALSHA and loaded into the server on the
+    first NOSCRIPT reply, so each script body is sent at most once per
+    server restart.
+    """
+
+    def __init__(self, client: redis.asyncio.Redis):
+        self.client = client
+        self.detection_state = client.register_script(DETECTION_STATE_LUA)
+        self.reputation_update = client.register_script(REPUTATION_UPDATE_LUA)
+
+_scripts: Optional[DetectionScripts] = None
+
+def get_detection_scripts(client: redis.asyncio.Redis) -> DetectionScripts:
+    """Scripts for a client, registered once per client instance"""
+    global _scripts
+    if _scripts is None or _scripts.client is not client:
+        _scripts = DetectionScripts(client)
+    return _scripts
+
+def parse_detection_state(reply) -> Tuple[Dict, Optional[str]]:
+    """
+    Convert a detection state script reply into timing features (with
+    fingerprint_ips and fingerprint_publishers when the sketches were
+    updated) and the raw reputation record.
+    """
+    count, decayed_count, decayed_time, interval_mean, interval_var, reputation = reply[:6]
+    features = timing_features(
+        int(count),
+        float(decayed_count),
+        float(decayed_time),
+        float(interval_mean),
+        float(interval_var)
+    )
+    if len(reply) >= 8:
+        features['fingerprint_ips'] = int(reply[6])
+        features['fingerprint_publishers'] = int(reply[7])
+    return features, reputation
@@ -1,12 +1,16 @@
 # tf-backend/api/detection/routes.py
 
-from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi import APIRouter, Depends, Request, HTTPException, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import Dict
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+from core.cache import thaw
 from core.database import get_db
-from pydantic import BaseModel
+from core.middleware import require_publisher, require_publisher_key
+from pydantic import BaseModel, Field
 from .services import BotDetectorService
+from .utils import get_ua_cache, get_verdict_cache, get_pattern_registry, get_allowlist
 import logging
 
 router = APIRouter(prefix="/api/detection", tags=["detection"])
@@ -14,7 +18,48 @@ logger = logging.getLogger(__name__)
 
 class DetectionRequest(BaseModel):
     publisher_id: str
+
+class RequestDescriptor(BaseModel):
+    ip: str
+    user_agent: Optional[str] = None
+    headers: Dict[str, str] = {}
+    path: str = "/"
+    method: str = "GET"
+    timestamp: Optional[float] = None # Unix seconds, defaults to time received
+
+class BatchDetectionRequest(BaseModel):
+    publisher_id: str
+    requests: List[RequestDescriptor] = Field(..., max_length=1000)
+
+class ReportedDetection(BaseModel):
+    ip: str
+    user_agent: str = ""
+    path: str = "/"
+    method: str = "GET"
+    timestamp: float # Unix seconds
+    is_bot: bool
+    is_ai_crawler: bool = False
+    bot_name: Optional[str] = None
+    bot_type: Optional[str] = None
+    confidence_score: float = 0.0
+    detection_methods: List[str] = []
+
+class DetectionReport(BaseModel):
+    publisher_id: str
+    detections: List[ReportedDetection] = Field(..., max_length=1000)
+
+class AllowlistUpdate(BaseModel):
+    add: List[str] = Field([], max_length=10000)
+    remove: List[str] = Field([], max_length=10000)
     
+def check_publisher(session: dict, publisher_id: str) -> None:
+    """Reject a publisher acting on another publisher's detection data"""
+    if str(session["user_id"]) != publisher_id:
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized to manage this publisher"
+        )
+
 @router.post("")
 async def detect_bot(request: Request, detection_request: DetectionRequest, db: Session = Depends(get_db)) -> Dict:
     """
@@ -35,12 +80,72 @@ async def detect_bot(request: Request, detection_request: DetectionRequest, db:
         results = await detector.analyze_request(request, detection_request.publisher_id)
         return {
             "status": "success",
-            "results": results,
+            "results": thaw(results),
         }
     except Exception as e:
         logger.error(f"Error in bot detection: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
+@router.post("/batch")
+async def detect_bot_batch(batch_request: BatchDetectionRequest, db: Session = Depends(get_db)) -> Dict:
+    """
+    Endpoint to analyze a batch of buffered requests for bot behavior
+    Args:
+        batch_request: Publisher ID and up to 1,000 request descriptors
+        db: Database session dependency
+    
+    Returns:
+        Dict containing one detection result per descriptor, in order
+        
+    Raises:
+        HTTPException: If there's an error in bot detection
+    """
+    try:
+        detector = BotDetectorService(db)
+        results = await detector.analyze_batch(
+            [descriptor.model_dump() for descriptor in batch_request.requests],
+            batch_request.publisher_id
+        )
+        return {
+            "status": "success",
+            "results": thaw(results),
+        }
+    except Exception as e:
+        logger.error(f"Error in batch bot detection: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
+@router.post("/report")
+async def report_detections(report: DetectionReport,
+                            publisher: dict = Depends(require_publisher_key),
+                            db: Session = Depends(get_db)) -> Dict:
+    """
+    Endpoint for edge middleware to upload detections it already made
+    Args:
+        report: Publisher ID and up to 1,000 detection results
+        publisher: Publisher identified by the request's API key
+        db: Database session dependency
+    
+    Returns:
+        Dict containing the number of detections recorded
+        
+    Raises:
+        HTTPException: If the detections could not be recorded
+    """
+    check_publisher(publisher, report.publisher_id)
+    try:
+        detector = BotDetectorService(db)
+        recorded = await detector.record_reported_detections(
+            [detection.model_dump() for detection in report.detections],
+            report.publisher_id
+        )
+        return {
+            "status": "success",
+            "recorded": recorded,
+        }
+    except Exception as e:
+        logger.error(f"Error recording reported detections: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
 @router.get("/stats/{publisher_id}")
 async def get_detection_stats(publisher_id: str, time_range: str = "24h", db: Session = Depends(get_db)) -> Dict:
     """ 
@@ -94,53 +199,135 @@ async def get_ip_reputation(ip_address: str,db: Session = Depends(get_db)) -> Di
         )
 
 @router.get("/bot-patterns")
-async def get_known_patterns(db: Session = Depends(get_db)) -> Dict:
+async def get_known_patterns(request: Request) -> Response:
     """ 
     Get list of known bot patterns and their details.
     
+    Served from the worker's current pattern snapshot. The ETag changes
+    with the pattern version, and a matching If-None-Match gets a 304.
+    
+    Args:
+        request: The incoming FastAPI request
+        
+    Returns:
+        JSON response containing the known bot patterns and their version
+    """
+    snapshot = get_pattern_registry().snapshot
+    headers = {"ETag": snapshot.etag}
+    
+    if snapshot.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    return JSONResponse(
+        content={
+            "version": snapshot.version,
+            "patterns": {pattern: dict(info) for pattern, info in snapshot.patterns.items()}
+        },
+        headers=headers
+    )
+
+@router.get("/cache-stats")
+async def get_cache_stats() -> Dict:
+    """ 
+    Get hit, miss and eviction counters for the detection caches.
+    
+    Returns:
+        Dict containing stats for each in-process cache
+    """
+    verdict_cache = get_verdict_cache()
+    return {
+        "user_agent": get_ua_cache().stats(),
+        "verdict": verdict_cache.stats() if verdict_cache is not None else None
+    }
+
+@router.post("/report-false-positive")
+async def report_false_positive(request: Request, ip_address: str, publisher_id: str,
+                                session: dict = Depends(require_publisher),
+                                db: Session = Depends(get_db)) -> Dict:
+    """
+    Report a false positive detection.
+    
     Args:
+        request: The incoming FastAPI request
+        ip_address: IP address or CIDR range that was wrongly identified,
+            no broader than /16 for IPv4 or /48 for IPv6
+        publisher_id: Publisher reporting it; the range is added to its allowlist
+        session: Session of the publisher
         db: Database session dependency
         
     Returns:
-        Dict containing known bot patterns
+        Dict containing confirmation of report
     """
+    check_publisher(session, publisher_id)
     try:
         detector = BotDetectorService(db)
+        cleared = await detector.handle_false_positive(ip_address, publisher_id)
         return {
-            "patterns": detector.KNOWN_BOT_PATTERNS
+            "status": "success",
+            "message": "False positive report recorded",
+            **cleared
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error getting known patterns: {e}")
+        logger.error(f"Error reporting false positive: {e}")
         raise HTTPException(
             status_code=500,
-            detail="Error retrieving known bot patterns"
+            detail="Error recording false positive report"
         )
 
-@router.post("/report-false-positive")
-async def report_false_positive(request: Request, ip_address: str, db: Session = Depends(get_db)) -> Dict:
+@router.get("/allowlist/{publisher_id}")
+async def get_allowlist_entries(publisher_id: str, session: dict = Depends(require_publisher)) -> Dict:
     """
-    Report a false positive detection.
+    Get a publisher's allowlist.
     
     Args:
-        request: The incoming FastAPI request
-        ip_address: IP address that was wrongly identified
-        db: Database session dependency
+        publisher_id: Unique identifier for the publisher
+        session: Session of the publisher
         
     Returns:
-        Dict containing confirmation of report
+        Dict containing the allowlisted IPs, CIDR ranges and fingerprints
     """
+    check_publisher(session, publisher_id)
     try:
-        detector = BotDetectorService(db)
-        await detector.handle_false_positive(ip_address)
+        return {"entries": await get_allowlist().entries(publisher_id)}
+    except Exception as e:
+        logger.error(f"Error getting allowlist: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error retrieving allowlist"
+        )
+
+@router.post("/allowlist/{publisher_id}")
+async def update_allowlist(publisher_id: str, update: AllowlistUpdate,
+                           session: dict = Depends(require_publisher)) -> Dict:
+    """
+    Add and remove allowlist entries for a publisher. Requests matching an
+    entry skip bot detection.
+    
+    Args:
+        publisher_id: Unique identifier for the publisher
+        update: Entries to add and remove (IPs, CIDR ranges no broader than
+            /16 for IPv4 or /48 for IPv6, or header fingerprints)
+        session: Session of the publisher
+        
+    Returns:
+        Dict containing the new allowlist version
+    """
+    check_publisher(session, publisher_id)
+    try:
+        version = await get_allowlist().update(publisher_id, add=update.add, remove=update.remove)
         return {
             "status": "success",
-            "message": "False positive report recorded"
+            "version": version
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error reporting false positive: {e}")
+        logger.error(f"Error updating allowlist: {e}")
         raise HTTPException(
             status_code=500,
-            detail="Error recording false positive report"
+            detail="Error updating allowlist"
         )
 
 @router.get("/high-risk-ips/{publisher_id}")
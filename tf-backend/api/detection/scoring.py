@@ -0,0 +1,196 @@
+# tf-backend/api/detection/scoring.py
+
+"""
+Feature-based scoring of detection signals.
+
+The detection checks only record which signals fired (the method names
+in detection_methods, plus the matched pattern's confidence). This module
+turns those into fixed-length feature vectors and scores whole batches
+at once:
+
+    contribution = features * weights
+    confidence   = max(contribution) per row
+    flagged      = features @ bot_mask > 0   (a bot-indicating signal fired)
+    is_bot       = flagged and methods >= min_methods and confidence >= threshold
+
+Flagged rows that fail the corroboration rule are reported as not bots
+with zero confidence and no methods. The default weights reproduce the
+per-check confidences the detector has always used.
+"""
+
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from core.config import get_settings
+
+# Feature columns, in vector order
+FEATURES = (
+    'us_parser',
+    'known_pattern',
+    'ai_crawler',
+    'browser_fingerprint',
+    'mobile_mismatch',
+    'high_frequency',
+    'consistent_timing',
+    'ip_reputation',
+    'verified_crawler_ip',
+    'crawler_ip_mismatch',
+    'verified_crawler_dns',
+    'crawler_dns_mismatch',
+    'distributed_fingerprint',
+)
+
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURES)}
+
+# Confidence each signal contributes; known_pattern is scaled by the
+# matched pattern's own confidence
+DEFAULT_WEIGHTS = {
+    'us_parser': 0.8,
+    'known_pattern': 1.0,
+    'ai_crawler': 0.0,
+    'browser_fingerprint': 0.7,
+    'mobile_mismatch': 0.8,
+    'high_frequency': 0.8,
+    'consistent_timing': 0.9,
+    'ip_reputation': 0.7,
+    'verified_crawler_ip': 1.0,
+    'crawler_ip_mismatch': 0.9,
+    'verified_crawler_dns': 1.0,
+    'crawler_dns_mismatch': 0.9,
+    'distributed_fingerprint': 0.8,
+}
+
+# Signals that on their own make a request a bot candidate
+DEFAULT_BOT_FEATURES = (
+    'us_parser',
+    'known_pattern',
+    'browser_fingerprint',
+    'high_frequency',
+    'consistent_timing',
+    'ip_reputation',
+    'distributed_fingerprint',
+)
+
+class ScoringEngine:
+    """
+    Scores detection feature vectors with configurable weights and
+    thresholds, one row per request.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None,
+                 bot_features: Sequence[str] = DEFAULT_BOT_FEATURES,
+                 threshold: float = 0.8, min_methods: int = 2):
+        """
+        Args:
+            weights: Confidence per feature; unspecified features keep
+                their default weight
+            bot_features: Features that make a request a bot candidate
+            threshold: Minimum confidence for a bot verdict
+            min_methods: Minimum number of signals for a bot verdict
+        """
+        merged = dict(DEFAULT_WEIGHTS)
+        for name, weight in (weights or {}).items():
+            if name not in FEATURE_INDEX:
+                raise ValueError(f"Unknown detection feature: {name}")
+            merged[name] = float(weight)
+
+        self.weights = np.array([merged[name] for name in FEATURES], dtype=np.float64)
+        self.bot_mask = np.zeros(len(FEATURES), dtype=np.float64)
+        for name in bot_features:
+            if name not in FEATURE_INDEX:
+                raise ValueError(f"Unknown detection feature: {name}")
+            self.bot_mask[FEATURE_INDEX[name]] = 1.0
+
+        self.threshold = threshold
+        self.min_methods = min_methods
+
+    @classmethod
+    def from_file(cls, path: Path) -> "ScoringEngine":
+        """
+        Load a JSON config with any of: weights, bot_features, threshold,
+        min_methods
+        """
+        with Path(path).open() as f:
+            config = json.load(f)
+        return cls(
+            weights=config.get('weights'),
+            bot_features=config.get('bot_features', DEFAULT_BOT_FEATURES),
+            threshold=config.get('threshold', 0.8),
+            min_methods=config.get('min_methods', 2)
+        )
+
+    def score_matrix(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Score an (n, len(FEATURES)) feature matrix.
+
+        Returns:
+            Tuple of (is_bot bool array, confidence float array, accepted
+            bool array); rows that are not accepted had their signals
+            discarded by the corroboration rule
+        """
+        features = np.asarray(features, dtype=np.float64)
+        active = features > 0
+
+        confidence = (features * self.weights).max(axis=1, initial=0.0)
+        methods = active.sum(axis=1)
+        flagged = (features @ self.bot_mask) > 0
+
+        corroborated = (methods >= self.min_methods) & (confidence >= self.threshold)
+        is_bot = flagged & corroborated
+        accepted = ~flagged | corroborated
+
+        return is_bot, np.where(accepted, confidence, 0.0), accepted
+
+    def score_results(self, batch: List[Dict]) -> List[Dict]:
+        """
+        Score detection results in place, setting is_bot and
+        confidence_score and clearing detection_methods on rejected rows
+        """
+        if not batch:
+            return batch
+
+        is_bot, confidence, accepted = self.score_matrix(feature_matrix(
+            (results['detection_methods'], results.get('pattern_confidence')) for results in batch
+        ))
+
+        for results, bot, score, keep in zip(batch, is_bot.tolist(), confidence.tolist(), accepted.tolist()):
+            results['is_bot'] = bot
+            results['confidence_score'] = score
+            if not keep:
+                results['detection_methods'] = []
+
+        return batch
+
+    def score(self, results: Dict) -> Dict:
+        """Score a single request's detection results in place"""
+        return self.score_results([results])[0]
+
+def feature_matrix(rows: Iterable[Tuple[Sequence[str], Optional[float]]]) -> np.ndarray:
+    """
+    Build a feature matrix from (detection_methods, pattern_confidence)
+    pairs, e.g. from detection results or stored RequestLog rows.
+    Unknown method names are ignored.
+    """
+    rows = list(rows)
+    matrix = np.zeros((len(rows), len(FEATURES)), dtype=np.float64)
+    known_pattern = FEATURE_INDEX['known_pattern']
+
+    for i, (methods, pattern_confidence) in enumerate(rows):
+        for method in methods:
+            column = FEATURE_INDEX.get(method)
+            if column is not None:
+                matrix[i, column] = 1.0
+        if pattern_confidence is not None and matrix[i, known_pattern]:
+            matrix[i, known_pattern] = pattern_confidence
+
+    return matrix
+
+@lru_cache()
+def get_scoring_engine() -> ScoringEngine:
+    """Process-wide scoring engine, configured by DETECTION_SCORING_FILE if set"""
+    settings = get_settings()
+    if settings.DETECTION_SCORING_FILE:
+        return ScoringEngine.from_file(settings.DETECTION_SCORING_FILE)
+    return ScoringEngine()
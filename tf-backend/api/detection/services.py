@@ -2,19 +2,37 @@
 
 from fastapi import Request
 from sqlalchemy.orm import Session
+from sqlalchemy import insert
 import redis
 import json
-from typing import Dict
+import ipaddress
+from typing import Dict, List, Optional
 from datetime import datetime, timezone
-from .utils import UserAgentAnalyzer, BROWSER_HEADERS
+from .utils import UserAgentAnalyzer, BROWSER_HEADERS, get_pattern_registry
+from .utils import get_verdict_cache, verdict_key, get_dns_verifier, get_allowlist
+from .utils.timing import RATE_WINDOW, TIMING_WINDOW
+from .utils.allowlist import parse_network
+from .classifier import RequestClassifier
 from core.redis_client import RedisClientFactory
+from core.cache import freeze
 from core.config import get_settings
 from redis.exceptions import RedisError
 from core.models.detection import RequestLog
 from core.logging_config import get_logger, LogOperation
+from core.metrics import get_stage_metrics
+from core.ingestion import get_request_log_buffer, get_request_log_sampler, persisted
+from core.unique_ips import get_unique_ip_counter
+from .redis_scripts import get_detection_scripts, parse_detection_state
+from .leaderboard import get_risk_leaderboard
 
 logger = get_logger(__name__)
 
+HISTORY_TTL = 3600 # Expire timing state after 1 hour idle
+REPUTATION_TTL = 86400 # Expire reputation after 1 day
+FINGERPRINT_TTL = 86400 # Expire fingerprint sketches after 1 day idle
+FALSE_POSITIVE_ENUMERATE_LIMIT = 4096 # Larger reported ranges scan ip_reputation:* instead
+FALSE_POSITIVE_PIPELINE_SIZE = 1000
+
 class BotDetectorService:
     def __init__(self, db: Session):
         self.db = db
@@ -24,130 +42,36 @@ class BotDetectorService:
         self.BROWSER_HEADERS = BROWSER_HEADERS
         
         try:
-            self.redis = RedisClientFactory.get_client()
+            self.redis = RedisClientFactory.get_detection_client()
         except RedisError as e:
             logger.error("redis_connection_failed", 
                         error=str(e),
                         exc_info=True)
             raise
-    
-        self.KNOWN_BOT_PATTERNS = {
-        
-            # AI Company Crawlers
-            'anthropic-ai': {
-                'company': 'Anthropic',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'claude-web': {
-                'company': 'Anthropic',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'chatgpt-user': {
-                'company': 'OpenAI',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'gptbot': {
-                'company': 'OpenAI',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'cohere-ai': {
-                'company': 'Cohere',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'perplexitybot': {
-                'company': 'Perplexity',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'ccbot': {
-                'company': 'Common Crawl',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'bytespider': {
-                'company': 'ByteDance',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'applebot-extended': {
-                'company': 'Apple',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'diffbot': {
-                'company': 'Diffbot',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'imagesiftbot': {
-                'company': 'ImageSift',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            'webz.io': {
-                'company': 'Webz.io',
-                'type': 'AI Training',
-                'confidence': 1.0
-            },
-            
-            # Search Engine and Social Media Crawlers
-            'googlebot': {
-                'company': 'Google',
-                'type': 'Search Engine',
-                'confidence': 1.0
-            },
-            'google-extended': {
-                'company': 'Google',
-                'type': 'Search Engine',
-                'confidence': 1.0
-            },
-            'googleother': {
-                'company': 'Google',
-                'type': 'Search Engine',
-                'confidence': 1.0
-            },
-            'bingbot': {
-                'company': 'Microsoft',
-                'type': 'Search Engine',
-                'confidence': 1.0
-            },
-            'facebookbot': {
-                'company': 'Meta',
-                'type': 'Social Media',
-                'confidence': 1.0
-            },
-            
-            # Generic Patterns (lower confidence as they might be false positives)
-            'crawl': {
-                'company': 'Unknown',
-                'type': 'Generic Crawler',
-                'confidence': 0.7
-            },
-            'spider': {
-                'company': 'Unknown',
-                'type': 'Generic Spider',
-                'confidence': 0.7
-            },
-            'bot': {
-                'company': 'Unknown',
-                'type': 'Generic Bot',
-                'confidence': 0.6
-            }
-        }
         
-        self.BROWSER_HEADERS = [
-            'accept-language',
-            'accept-encoding',
-            'sec-fetch-dest',
-            'sec-fetch-mode',
-            'sec-fetch-site',
-            'sec-ch-ua'
-        ]
+        self.scripts = get_detection_scripts(self.redis)
+        self.log_buffer = get_request_log_buffer()
+        self.log_sampler = get_request_log_sampler()
+        self.unique_ips = get_unique_ip_counter()
+        self.metrics = get_stage_metrics()
+        self.risk_leaderboard = get_risk_leaderboard()
+
+        # Current pattern snapshot, fixed for the lifetime of this service
+        self.patterns = get_pattern_registry().snapshot
+        self.pattern_index = self.patterns.index
+        self.KNOWN_BOT_PATTERNS = self.patterns.patterns
+        
+        # Request-only checks, shared with the edge middleware
+        self.classifier = RequestClassifier(self.ua_analyzer, self.pattern_index)
+        
+        # Short-lived verdicts for repeat clients, None when disabled
+        self.verdict_cache = get_verdict_cache()
+        
+        # Background reverse DNS checks of claimed crawlers
+        self.dns_verifier = get_dns_verifier()
+        
+        # Publisher allowlists, checked before anything else
+        self.allowlist = get_allowlist()
     
     async def analyze_request(self, request: Request, publisher_id: str) -> Dict:
         """ 
@@ -155,258 +79,453 @@ class BotDetectorService:
         Returns detection results with confidence score
         """
         with LogOperation("analyze_request", publisher_id=publisher_id):
-            detection_results = {
-                'is_bot': False,
-                'confidence_score': 0.0,
-                'detection_methods': [],
-                'bot_name': None,
-                'bot_type': None,
-                'is_ai_crawler': False,
-                'client_info': None
-            }
-            
-            # Get request details
-            ip = request.client.host
-            user_agent = request.headers.get("user-agent", "")
-            headers = dict(request.headers)
+            descriptor = self._describe_request(request)
+            ip = descriptor['ip']
             
-            # UA analysis
-            client_info = self.ua_analyzer.analyze_user_agent(user_agent)
-            detection_results['client_info'] = client_info
+            # A user agent the cache and fast path don't know is parsed off
+            # the event loop, before anything fingerprints or classifies it
+            await self.ua_analyzer.prepare((descriptor['user_agent'],))
             
-            logger.debug("user_agent_analysis_complete",
-                        is_bot=client_info['is_bot'],
-                        is_mobile=client_info['is_mobile'])
+            # Allowlisted monitoring and partner traffic skips detection,
+            # Redis state and logging altogether
+            if self.allowlist.covers(publisher_id):
+                allowed = await self._match_allowlist(descriptor, publisher_id)
+                if allowed is not None:
+                    return allowed
             
-            if client_info['is_bot']:
-                detection_results['is_bot'] = True
-                detection_results['confidence_score'] = max(detection_results['confidence_score'], 0.8)
-                detection_results['detection_methods'].append('us_parser')
-                if detection_results['bot_type'] is None:
-                    detection_results['bot_type'] = 'Generic Bot'
+            # A client seen moments ago with the same UA and headers, in the
+            # same order, gets the same verdict; only its timing state and
+            # request log move on
+            cache_key = None
+            if self.verdict_cache is not None:
+                fingerprint, hints = self.classifier.fingerprint(descriptor)
+                cache_key = verdict_key(publisher_id, ip, descriptor['user_agent'], descriptor['headers'],
+                                        fingerprint, hints)
+                verdict = self.verdict_cache.get(cache_key)
+                if verdict is not None:
+                    return await self._serve_cached_verdict(verdict, descriptor, publisher_id, fingerprint)
             
-            # 1. Check known patterns
-            await self._check_known_patterns(user_agent, detection_results)
+            detection_results = self.classifier.analyze_client(descriptor)
             
-            # 2. Analyze browser fingerprint
-            await self._analyze_browser_fingerprint(headers, detection_results, client_info)
+            # 3-4. Append to request history and read pattern features and
+            # IP reputation in a single round trip
+            features, reputation = await self._load_detection_state(
+                descriptor, publisher_id, detection_results['header_fingerprint']
+            )
+            self.classifier.evaluate_request_patterns(features, detection_results)
             
-            # 3. Check request patterns
-            await self._analyze_request_patterns(ip, publisher_id, detection_results)
+            started = self.metrics.start()
+            self._evaluate_ip_reputation(reputation, detection_results)
+            self._verify_crawler_dns(ip, detection_results)
+            self.metrics.observe("reputation", started)
             
-            # 4. Check IP reputation
-            await self._check_ip_reputation(ip, detection_results)
+            detection_results = self._finalize_results(detection_results, publisher_id, ip)
             
             # 5. Update detection history
-            await self._update_detection_history(request, ip, publisher_id, detection_results)
+            await self._update_detection_history(descriptor, publisher_id, detection_results)
             
-            if not detection_results['is_bot']:
-                return detection_results
+            if cache_key is not None:
+                self.verdict_cache.put(cache_key, freeze(detection_results))
             
-            if len(detection_results['detection_methods']) < 2 or detection_results['confidence_score'] < 0.8:
-                detection_results['is_bot'] = False
-                detection_results['confidence_score'] = 0.0
-                detection_results['detection_methods'] = []
+            return detection_results
+    
+    async def analyze_batch(self, descriptors: List[Dict], publisher_id: str,
+                            log_requests: bool = True) -> List[Dict]:
+        """
+        Analyze a batch of request descriptors for one publisher.
+        
+        The detection state script runs once per item in a single pipeline,
+        reputation updates go out in a second pipeline, and RequestLog rows
+        are inserted with a single bulk insert.
+        
+        Args:
+            descriptors: Request descriptors (ip, user_agent, headers, path,
+                method, timestamp), in arrival order
+            publisher_id: Unique identifier for the publisher
+            log_requests: Write RequestLog rows; off when replaying
+                traffic only to see the verdicts
             
-            if detection_results['is_bot']:
-                logger.info("bot_detected",
-                          publisher_id=publisher_id,
-                          ip=ip,
-                          confidence=detection_results['confidence_score'],
-                          methods=detection_results['detection_methods'],
-                          bot_type=detection_results['bot_type'],
-                          detection_count=len(detection_results['detection_methods']))
+        Returns:
+            List of detection results in the same order as descriptors
+        """
+        with LogOperation("analyze_batch", publisher_id=publisher_id, batch_size=len(descriptors)):
+            descriptors = [self._normalize_descriptor(d) for d in descriptors]
+            if not descriptors:
+                return []
             
-            return detection_results
+            # New user agents are parsed off the event loop before anything
+            # fingerprints or classifies them
+            await self.ua_analyzer.prepare(d['user_agent'] for d in descriptors)
+            
+            # Allowlisted items skip detection and logging
+            allowed = None
+            if self.allowlist.covers(publisher_id):
+                allowed = [await self._match_allowlist(d, publisher_id) for d in descriptors]
+                descriptors = [d for d, result in zip(descriptors, allowed) if result is None]
+                if not descriptors:
+                    return allowed
+            
+            # 1-2. Client-side checks need no I/O
+            batch_results = [self.classifier.analyze_client(d) for d in descriptors]
+            
+            # Redis runs the scripts in order, so later items see earlier ones
+            states = [({}, None)] * len(descriptors)
+            started = self.metrics.start()
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for descriptor, results in zip(descriptors, batch_results):
+                        await self._queue_detection_state(
+                            pipe, descriptor, publisher_id, results['header_fingerprint']
+                        )
+                    replies = await pipe.execute()
+                states = [parse_detection_state(reply) for reply in replies]
+                self.metrics.observe("detection_state_batch", started)
+                    
+            except RedisError as e:
+                logger.error("redis_error_loading_batch_state",
+                           publisher_id=publisher_id,
+                           error=str(e),
+                           exc_info=True)
+            
+            # 3-4. Record rate, timing, reputation and DNS signals
+            for descriptor, results, (features, _) in zip(descriptors, batch_results, states):
+                self.classifier.evaluate_request_patterns(features, results)
+            
+            # Signals so far don't depend on other items in the batch
+            snapshots = [(list(r['detection_methods']), r['crawler_verified']) for r in batch_results]
+            
+            for descriptor, results, (_, reputation) in zip(descriptors, batch_results, states):
+                self._evaluate_ip_reputation(reputation, results)
+                self._verify_crawler_dns(descriptor['ip'], results)
+            
+            self.classifier.finalize_batch(batch_results)
+            
+            # Reputation written by an earlier item applies to later items from
+            # the same IP: rescore those against the first write
+            first_writes = {}
+            rescore = []
+            for i, (descriptor, results) in enumerate(zip(descriptors, batch_results)):
+                ip = descriptor['ip']
+                if ip in first_writes:
+                    rescore.append((i, first_writes[ip]))
+                    continue
+                reputation_data = self._build_reputation_update(descriptor, results)
+                if reputation_data is not None:
+                    first_writes[ip] = json.dumps(reputation_data)
+            
+            if rescore:
+                for i, reputation in rescore:
+                    results = batch_results[i]
+                    results['detection_methods'], results['crawler_verified'] = list(snapshots[i][0]), snapshots[i][1]
+                    self._evaluate_ip_reputation(reputation, results)
+                    self._verify_crawler_dns(descriptors[i]['ip'], results)
+                self.classifier.finalize_batch([batch_results[i] for i, _ in rescore])
+            
+            # The last write per IP wins, as if the items ran one by one
+            reputation_writes = {}
+            bot_items = []
+            log_rows = []
+            for descriptor, results in zip(descriptors, batch_results):
+                reputation_data = self._build_reputation_update(descriptor, results)
+                if reputation_data is not None:
+                    reputation_writes[descriptor['ip']] = json.dumps(reputation_data)
+                if results.get('is_bot'):
+                    bot_items.append((descriptor, results))
+                if log_requests:
+                    log_rows.append(self._build_log_row(descriptor, publisher_id, results))
+                self._log_verdict(results, publisher_id, descriptor['ip'])
+            
+            # 5. Write back reputation and risk score changes in one round trip
+            if reputation_writes or bot_items:
+                started = self.metrics.start()
+                try:
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        for ip, reputation in reputation_writes.items():
+                            await self.scripts.reputation_update(
+                                keys=[f"ip_reputation:{ip}"],
+                                args=[reputation, REPUTATION_TTL],
+                                client=pipe
+                            )
+                        for descriptor, results in bot_items:
+                            await self.risk_leaderboard.record(
+                                pipe, publisher_id, descriptor['ip'], results, descriptor['timestamp']
+                            )
+                        await pipe.execute()
+                    self.metrics.observe("redis_write_batch", started)
+                        
+                except RedisError as e:
+                    logger.error("redis_error_writing_batch_reputation",
+                               publisher_id=publisher_id,
+                               error=str(e),
+                               exc_info=True)
+            
+            # Log to Postgres
+            if log_requests:
+                await self._log_requests(log_rows, publisher_id)
+            
+            if allowed is not None:
+                analyzed = iter(batch_results)
+                batch_results = [result if result is not None else next(analyzed) for result in allowed]
+            return batch_results
     
-    async def _check_known_patterns(self, user_agent: str, results: Dict):
+    async def _serve_cached_verdict(self, verdict, descriptor: Dict, publisher_id: str, fingerprint: str) -> Dict:
         """
-        Checks user agent against known bot patterns
+        Answer from a cached verdict, still advancing the request timing
+        state and logging the request
         """
+        results = dict(verdict)
+        results['detection_methods'] = list(verdict['detection_methods'])
         
-        ua_lower = user_agent.lower()
+        try:
+            if results['is_bot']:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    await self._queue_detection_state(pipe, descriptor, publisher_id, fingerprint)
+                    await self.risk_leaderboard.record(
+                        pipe, publisher_id, descriptor['ip'], results, descriptor['timestamp']
+                    )
+                    await pipe.execute()
+            else:
+                await self._queue_detection_state(self.redis, descriptor, publisher_id, fingerprint)
+        except RedisError as e:
+            logger.error("redis_error_updating_timing_state",
+                       publisher_id=publisher_id,
+                       error=str(e),
+                       exc_info=True)
         
-        for pattern, info in self.KNOWN_BOT_PATTERNS.items():
-            if pattern in ua_lower:
-                results['is_bot'] = True
-                results['confidence_score'] = max(results['confidence_score'], info['confidence'])
-                results['detection_methods'].append('known_pattern')
-                results['bot_name'] = info['company']
-                results['bot_type'] = info['type']
-                
-                if info['type'] == 'AI Training':
-                    results['is_ai_crawler'] = True
-                    results['detection_methods'].append('ai_crawler')
-                
-                logger.info("known_bot_pattern_matched",
-                          pattern=pattern,
-                          company=info['company'],
-                          type=info['type'],
-                          confidence=info['confidence'])
-
-                return
+        await self._log_requests([self._build_log_row(descriptor, publisher_id, results)], publisher_id)
+        
+        logger.debug("verdict_cache_hit",
+                    publisher_id=publisher_id,
+                    ip=descriptor['ip'],
+                    is_bot=results['is_bot'])
+        return results
     
-    async def _analyze_browser_fingerprint(self, headers: Dict, results: Dict, client_info: Dict):
+    async def _match_allowlist(self, descriptor: Dict, publisher_id: str) -> Optional[Dict]:
         """
-        Analyze browser fingerprint for bot-like characteristics
+        Results for a request on the publisher's allowlist, or None if it
+        is not allowlisted
         """
-        # Check if this is an API call vs browser request
-        is_api_call = headers.get('content-type') == 'application/json'
+        checks_fingerprints = self.allowlist.checks_fingerprints(publisher_id)
+        if checks_fingerprints:
+            # The fingerprint reads the parsed user agent
+            await self.ua_analyzer.prepare((descriptor['user_agent'],))
         
-        if not is_api_call:
+        started = self.metrics.start()
+        fingerprint = None
+        if checks_fingerprints:
+            fingerprint, _ = self.classifier.fingerprint(descriptor)
+        entry = await self.allowlist.match(publisher_id, descriptor['ip'], fingerprint)
+        self.metrics.observe("allowlist", started)
         
-            missing_headers = [header for header in self.BROWSER_HEADERS
-                            if header not in headers]
-            
-            if len(missing_headers) >= 5:
-                results['is_bot'] = True
-                results['confidence_score'] = max(results['confidence_score'], 0.7)
-                results['detection_methods'].append('browser_fingerprint')
+        if entry is None:
+            return None
         
-        if client_info['is_mobile']:
-            if 'sec-ch-ua-mobile' in headers and headers['sec-ch-ua-mobile'] != '?1':
-                results['confidence_score'] = max(results['confidence_score'], 0.8)
-                results['detection_methods'].append('mobile_mismatch')
+        logger.debug("allowlisted_request",
+                    publisher_id=publisher_id,
+                    ip=descriptor['ip'],
+                    entry=entry)
+        return {
+            'is_bot': False,
+            'confidence_score': 0.0,
+            'detection_methods': [],
+            'bot_name': None,
+            'bot_type': None,
+            'is_ai_crawler': False,
+            'crawler_verified': None,
+            'allowlisted': entry
+        }
+    
+    def _describe_request(self, request: Request) -> Dict:
+        """Reduce an incoming request to the descriptor used by detection"""
+        return {
+            'ip': request.client.host,
+            'user_agent': request.headers.get("user-agent", ""),
+            'headers': dict(request.headers),
+            'header_names': [name.decode("latin-1") for name, _ in request.headers.raw],
+            'path': str(request.url.path),
+            'method': request.method,
+            'timestamp': datetime.now(timezone.utc).timestamp()
+        }
+    
+    def _normalize_descriptor(self, descriptor: Dict) -> Dict:
+        """Fill defaults and lowercase header names for an externally supplied descriptor"""
+        raw_headers = descriptor.get('headers') or {}
+        headers = {str(k).lower(): v for k, v in raw_headers.items()}
+        user_agent = descriptor.get('user_agent')
+        if user_agent is None:
+            user_agent = headers.get('user-agent', "")
+        timestamp = descriptor.get('timestamp')
+        
+        return {
+            'ip': descriptor['ip'],
+            'user_agent': user_agent,
+            'headers': headers,
+            'header_names': [str(k) for k in raw_headers],
+            'path': descriptor.get('path') or "/",
+            'method': (descriptor.get('method') or "GET").upper(),
+            'timestamp': float(timestamp) if timestamp is not None else datetime.now(timezone.utc).timestamp()
+        }
     
-    async def _analyze_request_patterns(self, ip: str, publisher_id: str, results: Dict):
+    def _finalize_results(self, detection_results: Dict, publisher_id: str, ip: str) -> Dict:
+        """Score recorded signals into a verdict"""
+        detection_results = self.classifier.finalize(detection_results)
+        self._log_verdict(detection_results, publisher_id, ip)
+        return detection_results
+    
+    def _log_verdict(self, detection_results: Dict, publisher_id: str, ip: str):
+        """Log a scored bot verdict"""
+        if detection_results['is_bot']:
+            logger.info("bot_detected",
+                      publisher_id=publisher_id,
+                      ip=ip,
+                      confidence=detection_results['confidence_score'],
+                      methods=detection_results['detection_methods'],
+                      bot_type=detection_results['bot_type'],
+                      detection_count=len(detection_results['detection_methods']))
+    
+    async def _load_detection_state(self, descriptor: Dict, publisher_id: str, fingerprint: str):
         """
-        Analyze request patterns for bot-like behavior
+        Append the request to its history, count it in its fingerprint's
+        sketches and fetch pattern features and IP reputation with one
+        script call
+        
+        Returns:
+            Tuple of (pattern features, raw reputation record or None)
         """
-        with LogOperation("analyze_request_patterns", publisher_id=publisher_id):
+        with LogOperation("load_detection_state", publisher_id=publisher_id):
+            try:
+                started = self.metrics.start()
+                reply = await self._queue_detection_state(self.redis, descriptor, publisher_id, fingerprint)
+                self.metrics.observe("detection_state", started)
+                return parse_detection_state(reply)
             
-            try: 
-                key = f"requests:{publisher_id}:{ip}"
-                recent_requests = self.redis.lrange(key, 0, 99) # last 100 requests
-                timestamps = []
-                
-                if recent_requests:
-                    for req in recent_requests:
-                        try:
-                            req_data = json.loads(req)
-                            timestamps.append(float(req_data['timestamp']))
-                        except (json.JSONDecodeError, KeyError, ValueError) as e:
-                            logger.warning("request_data_parse_error",
-                                         error=str(e))
-                            continue
-                
-                # Only analyze if we have enough timestamps
-                if len(timestamps) >=10:
-                    time_diff = max(timestamps) - min(timestamps)
-                    if time_diff > 0:
-                        requests_per_second = len(timestamps) / time_diff
-                        
-                        if requests_per_second > 10:
-                            results['is_bot'] = True
-                            results['confidence_score'] = max(results['confidence_score'], 0.8)
-                            results['detection_methods'].append('high_frequency')
-                            logger.info("high_frequency_detected",
-                                      requests_per_second=requests_per_second)
-
-                        intervals = [timestamps[i] - timestamps[i-1]
-                                    for i in range(1, len(timestamps))]
-                        
-                        if len(set(intervals)) == 1: # i.e., all intervals are identical
-                            results['is_bot'] = True
-                            results['confidence_score'] = max(results['confidence_score'], 0.9)
-                            results['detection_methods'].append('consistent_timing')
-                            logger.info("consistent_timing_detected",
-                                      interval=intervals[0])
-
             except RedisError as e:
-                logger.error("redis_error_analyzing_patterns",
+                logger.error("redis_error_loading_detection_state",
                            error=str(e),
                            exc_info=True)
             except Exception as e:
-                logger.error("error_analyzing_patterns",
+                logger.error("error_loading_detection_state",
                            error=str(e),
                            exc_info=True)
-                    
-    async def _check_ip_reputation(self, ip: str, results: Dict):
+            
+            return {}, None
+    
+    def _queue_detection_state(self, client, descriptor: Dict, publisher_id: str, fingerprint: str):
         """
-        Check IP reputation from Redis
+        Invoke the detection state script on a client, or queue it when
+        given a pipeline
         """
-        try:
-            reputation_key = f"ip_reputation:{ip}"
-            reputation = self.redis.get(reputation_key)
-            
-            if reputation:
-                try:
-                    reputation_data = json.loads(reputation)
-                    reputation_score = float(reputation_data.get('score', 1.0))
-                    
-                    if reputation_score < 0.5:
-                        results['is_bot'] = True
-                        results['confidence_score'] = max(results['confidence_score'], 0.7)
-                        results['detection_methods'].append('ip_reputation')
+        ip = descriptor['ip']
+        return self.scripts.detection_state(
+            keys=[
+                f"requests:{publisher_id}:{ip}",
+                f"ip_reputation:{ip}",
+                f"fingerprint_ips:{fingerprint}",
+                f"fingerprint_publishers:{fingerprint}"
+            ],
+            args=[descriptor['timestamp'], RATE_WINDOW, TIMING_WINDOW, HISTORY_TTL,
+                  ip, publisher_id, FINGERPRINT_TTL],
+            client=client
+        )
+    
+    def _evaluate_ip_reputation(self, reputation: Optional[str], results: Dict):
+        """
+        Score a stored IP reputation record
+        """
+        if reputation:
+            try:
+                reputation_data = json.loads(reputation)
+                reputation_score = float(reputation_data.get('score', 1.0))
+                
+                if reputation_score < 0.5:
+                    results['detection_methods'].append('ip_reputation')
                 
-                except (json.JSONDecodeError, ValueError):
-                    pass
+                # Crawler verification finished by any worker
+                crawler_verified = reputation_data.get('crawler_verified')
+                if (crawler_verified is not None
+                        and results['crawler_verified'] is None
+                        and reputation_data.get('verified_operator') == results['bot_name']):
+                    self._apply_dns_verification(bool(crawler_verified), results)
+            
+            except (json.JSONDecodeError, ValueError):
+                pass
+    
+    def _verify_crawler_dns(self, ip: str, results: Dict):
+        """
+        Apply a cached DNS verification of a claimed crawler, or start one
+        in the background so later requests from the IP can use it
+        """
+        operator = results['bot_name']
+        if results['crawler_verified'] is not None or not self.dns_verifier.supports(operator):
+            return
         
-        except RedisError as e:
-            logger.error(f"Redis error checking IP reputation: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error checking IP reputation: {str(e)}")        
+        verified = self.dns_verifier.cached(ip, operator)
+        if verified is None:
+            self.dns_verifier.schedule(ip, operator, self._store_dns_verification)
+            return
+        
+        self._apply_dns_verification(verified, results)
+    
+    def _apply_dns_verification(self, verified: bool, results: Dict):
+        """Record the outcome of a DNS verification"""
+        results['crawler_verified'] = verified
+        if verified:
+            results['detection_methods'].append('verified_crawler_dns')
+        else:
+            # Hostname does not belong to the claimed operator
+            results['detection_methods'].append('crawler_dns_mismatch')
+    
+    async def _store_dns_verification(self, ip: str, operator: str, verified: bool):
+        """
+        Upgrade or downgrade the IP reputation once a DNS verification
+        completes
+        """
+        reputation_data = {
+            'score': 1.0 if verified else 0.1,
+            'last_updated': datetime.now(timezone.utc).timestamp(),
+            'detection_methods': ['verified_crawler_dns' if verified else 'crawler_dns_mismatch'],
+            'crawler_verified': verified,
+            'verified_operator': operator
+        }
+        await self.scripts.reputation_update(
+            keys=[f"ip_reputation:{ip}"],
+            args=[json.dumps(reputation_data), REPUTATION_TTL]
+        )
             
-    async def _update_detection_history(self, request: Request, ip: str, publisher_id: str, results: Dict):
+    async def _update_detection_history(self, descriptor: Dict, publisher_id: str, results: Dict):
         """
-        Update detection history in Redis and PostgreSQL
+        Update IP reputation and risk score in Redis and queue the request
+        log for PostgreSQL
         """
         with LogOperation("update_detection_history", publisher_id=publisher_id):
+            ip = descriptor['ip']
             try: 
-                # Update Redis request history
-                request_data = {
-                    'timestamp': datetime.now(timezone.utc).timestamp(),
-                    'path': str(request.url.path),
-                    'method': request.method,
-                    'is_bot': results.get('is_bot', False),
-                    'confidence': results.get('confidence_score', 0.0)
-                }
-                
-                key = f"requests:{publisher_id}:{ip}"
-                
-                with self.redis.pipeline() as pipe:
-                    
-                    pipe.lpush(key, json.dumps(request_data))
-                    pipe.ltrim(key, 0, 99) # Keep last 100 requests
-                    pipe.expire(key, 3600) #expire after 1 hour
-                    pipe.execute()
-                
                 # Update IP reputation if bot detected with high confidence
-                if results.get('is_bot', False) and results.get('confidence_score', 0.0) > 0.8:
-                    reputation_key = f"ip_reputation:{ip}"
-                    reputation_data = {
-                        'score': 0.3, # Lower score = suspicious IP
-                        'last_updated': datetime.now(timezone.utc).timestamp(),
-                        'detection_methods': results.get('detection_methods', [])
-                    }
-                    self.redis.set(
-                        reputation_key,
-                        json.dumps(reputation_data),
-                        ex=86400
-                    )
+                reputation_data = self._build_reputation_update(descriptor, results)
+                if reputation_data is not None or results.get('is_bot'):
+                    started = self.metrics.start()
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        if reputation_data is not None:
+                            await self.scripts.reputation_update(
+                                keys=[f"ip_reputation:{ip}"],
+                                args=[json.dumps(reputation_data), REPUTATION_TTL],
+                                client=pipe
+                            )
+                        await self.risk_leaderboard.record(
+                            pipe, publisher_id, ip, results, descriptor['timestamp']
+                        )
+                        await pipe.execute()
+                    self.metrics.observe("redis_write", started)
                 
                 # Log to Postgres
-                log_entry = RequestLog(
-                    ip_address=ip,
-                    user_agent=request.headers.get("user-agent", ""),
-                    request_path=str(request.url.path),
-                    request_method=request.method,
-                    is_bot=results.get('is_bot', False),
-                    is_ai_crawler=results.get('is_ai_crawler', False),
-                    bot_name=results.get('bot_name'),
-                    bot_type=results.get('bot_type'),
-                    confidence_score=results.get('confidence_score', 0.0),
-                    detection_methods=json.dumps(results.get('detection_methods', [])),
-                    publisher_id=publisher_id
+                await self._log_requests(
+                    [self._build_log_row(descriptor, publisher_id, results)],
+                    publisher_id
                 )
                 
-                self.db.add(log_entry)
-                self.db.commit()
-                
                 logger.info("detection_history_updated",
                            publisher_id=publisher_id,
-                           is_bot=results.get('is_bot', False),
-                           log_entry_id=log_entry.id)
+                           is_bot=results.get('is_bot', False))
                 
             except RedisError as e:
                 logger.error("redis_error_updating_history",
@@ -416,18 +535,216 @@ class BotDetectorService:
                 logger.error("error_updating_history",
                            error=str(e),
                            exc_info=True)
-                if 'log_entry' in locals():
-                    self.db.rollback()
+    
+    async def _log_requests(self, rows: List[Dict], publisher_id: str):
+        """
+        Queue RequestLog rows on the write-behind buffer, or insert them
+        directly when the buffer is not running (outside the app lifespan).
+        The buffer adds rows to the unique-IP sketches as it flushes; direct
+        inserts add them here.
+        
+        Non-bot rows are sampled first, by the buffer as it flushes or here;
+        rows given weight 0 are counted towards unique IPs but not written.
+        """
+        if self.log_buffer.running:
+            started = self.metrics.start()
+            await self.log_buffer.put_many(rows)
+            self.metrics.observe("request_log_enqueue", started)
+            return
+        
+        await self.log_sampler.sample(rows)
+        
+        try:
+            await self.unique_ips.record(rows)
+        except RedisError as e:
+            logger.error("redis_error_recording_unique_ips",
+                       publisher_id=publisher_id,
+                       error=str(e),
+                       exc_info=True)
+        
+        rows = persisted(rows)
+        if not rows:
+            return
+        
+        try:
+            started = self.metrics.start()
+            self.db.execute(insert(RequestLog), rows)
+            self.db.commit()
+            self.metrics.observe("postgres_write", started)
+        except Exception as e:
+            logger.error("error_inserting_request_logs",
+                       publisher_id=publisher_id,
+                       rows=len(rows),
+                       error=str(e),
+                       exc_info=True)
+            self.db.rollback()
+    
+    def _build_reputation_update(self, descriptor: Dict, results: Dict) -> Optional[Dict]:
+        """Reputation record to store for an IP, or None if it should not change"""
+        if results.get('is_bot', False) and results.get('confidence_score', 0.0) > 0.8:
+            reputation_data = {
+                'score': 0.3, # Lower score = suspicious IP
+                'last_updated': datetime.now(timezone.utc).timestamp(),
+                'detection_methods': list(results.get('detection_methods', []))
+            }
+            
+            # Keep crawler verification across reputation rewrites
+            crawler_verified = results.get('crawler_verified')
+            if crawler_verified is not None:
+                reputation_data['crawler_verified'] = crawler_verified
+                reputation_data['verified_operator'] = results.get('bot_name')
+                if crawler_verified:
+                    reputation_data['score'] = 1.0
+            
+            return reputation_data
+        return None
+    
+    def _build_log_row(self, descriptor: Dict, publisher_id: str, results: Dict) -> Dict:
+        """Column values for the RequestLog row of an analyzed request"""
+        return {
+            'timestamp': datetime.fromtimestamp(descriptor['timestamp']),
+            'ip_address': descriptor['ip'],
+            'user_agent': descriptor['user_agent'],
+            'request_path': descriptor['path'],
+            'request_method': descriptor['method'],
+            'is_bot': results.get('is_bot', False),
+            'is_ai_crawler': results.get('is_ai_crawler', False),
+            'bot_name': results.get('bot_name'),
+            'bot_type': results.get('bot_type'),
+            'confidence_score': results.get('confidence_score', 0.0),
+            'detection_methods': json.dumps(results.get('detection_methods', [])),
+            'publisher_id': publisher_id
+        }
+
+    async def record_reported_detections(self, detections: List[Dict], publisher_id: str) -> int:
+        """
+        Log detections made by the edge middleware on the publisher side.
+        
+        Each item carries both the request fields (ip, user_agent, path,
+        method, timestamp) and the verdict fields of a detection result.
+        
+        Returns:
+            Number of detections queued for logging
+        """
+        with LogOperation("record_reported_detections", publisher_id=publisher_id, count=len(detections)):
+            rows = [self._build_log_row(detection, publisher_id, detection) for detection in detections]
+            if rows:
+                await self._log_requests(rows, publisher_id)
+            
+            bots = [detection for detection in detections if detection.get('is_bot')]
+            if bots:
+                try:
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        for detection in bots:
+                            await self.risk_leaderboard.record(
+                                pipe, publisher_id, detection['ip'], detection, detection['timestamp']
+                            )
+                        await pipe.execute()
+                except RedisError as e:
+                    logger.error("redis_error_recording_reported_risk",
+                               publisher_id=publisher_id,
+                               error=str(e),
+                               exc_info=True)
+            return len(rows)
 
     async def get_detection_stats(self, publisher_id: str) -> Dict:
         """Get detection statistics for a publisher."""
         # Implementation for getting detection stats
         pass
     
+    async def handle_false_positive(self, ip_address: str, publisher_id: str) -> Dict:
+        """
+        Clear the bot history of a wrongly flagged IP or CIDR range.
+        
+        Reputation is reset for every address in the range. Small ranges
+        are deleted address by address and larger ones are found by
+        scanning ip_reputation:*, in pipelines either way. The range also
+        leaves the publisher's high-risk leaderboard and joins its
+        allowlist.
+        
+        Args:
+            ip_address: IP address or CIDR range that was wrongly identified,
+                no broader than /16 for IPv4 or /48 for IPv6
+            publisher_id: Publisher that reported it
+            
+        Returns:
+            Dict with the number of reputation and leaderboard entries cleared
+            
+        Raises:
+            ValueError: If ip_address is not an IP address or CIDR range, or
+                the range is too broad
+        """
+        network = parse_network(ip_address)
+        
+        with LogOperation("handle_false_positive", publisher_id=publisher_id, network=str(network)):
+            if network.num_addresses <= FALSE_POSITIVE_ENUMERATE_LIMIT:
+                reset = await self._reset_reputation_range(network)
+            else:
+                reset = await self._reset_reputation_scan(network)
+            
+            cleared = await self.risk_leaderboard.forget(publisher_id, network)
+            await self.allowlist.update(publisher_id, add=[network.compressed])
+            
+            logger.info("false_positive_handled",
+                       publisher_id=publisher_id,
+                       network=str(network),
+                       reputations_reset=reset,
+                       leaderboard_cleared=cleared)
+            return {"reputations_reset": reset, "leaderboard_cleared": cleared}
+    
+    async def _reset_reputation_range(self, network) -> int:
+        """Delete the reputation of every address in a small network"""
+        keys = [f"ip_reputation:{address}" for address in network]
+        
+        reset = 0
+        for start in range(0, len(keys), FALSE_POSITIVE_PIPELINE_SIZE):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys[start:start + FALSE_POSITIVE_PIPELINE_SIZE]:
+                    pipe.delete(key)
+                reset += sum(await pipe.execute())
+        return reset
+    
+    async def _reset_reputation_scan(self, network) -> int:
+        """Delete the reputation of every stored address within a large network"""
+        reset = 0
+        cursor = 0
+        while True:
+            cursor, keys = await self.redis.scan(
+                cursor, match="ip_reputation:*", count=FALSE_POSITIVE_PIPELINE_SIZE
+            )
+            matched = []
+            for key in keys:
+                try:
+                    if ipaddress.ip_address(key[len("ip_reputation:"):]) in network:
+                        matched.append(key)
+                except ValueError:
+                    continue
+            if matched:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key in matched:
+                        pipe.delete(key)
+                    reset += sum(await pipe.execute())
+            if cursor == 0:
+                return reset
+    
+    async def get_high_risk_ips(self, publisher_id: str, min_confidence: float = 0.8, limit: int = 50) -> List[Dict]:
+        """
+        Get the IPs with the highest decayed risk score for a publisher.
+        
+        Args:
+            publisher_id: Unique identifier for the publisher
+            min_confidence: Minimum bot confidence an IP must have reached
+            limit: Most IPs to return
+            
+        Returns:
+            List of IPs, most risky first
+        """
+        return await self.risk_leaderboard.top(publisher_id, limit, min_confidence)
+    
     async def get_ip_reputation(self, ip_address: str) -> Dict:
         """Get reputation data for an IP address."""
         reputation_key = f"ip_reputation:{ip_address}"
-        reputation = self.redis.get(reputation_key)
+        reputation = await self.redis.get(reputation_key)
         
         if reputation:
             try:
@@ -436,7 +753,3 @@ class BotDetectorService:
                 return {"score": 1.0}  # Default good reputation
         
         return {"score": 1.0}  # Default good reputation
-    
-    def __del__(self):
-        """Cleanup when the BotDetectorService is destroyed"""
-        RedisClientFactory.close_connection()
\ No newline at end of file
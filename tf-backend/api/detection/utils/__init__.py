@@ -1,9 +1,47 @@
-from .ua_analyzer import UserAgentAnalyzer
-from .constants import BOT_INDICATORS, MOBILE_OS, BROWSER_HEADERS
+from .ua_analyzer import UserAgentAnalyzer, get_ua_cache
+from .constants import BOT_INDICATORS, MOBILE_OS, BROWSER_HEADERS, KNOWN_BOT_PATTERNS, CRAWLER_DNS_SUFFIXES
+from .pattern_index import BotPatternIndex, PatternMatch, get_pattern_index
+from .timing import RequestTimingStats, timing_features, timing_regularity
+from .verdict_cache import get_verdict_cache, verdict_key
+from .ip_ranges import CIDRIndex, CrawlerRangeRegistry, get_crawler_ranges
+from .dns_verifier import CrawlerDNSVerifier, Resolver, SystemResolver, StubResolver, get_dns_verifier
+from .pattern_registry import PatternRegistry, PatternSnapshot, get_pattern_registry
+from .fingerprint import header_order_fingerprint, client_hint_state
+from .allowlist import Allowlist, AllowlistSnapshot, PublisherAllowlist, get_allowlist
+from .ua_fastpath import classify_user_agent
 
 __all__ = [
     'UserAgentAnalyzer',
+    'get_ua_cache',
     'BOT_INDICATORS',
     'MOBILE_OS',
-    'BROWSER_HEADERS'
+    'BROWSER_HEADERS',
+    'KNOWN_BOT_PATTERNS',
+    'CRAWLER_DNS_SUFFIXES',
+    'BotPatternIndex',
+    'PatternMatch',
+    'get_pattern_index',
+    'PatternRegistry',
+    'PatternSnapshot',
+    'get_pattern_registry',
+    'RequestTimingStats',
+    'timing_features',
+    'timing_regularity',
+    'get_verdict_cache',
+    'verdict_key',
+    'CIDRIndex',
+    'CrawlerRangeRegistry',
+    'get_crawler_ranges',
+    'CrawlerDNSVerifier',
+    'Resolver',
+    'SystemResolver',
+    'StubResolver',
+    'get_dns_verifier',
+    'header_order_fingerprint',
+    'client_hint_state',
+    'Allowlist',
+    'AllowlistSnapshot',
+    'PublisherAllowlist',
+    'get_allowlist',
+    'classify_user_agent'
 ]
\ No newline at end of file
@@ -0,0 +1,430 @@
+# tf-backend/api/detection/utils/allowlist.py
+
+"""
+Per-publisher allowlist of IPs, CIDR ranges and header fingerprints.
+
+Entries live in Redis, one set per publisher at allowlist:{publisher},
+written as ip:<address>, cidr:<network> or fp:<fingerprint>. Every change
+bumps allowlist:version and announces "<version> <publisher>" on
+allowlist:updates in the same script call.
+
+Workers do not keep the entries themselves. Each one holds an
+AllowlistSnapshot with, for every publisher that has entries, a
+PublisherAllowlist of:
+
+    - a Bloom filter over its IP and fingerprint entries
+    - a CIDRIndex of its ranges
+    - whether it has fingerprint entries
+
+Each worker's listener applies an announced change by re-reading only
+that publisher's set. A full rebuild happens at startup and whenever
+the listener finds it has missed a version.
+
+Traffic from publishers without an allowlist costs one dict lookup. Other
+traffic costs a Bloom check, and only Bloom positives are confirmed
+against Redis. Confirmations are cached until the next change, so a
+monitoring probe or partner crawler that keeps coming back is matched
+without a round trip. An added or removed entry takes effect
+once the change is announced, normally within milliseconds.
+"""
+
+import asyncio
+import ipaddress
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, NamedTuple, Optional, Union
+import redis.asyncio
+from redis.exceptions import RedisError
+from core.bloom import BloomFilter
+from core.cache import LRUCache
+from core.config import get_settings
+from core.logging_config import get_logger
+from core.redis_client import RedisClientFactory
+from .ip_ranges import CIDRIndex
+
+logger = get_logger(__name__)
+
+VERSION_KEY = "allowlist:version"
+PUBLISHERS_KEY = "allowlist:publishers"
+UPDATES_CHANNEL = "allowlist:updates"
+
+_FINGERPRINT = re.compile(r"^[0-9a-f]{16}$")
+
+# Broadest range, per IP version, that can be allowlisted or reported as a
+# false positive
+MIN_PREFIX_LENGTH = {4: 16, 6: 48}
+
+# Add and remove entries in a publisher's allowlist, bump the version and
+# announce it.
+#
+# KEYS[1] publisher allowlist, KEYS[2] version, KEYS[3] publisher set
+# ARGV[1] publisher, ARGV[2] updates channel, ARGV[3] number of entries
+# to add, then the entries to add followed by the entries to remove
+#
+# Returns the new version.
+ALLOWLIST_UPDATE_LUA = """
+local adds = tonumber(ARGV[3])
+for i = 4, 3 + adds do
+    redis.call('SADD', KEYS[1], ARGV[i])
+end
+for i = 4 + adds, #ARGV do
+    redis.call('SREM', KEYS[1], ARGV[i])
+end
+
+if redis.call('SCARD', KEYS[1]) > 0 then
+    redis.call('SADD', KEYS[3], ARGV[1])
+else
+    redis.call('SREM', KEYS[3], ARGV[1])
+end
+
+local version = redis.call('INCR', KEYS[2])
+redis.call('PUBLISH', ARGV[2], version .. ' ' .. ARGV[1])
+return version
+"""
+
+def allowlist_key(publisher_id: str) -> str:
+    return f"allowlist:{publisher_id}"
+
+def parse_network(value: str) -> Union[ipaddress.IPv4Network, ipaddress.IPv6Network]:
+    """
+    Parse an IP address or CIDR range, refusing ranges broader than
+    MIN_PREFIX_LENGTH allows for its address family
+
+    Raises:
+        ValueError: If the value is not an address or range, or is too broad
+    """
+    network = ipaddress.ip_network(value.strip(), strict=False)
+    minimum = MIN_PREFIX_LENGTH[network.version]
+    if network.prefixlen < minimum:
+        raise ValueError(f"{network.compressed} is broader than /{minimum}")
+    return network
+
+def parse_entry(value: str) -> str:
+    """
+    Normalize an allowlist entry given as an IP address, a CIDR range or
+    a header fingerprint, with or without its kind prefix.
+
+    Raises:
+        ValueError: If the value is none of these, or a range broader
+            than MIN_PREFIX_LENGTH
+    """
+    value = value.strip().lower()
+    kind, _, rest = value.partition(":")
+    if kind in ("ip", "cidr", "fp") and rest:
+        value = rest
+
+    if _FINGERPRINT.match(value):
+        return f"fp:{value}"
+    network = parse_network(value)
+    if network.prefixlen < network.max_prefixlen:
+        return f"cidr:{network.compressed}"
+    return f"ip:{network.network_address.compressed}"
+
+class PublisherAllowlist(NamedTuple):
+    bloom: BloomFilter
+    cidrs: CIDRIndex
+    fingerprints: bool
+
+class AllowlistSnapshot(NamedTuple):
+    version: int
+    publishers: Mapping[str, PublisherAllowlist]
+
+def build_publisher(publisher_id: str, entries: Iterable[str],
+                    error_rate: float = 0.001) -> Optional[PublisherAllowlist]:
+    """
+    Compile one publisher's allowlist entries
+
+    Args:
+        publisher_id: Unique identifier for the publisher
+        entries: Its normalized entries
+        error_rate: Bloom filter false positive rate
+
+    Returns:
+        The compiled allowlist, or None if there are no entries
+    """
+    hashed = []
+    cidrs = CIDRIndex()
+    for entry in entries:
+        if entry.startswith("cidr:"):
+            cidrs.add(entry[5:], publisher_id)
+        else:
+            hashed.append(entry)
+    if not hashed and not cidrs.operators:
+        return None
+
+    bloom = BloomFilter(max(len(hashed), 64), error_rate)
+    bloom.update(hashed)
+    return PublisherAllowlist(
+        bloom=bloom,
+        cidrs=cidrs,
+        fingerprints=any(entry.startswith("fp:") for entry in hashed)
+    )
+
+def build_snapshot(version: int, entries: dict, error_rate: float = 0.001) -> AllowlistSnapshot:
+    """
+    Compile allowlist entries into a snapshot
+
+    Args:
+        version: Allowlist version the entries were read at
+        entries: Normalized entries per publisher
+        error_rate: Bloom filter false positive rate
+    """
+    publishers = {}
+    for publisher_id, publisher_entries in entries.items():
+        compiled = build_publisher(publisher_id, publisher_entries, error_rate)
+        if compiled is not None:
+            publishers[publisher_id] = compiled
+    return AllowlistSnapshot(version=version, publishers=MappingProxyType(publishers))
+
+EMPTY_SNAPSHOT = build_snapshot(0, {})
+
+class Allowlist:
+    """
+    Holds the current AllowlistSnapshot for a worker and matches requests
+    against it
+    """
+
+    def __init__(self, client: redis.asyncio.Redis, reload_interval: float = 60.0,
+                 error_rate: float = 0.001, confirm_cache_size: int = 50000):
+        self.client = client
+        self.reload_interval = reload_interval
+        self.error_rate = error_rate
+
+        self.snapshot = EMPTY_SNAPSHOT
+        # Bloom keys checked against Redis since the last swap, to True or False
+        self.confirmed = LRUCache(confirm_cache_size, name="allowlist")
+
+        self._update = client.register_script(ALLOWLIST_UPDATE_LUA)
+        self._task: Optional[asyncio.Task] = None
+
+    def covers(self, publisher_id: str) -> bool:
+        """Whether a publisher has any allowlist entries"""
+        return publisher_id in self.snapshot.publishers
+
+    def checks_fingerprints(self, publisher_id: str) -> bool:
+        """Whether a publisher has fingerprint entries"""
+        allowed = self.snapshot.publishers.get(publisher_id)
+        return allowed is not None and allowed.fingerprints
+
+    async def match(self, publisher_id: str, ip: str, fingerprint: Optional[str] = None) -> Optional[str]:
+        """
+        Find the allowlist entry a request matches
+
+        Args:
+            publisher_id: Unique identifier for the publisher
+            ip: Client IP address
+            fingerprint: Header-order fingerprint, if the publisher has any
+
+        Returns:
+            The matching IP or fingerprint entry, "cidr" for a range
+            match, or None if the request is not allowlisted
+        """
+        allowed = self.snapshot.publishers.get(publisher_id)
+        if allowed is None:
+            return None
+
+        # Entries are stored compressed and lower-case, as parse_entry writes them
+        try:
+            ip = ipaddress.ip_address(ip).compressed
+            candidates = [f"ip:{ip}"]
+        except ValueError:
+            candidates = []
+        if fingerprint is not None:
+            candidates.append(f"fp:{fingerprint}")
+
+        unconfirmed = []
+        for entry in candidates:
+            if entry not in allowed.bloom:
+                continue
+            confirmed = self.confirmed.get(f"{publisher_id}\x00{entry}")
+            if confirmed:
+                return entry
+            if confirmed is None:
+                unconfirmed.append(entry)
+
+        if unconfirmed:
+            try:
+                found = await self.client.smismember(allowlist_key(publisher_id), unconfirmed)
+            except RedisError as e:
+                logger.error("redis_error_checking_allowlist",
+                            publisher_id=publisher_id,
+                            error=str(e))
+                found = [False] * len(unconfirmed)
+            else:
+                for entry, present in zip(unconfirmed, found):
+                    self.confirmed.put(f"{publisher_id}\x00{entry}", bool(present))
+            for entry, present in zip(unconfirmed, found):
+                if present:
+                    return entry
+
+        if allowed.cidrs.operators and allowed.cidrs.lookup(ip):
+            return "cidr"
+        return None
+
+    async def entries(self, publisher_id: str) -> List[str]:
+        """All entries in a publisher's allowlist, sorted"""
+        return sorted(await self.client.smembers(allowlist_key(publisher_id)))
+
+    async def update(self, publisher_id: str, add: Iterable[str] = (), remove: Iterable[str] = ()) -> int:
+        """
+        Change a publisher's allowlist and announce the new version.
+
+        Workers, this one included, pick the change up from the
+        announcement rather than here.
+
+        Args:
+            publisher_id: Unique identifier for the publisher
+            add: Entries to add
+            remove: Entries to remove
+
+        Returns:
+            The new allowlist version
+
+        Raises:
+            ValueError: If an entry is not an IP, CIDR range or fingerprint
+        """
+        add = [parse_entry(entry) for entry in add]
+        remove = [parse_entry(entry) for entry in remove]
+
+        version = await self._update(
+            keys=[allowlist_key(publisher_id), VERSION_KEY, PUBLISHERS_KEY],
+            args=[publisher_id, UPDATES_CHANNEL, len(add), *add, *remove]
+        )
+        return int(version)
+
+    async def start(self) -> None:
+        """Load the allowlists and follow updates in the background"""
+        if self._task is not None and not self._task.done():
+            return
+        await self.load()
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self) -> bool:
+        """
+        Rebuild the whole snapshot if the stored version differs from it
+
+        Returns:
+            True if a new snapshot was swapped in
+        """
+        try:
+            version = int(await self.client.get(VERSION_KEY) or 0)
+            if version == self.snapshot.version:
+                return False
+
+            entries = {}
+            async for publisher_id in self.client.sscan_iter(PUBLISHERS_KEY, count=100):
+                entries[publisher_id] = [
+                    entry async for entry in self.client.sscan_iter(allowlist_key(publisher_id), count=1000)
+                ]
+        except RedisError as e:
+            logger.error("redis_error_loading_allowlist",
+                        error=str(e),
+                        exc_info=True)
+            return False
+
+        snapshot = build_snapshot(version, entries, self.error_rate)
+        previous = self.snapshot
+        self.snapshot = snapshot
+        self.confirmed.clear()
+
+        logger.info("allowlist_swapped",
+                   previous_version=previous.version,
+                   version=snapshot.version,
+                   publishers=len(snapshot.publishers),
+                   hashed_entries=sum(len(allowed.bloom) for allowed in snapshot.publishers.values()),
+                   bloom_bytes=sum(allowed.bloom.nbytes for allowed in snapshot.publishers.values()))
+        return True
+
+    async def apply(self, version: int, publisher_id: str) -> bool:
+        """
+        Apply an announced change by rebuilding only that publisher's
+        slice. Falls back to a full load if an earlier version was missed.
+
+        Args:
+            version: Version the change was announced with
+            publisher_id: Publisher whose allowlist changed
+
+        Returns:
+            True if a new snapshot was swapped in
+        """
+        current = self.snapshot
+        if version <= current.version:
+            return False
+        if version != current.version + 1:
+            return await self.load()
+
+        try:
+            entries = [
+                entry async for entry in self.client.sscan_iter(allowlist_key(publisher_id), count=1000)
+            ]
+        except RedisError as e:
+            logger.error("redis_error_loading_allowlist",
+                        publisher_id=publisher_id,
+                        error=str(e),
+                        exc_info=True)
+            return False
+
+        publishers = dict(current.publishers)
+        compiled = build_publisher(publisher_id, entries, self.error_rate)
+        if compiled is None:
+            publishers.pop(publisher_id, None)
+        else:
+            publishers[publisher_id] = compiled
+        # Entries read after a later change for this publisher are newer
+        # than the version, which only makes its announcement a repeat
+        self.snapshot = AllowlistSnapshot(version=version, publishers=MappingProxyType(publishers))
+        self.confirmed.clear()
+
+        logger.info("allowlist_publisher_swapped",
+                   publisher_id=publisher_id,
+                   version=version,
+                   entries=len(entries))
+        return True
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(UPDATES_CHANNEL)
+                # Catch up on anything published while not subscribed
+                await self.load()
+
+                while True:
+                    message = await pubsub.get_message(timeout=self.reload_interval)
+                    if message is None:
+                        await self.load()
+                        continue
+                    version, _, publisher_id = message['data'].partition(" ")
+                    if publisher_id:
+                        await self.apply(int(version), publisher_id)
+                    else:
+                        await self.load()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("allowlist_subscription_failed",
+                            error=str(e))
+                await asyncio.sleep(min(self.reload_interval, 5.0))
+            finally:
+                await pubsub.aclose()
+
+@lru_cache()
+def get_allowlist() -> Allowlist:
+    """Process-wide publisher allowlist on the shared async Redis client"""
+    settings = get_settings()
+    return Allowlist(
+        RedisClientFactory.get_async_client(),
+        reload_interval=settings.ALLOWLIST_RELOAD_INTERVAL,
+        error_rate=settings.ALLOWLIST_BLOOM_ERROR_RATE
+    )
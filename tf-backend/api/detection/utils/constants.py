@@ -30,4 +30,122 @@ BROWSER_HEADERS = [
     'sec-fetch-mode',
     'sec-fetch-site',
     'sec-ch-ua'
-]
\ No newline at end of file
+]
+
+# Known crawler user agent substrings (matched case-insensitively)
+KNOWN_BOT_PATTERNS = {
+    
+    # AI Company Crawlers
+    'anthropic-ai': {
+        'company': 'Anthropic',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'claude-web': {
+        'company': 'Anthropic',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'chatgpt-user': {
+        'company': 'OpenAI',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'gptbot': {
+        'company': 'OpenAI',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'cohere-ai': {
+        'company': 'Cohere',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'perplexitybot': {
+        'company': 'Perplexity',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'ccbot': {
+        'company': 'Common Crawl',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'bytespider': {
+        'company': 'ByteDance',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'applebot-extended': {
+        'company': 'Apple',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'diffbot': {
+        'company': 'Diffbot',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'imagesiftbot': {
+        'company': 'ImageSift',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    'webz.io': {
+        'company': 'Webz.io',
+        'type': 'AI Training',
+        'confidence': 1.0
+    },
+    
+    # Search Engine and Social Media Crawlers
+    'googlebot': {
+        'company': 'Google',
+        'type': 'Search Engine',
+        'confidence': 1.0
+    },
+    'google-extended': {
+        'company': 'Google',
+        'type': 'Search Engine',
+        'confidence': 1.0
+    },
+    'googleother': {
+        'company': 'Google',
+        'type': 'Search Engine',
+        'confidence': 1.0
+    },
+    'bingbot': {
+        'company': 'Microsoft',
+        'type': 'Search Engine',
+        'confidence': 1.0
+    },
+    'facebookbot': {
+        'company': 'Meta',
+        'type': 'Social Media',
+        'confidence': 1.0
+    },
+    
+    # Generic Patterns (lower confidence as they might be false positives)
+    'crawl': {
+        'company': 'Unknown',
+        'type': 'Generic Crawler',
+        'confidence': 0.7
+    },
+    'spider': {
+        'company': 'Unknown',
+        'type': 'Generic Spider',
+        'confidence': 0.7
+    },
+    'bot': {
+        'company': 'Unknown',
+        'type': 'Generic Bot',
+        'confidence': 0.6
+    }
+}
+
+# Hostname suffixes that operators publish for reverse-then-forward DNS
+# verification of their crawlers, keyed by company in KNOWN_BOT_PATTERNS
+CRAWLER_DNS_SUFFIXES = {
+    'Google': ('.googlebot.com', '.google.com', '.googleusercontent.com'),
+    'Microsoft': ('.search.msn.com',),
+    'Apple': ('.applebot.apple.com',),
+}
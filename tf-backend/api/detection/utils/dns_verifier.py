@@ -0,0 +1,197 @@
+# tf-backend/api/detection/utils/dns_verifier.py
+
+"""
+Reverse-then-forward DNS verification of claimed crawlers.
+
+An IP is verified for an operator when its PTR hostname ends in one of
+the operator's published suffixes and that hostname resolves back to the
+same IP. Lookups run as background tasks and their results are cached
+per IP and operator, so detection never waits on DNS.
+"""
+
+import asyncio
+import socket
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from core.cache import TTLCache
+from core.config import get_settings
+from core.logging_config import get_logger
+from .constants import CRAWLER_DNS_SUFFIXES
+
+logger = get_logger(__name__)
+
+class Resolver:
+    """DNS resolver interface used by CrawlerDNSVerifier"""
+
+    async def reverse(self, ip: str) -> List[str]:
+        """PTR hostnames for an IP, empty if there are none"""
+        raise NotImplementedError
+
+    async def forward(self, hostname: str) -> List[str]:
+        """Addresses a hostname resolves to, empty if it does not resolve"""
+        raise NotImplementedError
+
+class SystemResolver(Resolver):
+    """Resolver backed by the OS resolver, run in the loop's executor"""
+
+    async def reverse(self, ip: str) -> List[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            hostname, _ = await loop.getnameinfo((ip, 0), socket.NI_NAMEREQD)
+        except socket.gaierror:
+            return []
+        return [hostname]
+
+    async def forward(self, hostname: str) -> List[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            return []
+        return [info[4][0] for info in infos]
+
+class StubResolver(Resolver):
+    """Resolver answering from fixed tables, for tests and local development"""
+
+    def __init__(self, ptr: Optional[Dict[str, List[str]]] = None,
+                 addresses: Optional[Dict[str, List[str]]] = None):
+        self.ptr = ptr or {}
+        self.addresses = addresses or {}
+        self.lookups = 0
+
+    async def reverse(self, ip: str) -> List[str]:
+        self.lookups += 1
+        return list(self.ptr.get(ip, []))
+
+    async def forward(self, hostname: str) -> List[str]:
+        return list(self.addresses.get(hostname, []))
+
+VerificationCallback = Callable[[str, str, bool], Awaitable[None]]
+
+class CrawlerDNSVerifier:
+    """
+    Cached, deduplicated reverse-then-forward DNS verification.
+
+    Positive and negative results are cached separately with their own
+    TTLs. Concurrent requests for the same IP and operator share one
+    lookup. Lookups that fail or time out are not cached.
+    """
+
+    def __init__(self, resolver: Resolver, positive_ttl: float, negative_ttl: float,
+                 cache_size: int = 50000, timeout: float = 2.0,
+                 suffixes: Optional[Dict[str, Tuple[str, ...]]] = None):
+        self.resolver = resolver
+        self.timeout = timeout
+        self.suffixes = suffixes if suffixes is not None else CRAWLER_DNS_SUFFIXES
+
+        self.verified = TTLCache(cache_size, positive_ttl, name="dns_verified")
+        self.rejected = TTLCache(cache_size, negative_ttl, name="dns_rejected")
+
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def supports(self, operator: Optional[str]) -> bool:
+        """Whether an operator publishes DNS verification"""
+        return operator in self.suffixes
+
+    def cached(self, ip: str, operator: str) -> Optional[bool]:
+        """Cached result for an IP and operator, None if unknown"""
+        key = (ip, operator)
+        if self.verified.get(key) is not None:
+            return True
+        if self.rejected.get(key) is not None:
+            return False
+        return None
+
+    def schedule(self, ip: str, operator: str,
+                 on_result: Optional[VerificationCallback] = None) -> None:
+        """
+        Start verification in the background unless a lookup for the same
+        IP and operator is already running. on_result is awaited with
+        (ip, operator, verified) when a lookup completes.
+        """
+        key = (ip, operator)
+        if key in self._inflight or not self.supports(operator):
+            return
+        self._inflight[key] = asyncio.create_task(self._run(ip, operator, on_result))
+
+    async def verify(self, ip: str, operator: str) -> Optional[bool]:
+        """
+        Verify an IP for an operator, joining any lookup already running.
+
+        Returns:
+            True or False, or None if the operator does not publish DNS
+            verification or the lookup failed
+        """
+        if not self.supports(operator):
+            return None
+
+        result = self.cached(ip, operator)
+        if result is not None:
+            return result
+
+        key = (ip, operator)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._run(ip, operator, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        return {
+            "verified": self.verified.stats(),
+            "rejected": self.rejected.stats(),
+            "inflight": len(self._inflight)
+        }
+
+    async def _run(self, ip: str, operator: str,
+                   on_result: Optional[VerificationCallback]) -> Optional[bool]:
+        key = (ip, operator)
+        try:
+            try:
+                verified = await asyncio.wait_for(self._lookup(ip, operator), self.timeout)
+            except Exception as e:
+                logger.warning("crawler_dns_lookup_failed",
+                             ip=ip,
+                             operator=operator,
+                             error=str(e) or type(e).__name__)
+                return None
+
+            (self.verified if verified else self.rejected).put(key, True)
+            logger.info("crawler_dns_verified" if verified else "crawler_dns_rejected",
+                       ip=ip,
+                       operator=operator)
+
+            if on_result is not None:
+                try:
+                    await on_result(ip, operator, verified)
+                except Exception as e:
+                    logger.error("crawler_dns_callback_failed",
+                                ip=ip,
+                                operator=operator,
+                                error=str(e),
+                                exc_info=True)
+            return verified
+
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _lookup(self, ip: str, operator: str) -> bool:
+        suffixes = self.suffixes[operator]
+        for hostname in await self.resolver.reverse(ip):
+            hostname = hostname.rstrip('.').lower()
+            if not hostname.endswith(suffixes):
+                continue
+            if ip in await self.resolver.forward(hostname):
+                return True
+        return False
+
+@lru_cache()
+def get_dns_verifier() -> CrawlerDNSVerifier:
+    """Process-wide DNS verifier using the system resolver"""
+    settings = get_settings()
+    return CrawlerDNSVerifier(
+        SystemResolver(),
+        positive_ttl=settings.DNS_VERIFY_POSITIVE_TTL,
+        negative_ttl=settings.DNS_VERIFY_NEGATIVE_TTL,
+        cache_size=settings.DNS_VERIFY_CACHE_SIZE,
+        timeout=settings.DNS_VERIFY_TIMEOUT
+    )
@@ -0,0 +1,103 @@
+# tf-backend/api/detection/utils/fingerprint.py
+
+"""
+Header-order fingerprints.
+
+HTTP clients send their headers in a fixed order with fixed name casing,
+and Chromium-based browsers add client hints that have to agree with the
+user agent. A crawler farm reusing one HTTP stack produces the same
+fingerprint from every IP it runs on, even when it rotates user agents.
+
+The canonical form is the lowercased header names in received order,
+the casing class of each name and a client hint consistency code,
+hashed to a 64-bit ID. ASGI servers lowercase header names, so casing
+only distinguishes clients when the original names are available, e.g.
+in descriptors reported by publishers.
+"""
+
+import hashlib
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+# Distinct IPs sharing a fingerprint before a non-browser-like request
+# carrying it counts as part of a distributed crawl
+DISTRIBUTED_FINGERPRINT_IPS = 200
+
+# sec-ch-ua-platform values by ua_parser OS family
+_HINT_PLATFORMS = {
+    'Windows': 'Windows',
+    'Mac OS X': 'macOS',
+    'Linux': 'Linux',
+    'Ubuntu': 'Linux',
+    'Fedora': 'Linux',
+    'Android': 'Android',
+    'Chrome OS': 'Chrome OS',
+    'iOS': 'iOS',
+}
+
+# Browsers that never send client hints
+_NO_HINT_BROWSERS = ('Firefox', 'Safari', 'Mobile Safari')
+
+def _casing(name: str) -> str:
+    if name.islower():
+        return 'l'
+    if name.isupper():
+        return 'u'
+    if all(part[:1].isupper() and part[1:].islower() for part in name.split('-') if part):
+        return 't'
+    return 'm'
+
+def client_hint_state(headers: Mapping, client_info: Optional[Mapping]) -> str:
+    """
+    Check client hints against the parsed user agent.
+
+    Returns:
+        'n' if no hints were sent, 'c' if they agree with the user agent,
+        otherwise the mismatches found: 'b' hints from a browser that does
+        not send them, 'm' mobile flag, 'p' platform
+    """
+    if 'sec-ch-ua' not in headers and 'sec-ch-ua-mobile' not in headers:
+        return 'n'
+    if not client_info:
+        return 'c'
+
+    state = ''
+    if client_info['browser']['family'] in _NO_HINT_BROWSERS:
+        state += 'b'
+
+    mobile = headers.get('sec-ch-ua-mobile')
+    if mobile is not None and (mobile == '?1') != client_info['is_mobile']:
+        state += 'm'
+
+    platform = headers.get('sec-ch-ua-platform')
+    expected = _HINT_PLATFORMS.get(client_info['operating_system']['family'])
+    if platform is not None and expected is not None and platform.strip('"') != expected:
+        state += 'p'
+
+    return state or 'c'
+
+def header_order_fingerprint(header_names: Sequence[str], headers: Mapping,
+                             client_info: Optional[Mapping]) -> Tuple[str, str]:
+    """
+    Fingerprint a request's header names, order and casing together with
+    its client hint consistency.
+
+    Args:
+        header_names: Header names in received order, as sent
+        headers: Lowercased headers
+        client_info: Parsed user agent from UserAgentAnalyzer
+
+    Returns:
+        Tuple of (64-bit fingerprint as 16 hex digits, client hint state)
+    """
+    hints = client_hint_state(headers, client_info)
+    canonical = "\x1f".join((
+        ",".join(name.lower() for name in header_names),
+        "".join(_casing(name) for name in header_names),
+        hints
+    ))
+    digest = hashlib.blake2b(canonical.encode("utf-8", "surrogatepass"), digest_size=8)
+    return digest.hexdigest(), hints
+
+def header_names(descriptor: Dict) -> Sequence[str]:
+    """Header names of a request descriptor in received order"""
+    return descriptor.get('header_names') or list(descriptor['headers'])
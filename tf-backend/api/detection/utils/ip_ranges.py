@@ -0,0 +1,358 @@
+# tf-backend/api/detection/utils/ip_ranges.py
+
+"""
+In-memory index of published crawler IP ranges.
+
+Ranges are read from a directory of files, one or more per operator:
+
+- JSON in the format Google, Bing, OpenAI and others publish:
+  {"prefixes": [{"ipv4Prefix": "66.249.64.0/27"}, {"ipv6Prefix": "..."}]}
+  with an optional top-level "operator"
+- CSV with one range per row: cidr[,operator]
+
+When a file does not name its operator, the file name (without
+extension) is used. Operators are matched against the company of the
+detected bot pattern, e.g. "Google" or "OpenAI".
+
+The directory is CRAWLER_RANGES_DIR, or ~/.cache/trainfair/crawler_ranges
+(under XDG_CACHE_HOME when set) so downloads stay out of the source
+tree. The ranges in PUBLISHED_RANGES are downloaded into it by
+scripts/fetch_crawler_ranges.py and, when CRAWLER_RANGES_FETCH_INTERVAL
+is set, by the registry's background task; other files placed there are
+loaded as they are.
+"""
+
+import asyncio
+import csv
+import ipaddress
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import requests
+from core.config import get_settings
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_RANGES_DIR = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "trainfair" / "crawler_ranges"
+
+# Published crawler ranges, by operator (company name in KNOWN_BOT_PATTERNS)
+PUBLISHED_RANGES = {
+    "Google": "https://developers.google.com/static/search/apis/ipranges/googlebot.json",
+    "Microsoft": "https://www.bing.com/toolbox/bingbot.json",
+    "OpenAI": "https://openai.com/gptbot.json",
+    "Apple": "https://search.developer.apple.com/applebot.json",
+    "Perplexity": "https://www.perplexity.ai/perplexitybot.json",
+}
+
+_OPERATORS = 2 # Node slot holding the operators whose range ends here
+
+class CIDRIndex:
+    """
+    Binary radix tree over IP address bits, one per address family.
+    Lookups walk at most one node per prefix bit.
+    """
+
+    __slots__ = ('_roots', 'operators', '_size')
+
+    def __init__(self):
+        # Node layout: [zero child, one child, operators ending here]
+        self._roots = {4: [None, None, None], 6: [None, None, None]}
+        self.operators = frozenset()
+        self._size = 0
+
+    def add(self, cidr: str, operator: str) -> None:
+        """Add a range for an operator; host bits are ignored"""
+        network = ipaddress.ip_network(cidr.strip(), strict=False)
+        node = self._roots[network.version]
+        address = int(network.network_address)
+        width = network.max_prefixlen
+
+        for shift in range(width - 1, width - 1 - network.prefixlen, -1):
+            bit = (address >> shift) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = [None, None, None]
+            node = child
+
+        if node[_OPERATORS] is None:
+            node[_OPERATORS] = (operator,)
+        elif operator not in node[_OPERATORS]:
+            node[_OPERATORS] = node[_OPERATORS] + (operator,)
+
+        self.operators = self.operators | {operator}
+        self._size += 1
+
+    def lookup(self, ip: str) -> Tuple[str, ...]:
+        """
+        Operators whose ranges contain ip, most specific range last.
+        Returns an empty tuple for unknown or unparseable addresses.
+        """
+        # inet_pton is several times cheaper than ipaddress.ip_address
+        try:
+            if ':' in ip:
+                node, width = self._roots[6], 128
+                packed = socket.inet_pton(socket.AF_INET6, ip)
+            else:
+                node, width = self._roots[4], 32
+                packed = socket.inet_pton(socket.AF_INET, ip)
+        except (OSError, TypeError):
+            return ()
+
+        value = int.from_bytes(packed, 'big')
+        matches = ()
+
+        for shift in range(width - 1, -1, -1):
+            node = node[(value >> shift) & 1]
+            if node is None:
+                break
+            if node[_OPERATORS] is not None:
+                matches += node[_OPERATORS]
+
+        return matches
+
+    def __len__(self) -> int:
+        return self._size
+
+def _json_prefixes(data) -> Iterable[str]:
+    entries = data.get("prefixes", []) if isinstance(data, dict) else data
+    for entry in entries:
+        if isinstance(entry, str):
+            yield entry
+        elif isinstance(entry, dict):
+            prefix = entry.get("ipv4Prefix") or entry.get("ipv6Prefix") or entry.get("prefix")
+            if prefix:
+                yield prefix
+
+def load_range_file(path: Path) -> List[Tuple[str, str]]:
+    """
+    Read one JSON or CSV range file.
+
+    Returns:
+        List of (cidr, operator) pairs
+    """
+    default_operator = path.stem
+
+    if path.suffix.lower() == ".json":
+        with path.open() as f:
+            data = json.load(f)
+        operator = data.get("operator", default_operator) if isinstance(data, dict) else default_operator
+        return [(prefix, operator) for prefix in _json_prefixes(data)]
+
+    ranges = []
+    with path.open(newline="") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                continue
+            operator = row[1].strip() if len(row) > 1 and row[1].strip() else default_operator
+            ranges.append((row[0].strip(), operator))
+    return ranges
+
+def fetch_published_ranges(directory: Path, max_age: float = 0.0,
+                           timeout: float = 30.0) -> Dict[str, int]:
+    """
+    Download the PUBLISHED_RANGES into directory, one JSON file per
+    operator, each replaced atomically. Blocking; run it off the event loop.
+
+    Args:
+        directory: Crawler ranges directory, created if missing
+        max_age: Skip operators whose file is younger than this many seconds
+        timeout: HTTP timeout per download, in seconds
+
+    Returns:
+        Number of ranges written, by operator; failed downloads are logged
+        and leave the previous file in place
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    fetched = {}
+
+    for operator, url in PUBLISHED_RANGES.items():
+        slug = operator.lower().replace(" ", "_")
+        path = directory / f"{slug}.json"
+        try:
+            if max_age and path.is_file() and time.time() - path.stat().st_mtime < max_age:
+                continue
+
+            response = requests.get(url, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+            data["operator"] = operator
+
+            # Each process writes its own temporary file, so concurrent
+            # fetches never replace the file with a partial write
+            with tempfile.NamedTemporaryFile("w", dir=directory, prefix=f".{slug}.",
+                                             suffix=".tmp", delete=False) as tmp:
+                json.dump(data, tmp)
+            try:
+                os.replace(tmp.name, path)
+            except OSError:
+                os.unlink(tmp.name)
+                raise
+            fetched[operator] = len(data.get("prefixes", []))
+
+        except (requests.RequestException, OSError, ValueError, AttributeError) as e:
+            logger.error("crawler_ranges_fetch_failed",
+                        operator=operator,
+                        url=url,
+                        error=str(e))
+
+    if fetched:
+        logger.info("crawler_ranges_fetched",
+                   directory=str(directory),
+                   ranges=fetched)
+    return fetched
+
+class CrawlerRangeRegistry:
+    """
+    Holds the current CIDRIndex for a directory of range files and swaps
+    in a rebuilt index when the files change.
+
+    Lookups only read the current index. Once started, a background task
+    checks the directory every reload_interval seconds by comparing file
+    names, sizes and mtimes, off the event loop, and downloads the
+    published ranges again when they are older than fetch_interval. A
+    file that fails to parse keeps the previous index in place.
+    """
+
+    def __init__(self, directory: Path, reload_interval: float = 30.0,
+                 fetch_interval: float = 0.0):
+        """
+        Args:
+            directory: Directory of JSON and CSV range files
+            reload_interval: Seconds between file change checks
+            fetch_interval: Seconds before published ranges are downloaded
+                again; 0 never downloads them
+        """
+        self.directory = Path(directory)
+        self.reload_interval = reload_interval
+        self.fetch_interval = fetch_interval
+
+        self._index = CIDRIndex()
+        self._signature = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.reload()
+
+    @property
+    def index(self) -> CIDRIndex:
+        return self._index
+
+    def lookup(self, ip: str) -> Tuple[str, ...]:
+        """Operators whose published ranges contain ip"""
+        return self._index.lookup(ip)
+
+    def verify(self, ip: str, operator: str) -> Optional[bool]:
+        """
+        Check an IP against an operator's published ranges.
+
+        Returns:
+            True if ip is in the operator's ranges, False if it is not,
+            None if no ranges are loaded for the operator
+        """
+        index = self._index
+        if operator not in index.operators:
+            return None
+        return operator in index.lookup(ip)
+
+    async def start(self) -> None:
+        """Check for range file changes, and fetch published ranges, in the background"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def refresh(self) -> bool:
+        """
+        Download stale published ranges, if enabled, then reload. Blocking.
+
+        Returns:
+            True if a new index was swapped in
+        """
+        if self.fetch_interval > 0:
+            fetch_published_ranges(self.directory, max_age=self.fetch_interval)
+        return self.reload()
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Rebuild the index if the range files changed. Blocking.
+
+        Returns:
+            True if a new index was swapped in
+        """
+        with self._lock:
+            index = CIDRIndex()
+            path = self.directory
+            try:
+                files = self._range_files()
+                signature = tuple(
+                    (file.name, file.stat().st_mtime_ns, file.stat().st_size) for file in files
+                )
+                if signature == self._signature and not force:
+                    return False
+
+                for path in files:
+                    for cidr, operator in load_range_file(path):
+                        index.add(cidr, operator)
+            except (OSError, ValueError, TypeError) as e:
+                logger.error("crawler_ranges_load_failed",
+                            directory=str(self.directory),
+                            file=str(path),
+                            error=str(e))
+                return False
+
+            self._index = index
+            self._signature = signature
+            if not index.operators:
+                logger.warning("crawler_ranges_empty",
+                              directory=str(self.directory))
+            else:
+                logger.info("crawler_ranges_loaded",
+                           directory=str(self.directory),
+                           ranges=len(index),
+                           operators=sorted(index.operators))
+            return True
+
+    def _range_files(self) -> List[Path]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(
+            path for path in self.directory.iterdir()
+            if path.is_file() and path.suffix.lower() in (".json", ".csv")
+        )
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("crawler_ranges_refresh_failed",
+                            directory=str(self.directory),
+                            error=str(e))
+            await asyncio.sleep(self.reload_interval)
+
+@lru_cache()
+def get_crawler_ranges() -> CrawlerRangeRegistry:
+    """Process-wide crawler range registry"""
+    settings = get_settings()
+    return CrawlerRangeRegistry(
+        Path(settings.CRAWLER_RANGES_DIR) if settings.CRAWLER_RANGES_DIR else DEFAULT_RANGES_DIR,
+        settings.CRAWLER_RANGES_RELOAD_INTERVAL,
+        settings.CRAWLER_RANGES_FETCH_INTERVAL
+    )
@@ -0,0 +1,130 @@
+# tf-backend/api/detection/utils/pattern_index.py
+
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+from .constants import KNOWN_BOT_PATTERNS
+
+class PatternMatch(NamedTuple):
+    pattern: str
+    company: str
+    type: str
+    confidence: float
+
+class BotPatternIndex:
+    """
+    Immutable Aho-Corasick automaton over known bot user agent patterns.
+
+    The automaton is built once and then scanned in a single pass over the
+    lowercased user agent, so matching cost depends on the user agent length
+    rather than on the number of patterns.
+    """
+
+    __slots__ = ('_goto', '_fail', '_output', '_patterns', '_precedence')
+
+    def __init__(self, patterns: Mapping[str, Dict]):
+        """
+        Compile the pattern table into an automaton.
+
+        Args:
+            patterns: Mapping of lowercase UA substring to its bot info
+                (company, type, confidence)
+        """
+        entries = tuple(
+            PatternMatch(
+                pattern=pattern.lower(),
+                company=info['company'],
+                type=info['type'],
+                confidence=float(info['confidence'])
+            )
+            for pattern, info in patterns.items()
+            if pattern
+        )
+
+        # Most specific wins: longest pattern first, then highest confidence,
+        # then declaration order
+        ranked = sorted(
+            range(len(entries)),
+            key=lambda i: (-len(entries[i].pattern), -entries[i].confidence, i)
+        )
+        precedence = [0] * len(entries)
+        for rank, i in enumerate(ranked):
+            precedence[i] = rank
+
+        goto = [{}]
+        output = [[]]
+
+        for i, entry in enumerate(entries):
+            state = 0
+            for ch in entry.pattern:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    output.append([])
+                state = next_state
+            output[state].append(i)
+
+        # Breadth-first pass to compute failure links and merge outputs
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(ch, 0)
+                output[next_state].extend(output[fail[next_state]])
+
+        self._goto = tuple(MappingProxyType(edges) for edges in goto)
+        self._fail = tuple(fail)
+        self._output = tuple(tuple(matches) for matches in output)
+        self._patterns = entries
+        self._precedence = tuple(precedence)
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def match(self, user_agent: str) -> Tuple[PatternMatch, ...]:
+        """
+        Find every known pattern contained in a user agent.
+
+        Args:
+            user_agent: The raw user agent string
+
+        Returns:
+            Tuple of matches ordered by precedence, most specific first.
+            Empty if nothing matched.
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+
+        found = set()
+        state = 0
+        for ch in user_agent.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+
+        if not found:
+            return ()
+
+        precedence = self._precedence
+        return tuple(self._patterns[i] for i in sorted(found, key=precedence.__getitem__))
+
+    def best_match(self, user_agent: str) -> Optional[PatternMatch]:
+        """Return the most specific matching pattern, or None."""
+        matches = self.match(user_agent)
+        return matches[0] if matches else None
+
+@lru_cache()
+def get_pattern_index() -> BotPatternIndex:
+    """Process-wide pattern index, compiled on first use."""
+    return BotPatternIndex(KNOWN_BOT_PATTERNS)
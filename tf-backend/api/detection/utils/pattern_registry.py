@@ -0,0 +1,285 @@
+# tf-backend/api/detection/utils/pattern_registry.py
+
+"""
+Hot-reloadable bot pattern registry.
+
+The pattern table is stored in Redis at bot_patterns as one JSON
+document, {"version": n, "patterns": {...}}. Every change rewrites the
+document with the next version and announces it on the
+bot_patterns:updates channel, in one script call, so all writers see
+the same version sequence.
+
+Each worker holds an immutable PatternSnapshot (version, patterns and
+their compiled BotPatternIndex) and swaps in a new one when it hears of
+a different version. It also re-reads the document every reload_interval
+seconds in case a message was missed. A request that takes a snapshot
+sees one consistent pattern table however long it runs. Until the first
+load, and whenever Redis has no document, the patterns bundled in
+constants.py are served as version 0.
+"""
+
+import asyncio
+import hashlib
+import json
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional
+import redis.asyncio
+from redis.exceptions import RedisError
+from core.config import get_settings
+from core.logging_config import get_logger
+from core.redis_client import RedisClientFactory
+from .constants import KNOWN_BOT_PATTERNS
+from .pattern_index import BotPatternIndex, get_pattern_index
+from .verdict_cache import get_verdict_cache
+
+logger = get_logger(__name__)
+
+PATTERNS_KEY = "bot_patterns"
+UPDATES_CHANNEL = "bot_patterns:updates"
+
+# Apply upserts and removals to the stored pattern table (or to the
+# bundled table if there is none yet), bump the version and announce it.
+#
+# KEYS[1] pattern document
+# ARGV[1] bundled patterns (JSON), ARGV[2] upserts (JSON object),
+# ARGV[3] removals (JSON array), ARGV[4] '1' to replace the whole table
+# with the upserts, ARGV[5] updates channel
+#
+# Returns the new document.
+PATTERN_UPDATE_LUA = """
+local stored = redis.call('GET', KEYS[1])
+local document
+if stored then
+    document = cjson.decode(stored)
+else
+    document = {version = 0, patterns = cjson.decode(ARGV[1])}
+end
+
+local upserts = cjson.decode(ARGV[2])
+if ARGV[4] == '1' then
+    document.patterns = upserts
+else
+    for pattern, info in pairs(upserts) do
+        document.patterns[pattern] = info
+    end
+end
+for _, pattern in ipairs(cjson.decode(ARGV[3])) do
+    document.patterns[pattern] = nil
+end
+
+document.version = document.version + 1
+local encoded = cjson.encode(document)
+redis.call('SET', KEYS[1], encoded)
+redis.call('PUBLISH', ARGV[5], document.version)
+return encoded
+"""
+
+class PatternSnapshot(NamedTuple):
+    version: int
+    patterns: Mapping[str, Mapping]
+    index: BotPatternIndex
+    etag: str
+
+def build_snapshot(version: int, patterns: Mapping[str, Dict],
+                   index: Optional[BotPatternIndex] = None) -> PatternSnapshot:
+    """Compile a pattern table into a read-only snapshot"""
+    canonical = json.dumps(patterns, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).hexdigest()
+    frozen = MappingProxyType({
+        pattern: MappingProxyType(dict(info)) for pattern, info in patterns.items()
+    })
+    return PatternSnapshot(
+        version=version,
+        patterns=frozen,
+        index=index if index is not None else BotPatternIndex(patterns),
+        etag=f'"{version}-{digest}"'
+    )
+
+def validate_patterns(patterns: Mapping[str, Dict]) -> Dict[str, Dict]:
+    """
+    Check pattern entries before they are stored.
+
+    Returns:
+        The entries with lowercased patterns and only the known fields
+
+    Raises:
+        ValueError: If an entry is missing a field or has an invalid
+            confidence
+    """
+    validated = {}
+    for pattern, info in patterns.items():
+        if not pattern or not isinstance(info, Mapping):
+            raise ValueError(f"Invalid bot pattern entry: {pattern!r}")
+        try:
+            entry = {
+                'company': str(info['company']),
+                'type': str(info['type']),
+                'confidence': float(info['confidence'])
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid bot pattern entry {pattern!r}: {e}") from e
+        if not 0.0 <= entry['confidence'] <= 1.0:
+            raise ValueError(f"Confidence for {pattern!r} must be between 0 and 1")
+        validated[pattern.lower()] = entry
+    return validated
+
+class PatternRegistry:
+    """
+    Holds the current PatternSnapshot for a worker and keeps it in step
+    with the pattern document in Redis.
+    """
+
+    def __init__(self, client: redis.asyncio.Redis, reload_interval: float = 60.0,
+                 bundled: Mapping[str, Dict] = KNOWN_BOT_PATTERNS):
+        self.client = client
+        self.reload_interval = reload_interval
+        self.bundled = bundled
+
+        self.snapshot = build_snapshot(
+            0, bundled, get_pattern_index() if bundled is KNOWN_BOT_PATTERNS else None
+        )
+        self.on_swap: List[Callable[[PatternSnapshot], None]] = []
+
+        self._update = client.register_script(PATTERN_UPDATE_LUA)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def index(self) -> BotPatternIndex:
+        return self.snapshot.index
+
+    async def start(self) -> None:
+        """Load the stored patterns and follow updates in the background"""
+        if self._task is not None and not self._task.done():
+            return
+        await self.load()
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self) -> bool:
+        """
+        Swap in the stored patterns if their version differs from the
+        current snapshot
+
+        Returns:
+            True if a new snapshot was swapped in
+        """
+        try:
+            stored = await self.client.get(PATTERNS_KEY)
+        except RedisError as e:
+            logger.error("redis_error_loading_bot_patterns",
+                        error=str(e),
+                        exc_info=True)
+            return False
+
+        if stored is None:
+            return False
+
+        try:
+            document = json.loads(stored)
+            version = int(document['version'])
+            if version == self.snapshot.version:
+                return False
+            snapshot = build_snapshot(version, document['patterns'])
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            logger.error("bot_patterns_load_failed",
+                        error=str(e))
+            return False
+
+        self._swap(snapshot)
+        return True
+
+    async def update(self, upserts: Optional[Mapping[str, Dict]] = None,
+                     removals: Iterable[str] = (), replace: bool = False) -> PatternSnapshot:
+        """
+        Store a new pattern version and announce it to every worker.
+
+        Args:
+            upserts: Patterns to add or change
+            removals: Patterns to remove
+            replace: Replace the whole table with upserts
+
+        Returns:
+            The new snapshot, already swapped in on this worker
+        """
+        upserts = validate_patterns(upserts or {})
+        removals = [pattern.lower() for pattern in removals]
+
+        stored = await self._update(
+            keys=[PATTERNS_KEY],
+            args=[
+                json.dumps(dict(self.bundled)),
+                json.dumps(upserts) if upserts else "{}",
+                json.dumps(removals) if removals else "[]",
+                "1" if replace else "0",
+                UPDATES_CHANNEL
+            ]
+        )
+        document = json.loads(stored)
+        snapshot = build_snapshot(int(document['version']), document['patterns'])
+        if snapshot.version != self.snapshot.version:
+            self._swap(snapshot)
+        return snapshot
+
+    def _swap(self, snapshot: PatternSnapshot) -> None:
+        previous = self.snapshot
+        self.snapshot = snapshot
+        logger.info("bot_patterns_swapped",
+                   previous_version=previous.version,
+                   version=snapshot.version,
+                   patterns=len(snapshot.patterns))
+
+        for callback in self.on_swap:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error("bot_patterns_swap_callback_failed",
+                            error=str(e),
+                            exc_info=True)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(UPDATES_CHANNEL)
+                # Catch up on anything published while not subscribed
+                await self.load()
+
+                while True:
+                    message = await pubsub.get_message(timeout=self.reload_interval)
+                    if message is None:
+                        await self.load()
+                    elif int(message['data']) != self.snapshot.version:
+                        await self.load()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("bot_patterns_subscription_failed",
+                            error=str(e))
+                await asyncio.sleep(min(self.reload_interval, 5.0))
+            finally:
+                await pubsub.aclose()
+
+@lru_cache()
+def get_pattern_registry() -> PatternRegistry:
+    """
+    Process-wide pattern registry on the shared async Redis client.
+    Cached verdicts are dropped whenever the patterns change.
+    """
+    registry = PatternRegistry(
+        RedisClientFactory.get_async_client(),
+        reload_interval=get_settings().BOT_PATTERNS_RELOAD_INTERVAL
+    )
+    verdict_cache = get_verdict_cache()
+    if verdict_cache is not None:
+        registry.on_swap.append(lambda snapshot: verdict_cache.clear())
+    return registry
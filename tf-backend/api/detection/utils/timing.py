@@ -0,0 +1,129 @@
+# tf-backend/api/detection/utils/timing.py
+
+"""
+Streaming request rate and timing estimators.
+
+Each publisher and IP keeps a handful of numbers that are updated in O(1)
+per request:
+
+- an exponentially decayed request count and elapsed-time mass, whose
+  ratio is the recent request rate (it reduces to count / elapsed while
+  the key is younger than the decay window)
+- the mean and population variance of inter-arrival intervals, updated
+  with Welford's recurrence; once more than `window` intervals have been
+  seen, older intervals are forgotten exponentially with weight 1/window
+
+The Lua detection state script implements the same recurrences, so this
+class and Redis produce the same numbers.
+"""
+
+import math
+from typing import Dict, Optional
+
+# Minimum number of requests before rate and timing features are reported
+MIN_REQUESTS = 10
+
+# Decay time constant for the request rate, in seconds
+RATE_WINDOW = 10.0
+
+# Intervals after which older intervals start being forgotten
+TIMING_WINDOW = 100
+
+# Interval coefficient of variation at or below which timing is treated as
+# machine-regular (real crawlers with jitter sit well under this, people
+# browsing are usually above 1)
+CONSISTENT_TIMING_CV = 0.1
+
+class RequestTimingStats:
+    """Incremental rate and inter-arrival statistics for one client"""
+
+    __slots__ = ('rate_window', 'window', 'count', 'last', 'decayed_count',
+                 'decayed_time', 'interval_mean', 'interval_var')
+
+    def __init__(self, rate_window: float = RATE_WINDOW, window: int = TIMING_WINDOW):
+        """
+        Args:
+            rate_window: Decay time constant for the request rate, in seconds
+            window: Number of intervals after which older intervals start
+                being forgotten
+        """
+        self.rate_window = rate_window
+        self.window = window
+        self.count = 0
+        self.last = 0.0
+        self.decayed_count = 0.0
+        self.decayed_time = 0.0
+        self.interval_mean = 0.0
+        self.interval_var = 0.0
+
+    def update(self, timestamp: float) -> None:
+        """Record a request at a Unix timestamp"""
+        if self.count == 0:
+            self.count = 1
+            self.last = timestamp
+            self.decayed_count = 1.0
+            return
+
+        interval = timestamp - self.last
+        if interval < 0:
+            # Late arrival: count it, but don't move the clock backwards
+            interval = 0.0
+        else:
+            self.last = timestamp
+
+        decay = math.exp(-interval / self.rate_window)
+        self.decayed_count = self.decayed_count * decay + 1.0
+        self.decayed_time = self.decayed_time * decay + interval
+
+        weight = 1.0 / min(self.count, self.window)
+        delta = interval - self.interval_mean
+        self.interval_mean += weight * delta
+        self.interval_var = (1.0 - weight) * (self.interval_var + weight * delta * delta)
+
+        self.count += 1
+
+    def features(self) -> Dict:
+        """Rate and timing features, None where there is not enough data"""
+        return timing_features(
+            self.count,
+            self.decayed_count,
+            self.decayed_time,
+            self.interval_mean,
+            self.interval_var
+        )
+
+def timing_features(count: int, decayed_count: float, decayed_time: float,
+                    interval_mean: float, interval_var: float) -> Dict:
+    """
+    Turn raw estimator state into detection features.
+
+    Returns:
+        Dict with count, requests_per_second, interval_mean and
+        interval_cv (coefficient of variation of intervals)
+    """
+    requests_per_second: Optional[float] = None
+    interval_cv: Optional[float] = None
+
+    if count >= MIN_REQUESTS:
+        if decayed_time > 0:
+            requests_per_second = decayed_count / decayed_time
+        if interval_mean > 0:
+            interval_cv = math.sqrt(max(interval_var, 0.0)) / interval_mean
+
+    return {
+        'count': count,
+        'requests_per_second': requests_per_second,
+        'interval_mean': interval_mean if count >= MIN_REQUESTS else None,
+        'interval_cv': interval_cv
+    }
+
+def timing_regularity(interval_cv: Optional[float]) -> float:
+    """
+    Map interval variation to a 0-1 regularity score.
+
+    1.0 means perfectly periodic, 0.0 means variation at least as large
+    as the mean interval, which is typical of human browsing.
+    """
+    if interval_cv is None:
+        return 0.0
+    return max(0.0, 1.0 - interval_cv)
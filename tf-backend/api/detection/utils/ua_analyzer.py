@@ -1,27 +1,102 @@
 # tf-backend/api/detection/utils/ua_analyzer.py
 
-from typing import Dict
+from functools import lru_cache
+from typing import Iterable, List, Mapping, Optional
 import ua_parser.user_agent_parser
+from core.cache import LRUCache, freeze
+from core.config import get_settings
+from core.executors import OffloadExecutor, get_offload_executor
 from .constants import BOT_INDICATORS, MOBILE_OS
+from .ua_fastpath import classify_user_agent
+
+# A full ua_parser parse costs about as much as parsing this many bytes
+# of HTML, which is how UA jobs are sized for the offload executor
+UA_PARSE_COST = 4096
+
+@lru_cache()
+def get_ua_cache() -> LRUCache:
+    """Process-wide cache of analyzed user agents, keyed by the exact UA string"""
+    return LRUCache(get_settings().UA_CACHE_SIZE, name="user_agent")
+
+def parse_user_agents(user_agent_strings: List[str], fast_path: bool = True) -> List[dict]:
+    """Uncached analyses of several user agents, as an executor job"""
+    analyzer = UserAgentAnalyzer(fast_path=fast_path)
+    return [analyzer._parse_user_agent(user_agent_string) for user_agent_string in user_agent_strings]
 
 class UserAgentAnalyzer:
     """
     Analyzes User Agent strings to extract detailed information about the client.
     """
     
-    def analyze_user_agent(self, user_agent_string: str) -> Dict:
+    def __init__(self, cache: Optional[LRUCache] = None, fast_path: Optional[bool] = None):
+        self.cache = cache if cache is not None else get_ua_cache()
+        self.fast_path = get_settings().UA_FAST_PATH if fast_path is None else fast_path
+    
+    def analyze_user_agent(self, user_agent_string: str) -> Mapping:
         """
         Parse and analyze a user agent string to extract detailed information.
         
+        Results are cached and shared between requests, so the returned
+        mapping is read-only.
+        
         Args:
             user_agent_string: The raw user agent string from the request
             
         Returns:
-            Dict containing parsed user agent information
+            Read-only mapping containing parsed user agent information
         """
-        # Parse the user agent string
-        parsed_ua = ua_parser.user_agent_parser.Parse(user_agent_string)
+        analysis = self.cache.get(user_agent_string)
+        if analysis is None:
+            analysis = freeze(self._parse_user_agent(user_agent_string))
+            self.cache.put(user_agent_string, analysis)
+        
+        return analysis
+    
+    async def prepare(self, user_agent_strings: Iterable[str],
+                      executor: Optional[OffloadExecutor] = None) -> None:
+        """
+        Analyze the user agents missing from the cache off the event loop,
+        so analyze_user_agent then finds them cached.
+        
+        Shapes the fast path settles are analyzed inline, since handing
+        them to an executor would cost more than parsing them.
         
+        Args:
+            user_agent_strings: User agents about to be analyzed
+            executor: Executor for the full parser, the shared one by default
+        """
+        missing = []
+        for user_agent_string in dict.fromkeys(user_agent_strings):
+            if user_agent_string in self.cache:
+                continue
+            parsed_ua = classify_user_agent(user_agent_string) if self.fast_path else None
+            if parsed_ua is not None:
+                self.cache.put(user_agent_string, freeze(self._analyze_parsed(parsed_ua)))
+            else:
+                missing.append(user_agent_string)
+        
+        if not missing:
+            return
+        
+        executor = executor or get_offload_executor()
+        analyses = await executor.run(parse_user_agents, missing, self.fast_path,
+                                      size=len(missing) * UA_PARSE_COST)
+        for user_agent_string, analysis in zip(missing, analyses):
+            self.cache.put(user_agent_string, freeze(analysis))
+    
+    def _parse_user_agent(self, user_agent_string: str) -> dict:
+        """
+        Parse a user agent string, settling common shapes with the token
+        trie and the rest with the full ua_parser regex cascade.
+        """
+        # Parse the user agent string
+        parsed_ua = classify_user_agent(user_agent_string) if self.fast_path else None
+        if parsed_ua is None:
+            parsed_ua = ua_parser.user_agent_parser.Parse(user_agent_string)
+        return self._analyze_parsed(parsed_ua)
+    
+    def _analyze_parsed(self, parsed_ua: dict) -> dict:
+        """Analysis of a ua_parser result"""
         # Extract user agent details
         user_agent = parsed_ua['user_agent']
         browser = {
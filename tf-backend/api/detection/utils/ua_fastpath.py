@@ -0,0 +1,304 @@
+# tf-backend/api/detection/utils/ua_fastpath.py
+
+"""
+Fast pre-classifier for common user agent shapes.
+
+Most traffic comes from a few browser builds and well-behaved bots, but
+every distinct string still pays for ua_parser's regex cascade on its
+first sighting. Randomized scraper UAs have a long tail, so the cache
+rarely helps them. This module splits a UA into product tokens and
+comments in one regex pass, then walks a token trie of known sequences
+(comments left out below):
+
+    Mozilla > AppleWebKit > Chrome > Safari           Chrome
+    Mozilla > AppleWebKit > Chrome > Safari > Edg     Edge
+    Mozilla > AppleWebKit > Chrome > Mobile > Safari  Chrome Mobile
+    Mozilla > Gecko > Firefox                         Firefox
+    ...
+
+The leaf names the browser family and the token carrying its version.
+The platform comment has to be one of a few exact forms, such as Windows
+NT, Intel Mac OS X, X11 Linux, iPhone/iPad or Chrome's reduced Android
+"K". Bots settled here are well-known crawlers sending their own
+contact link, and a handful of HTTP client libraries.
+
+A result has the same shape and values ua_parser.user_agent_parser.Parse
+gives for the string. Any extra token, unknown comment or odd version
+returns None, and the caller falls through to the full parser.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# One product token (name, optional /version) or parenthesized comment,
+# after at most one space
+_TOKEN = re.compile(r" ?(?:\(([^()]*)\)|([^\s/()]+)(?:/([^\s/()]+))?)")
+
+# Trie key standing for a comment between product tokens
+COMMENT = '()'
+
+_VERSION = re.compile(r"^(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:\.\d+)?$")
+# Shapes of the version a browser is identified by. ua_parser reads a
+# bare major as some other browser, and only takes Chrome on Android
+# for Chrome Mobile with its full four-part version
+_ANY_VERSION = _VERSION
+_MAJOR_MINOR = re.compile(r"^\d+\.\d+(?:\.\d+){0,2}$")
+_FULL_VERSION = re.compile(r"^\d+\.\d+\.\d+\.\d+$")
+# Versions of the tokens around the one a browser is identified by.
+# Anything else there can trip one of ua_parser's earlier rules
+_TOKEN_VERSIONS = {
+    'Mozilla': re.compile(r"^5\.0$"),
+    'Chrome': re.compile(r"^\d+(?:\.\d+){0,3}$"),
+    'AppleWebKit': re.compile(r"^\d+(?:\.\d+){0,2}$"),
+    'Safari': re.compile(r"^\d+(?:\.\d+){0,2}$"),
+    'Gecko': re.compile(r"^\d{8}$"),
+    'Mobile': re.compile(r"^\d+[A-Z]\d+$"),
+}
+
+# Crawlers to the contact links they send. ua_parser looks for OS and device
+# names anywhere in the string and has rules for particular crawler names,
+# so only pairs checked against it are settled here
+_KNOWN_BOTS = {
+    'Googlebot': frozenset({'+http://www.google.com/bot.html'}),
+    'bingbot': frozenset({'+http://www.bing.com/bingbot.htm'}),
+    'AhrefsBot': frozenset({'+http://ahrefs.com/robot/'}),
+    'SemrushBot': frozenset({'+http://www.semrush.com/bot.html'}),
+    'YandexBot': frozenset({'+http://yandex.com/bots'}),
+    'DuckDuckBot': frozenset({'+http://duckduckgo.com/duckduckbot.html'}),
+    'GPTBot': frozenset({'+https://openai.com/gptbot'}),
+    'ClaudeBot': frozenset({'+claudebot@anthropic.com'}),
+    'PerplexityBot': frozenset({'+https://perplexity.ai/perplexitybot'}),
+    'CCBot': frozenset({'https://commoncrawl.org/faq/'}),
+}
+
+_WINDOWS_NT = {'10.0': ('10', None), '6.3': ('8', '1'), '6.2': ('8', None), '6.1': ('7', None)}
+_WINDOWS_FLAGS = frozenset({'Win64', 'x64', 'WOW64'})
+_MAC_OS = re.compile(r"^Intel Mac OS X (\d+)[_.](\d+)(?:[_.](\d+))?$")
+_IOS = re.compile(r"^CPU (iPhone )?OS (\d+)_(\d+)(?:_(\d+))? like Mac OS X$")
+_ANDROID = re.compile(r"^Android (\d+)$")
+_FIREFOX_RV = re.compile(r"^rv:\d+\.\d+$")
+
+_NO_DEVICE = {'family': 'Other', 'brand': None, 'model': None}
+_MAC_DEVICE = {'family': 'Mac', 'brand': 'Apple', 'model': 'Mac'}
+_SPIDER_DEVICE = {'family': 'Spider', 'brand': 'Spider', 'model': 'Desktop'}
+_ANDROID_DEVICE = {'family': 'K', 'brand': 'Generic_Android', 'model': 'K'}
+_NO_OS = {'family': 'Other', 'major': None, 'minor': None, 'patch': None, 'patch_minor': None}
+
+class Leaf(NamedTuple):
+    family: str
+    version_token: str
+    version: re.Pattern
+    platforms: frozenset
+
+_DESKTOP = frozenset({'windows', 'mac', 'linux'})
+
+# Token sequences to the browser they identify. The first comment is the
+# platform; a second one must be (KHTML, like Gecko)
+_LEAVES = {
+    ('Mozilla', COMMENT, 'AppleWebKit', COMMENT, 'Chrome', 'Safari'):
+        Leaf('Chrome', 'Chrome', _MAJOR_MINOR, _DESKTOP),
+    ('Mozilla', COMMENT, 'AppleWebKit', COMMENT, 'Chrome', 'Safari', 'Edg'):
+        Leaf('Edge', 'Edg', _ANY_VERSION, _DESKTOP),
+    ('Mozilla', COMMENT, 'AppleWebKit', COMMENT, 'Chrome', 'Mobile', 'Safari'):
+        Leaf('Chrome Mobile', 'Chrome', _FULL_VERSION, frozenset({'android'})),
+    ('Mozilla', COMMENT, 'AppleWebKit', COMMENT, 'Version', 'Safari'):
+        Leaf('Safari', 'Version', _MAJOR_MINOR, frozenset({'mac'})),
+    ('Mozilla', COMMENT, 'AppleWebKit', COMMENT, 'Version', 'Mobile', 'Safari'):
+        Leaf('Mobile Safari', 'Version', _MAJOR_MINOR, frozenset({'ios'})),
+    ('Mozilla', COMMENT, 'AppleWebKit', COMMENT, 'CriOS', 'Mobile', 'Safari'):
+        Leaf('Chrome Mobile iOS', 'CriOS', _ANY_VERSION, frozenset({'ios'})),
+    ('Mozilla', COMMENT, 'Gecko', 'Firefox'):
+        Leaf('Firefox', 'Firefox', _MAJOR_MINOR, _DESKTOP),
+}
+
+# HTTP client libraries: product name to (family, version parts ua_parser
+# needs, version parts it keeps, device)
+_CLIENT_LIBRARIES = {
+    'curl': ('curl', 1, 3, _NO_DEVICE),
+    'Wget': ('Wget', 1, 3, _NO_DEVICE),
+    'python-requests': ('Python Requests', 2, 2, _NO_DEVICE),
+    'Python-urllib': ('Python-urllib', 1, 3, _SPIDER_DEVICE),
+    'Go-http-client': ('Go-http-client', 1, 3, _NO_DEVICE),
+    'okhttp': ('okhttp', 1, 3, _NO_DEVICE),
+}
+
+def _build_trie() -> Dict:
+    trie = {}
+    for sequence, leaf in _LEAVES.items():
+        node = trie
+        for name in sequence:
+            node = node.setdefault(name, {})
+        node[None] = leaf
+    return trie
+
+_TRIE = _build_trie()
+
+def _version(value: Optional[str], parts: int = 3) -> Optional[Tuple]:
+    """Major, minor and patch as ua_parser reports them, or None if not plain digits"""
+    found = _VERSION.match(value) if value else None
+    if found is None:
+        return None
+    return found.groups()[:parts] + (None,) * (3 - parts)
+
+def _os(family: str, major=None, minor=None, patch=None) -> Dict:
+    return {'family': family, 'major': major, 'minor': minor, 'patch': patch, 'patch_minor': None}
+
+def _parsed(family: str, version: Tuple, os: Dict, device: Dict, string: str) -> Dict:
+    return {
+        'user_agent': {'family': family, 'major': version[0], 'minor': version[1], 'patch': version[2]},
+        'os': os,
+        'device': device,
+        'string': string
+    }
+
+def _platform(comment: str, gecko: bool):
+    """
+    Platform kind, operating system and device for a browser's platform
+    comment, or None if it is not one of the known forms
+    """
+    parts = comment.split('; ')
+    if gecko:
+        if not _FIREFOX_RV.match(parts[-1]):
+            return None
+        parts = parts[:-1]
+    if not parts:
+        return None
+
+    first = parts[0]
+    if first.startswith('Windows NT '):
+        version = _WINDOWS_NT.get(first[11:])
+        if version is None or not _WINDOWS_FLAGS.issuperset(parts[1:]):
+            return None
+        return 'windows', _os('Windows', *version), _NO_DEVICE
+
+    if first == 'Macintosh' and len(parts) == 2:
+        found = _MAC_OS.match(parts[1])
+        if found is None:
+            return None
+        return 'mac', _os('Mac OS X', *found.groups()), _MAC_DEVICE
+
+    if first == 'X11':
+        if parts[1:] == ['Linux x86_64']:
+            return 'linux', _os('Linux'), _NO_DEVICE
+        if parts[1:] == ['Ubuntu', 'Linux x86_64']:
+            return 'linux', _os('Ubuntu'), _NO_DEVICE
+        return None
+
+    if first in ('iPhone', 'iPad') and len(parts) == 2:
+        found = _IOS.match(parts[1])
+        if found is None or (first == 'iPhone') != bool(found.group(1)):
+            return None
+        return 'ios', _os('iOS', *found.groups()[1:]), {'family': first, 'brand': 'Apple', 'model': first}
+
+    # Chrome's reduced Android UA names no device model, only "K"
+    if first == 'Linux' and len(parts) == 3 and parts[2] == 'K':
+        found = _ANDROID.match(parts[1])
+        if found is None:
+            return None
+        return 'android', _os('Android', found.group(1)), _ANDROID_DEVICE
+
+    return None
+
+def _classify_bot(tokens: List[Tuple], user_agent_string: str) -> Optional[Dict]:
+    """Self-identifying crawlers and HTTP client libraries"""
+    names = [name for name, _ in tokens]
+
+    if names[0] == 'Mozilla' and tokens[0][1] != '5.0':
+        return None
+
+    if names == ['Mozilla', COMMENT]:
+        # Mozilla/5.0 (compatible; Name/1.0; +https://...)
+        claimed = tokens[1][1]
+        if not claimed.startswith('compatible; '):
+            return None
+        claimed = claimed[12:]
+    elif names == ['Mozilla', 'AppleWebKit', COMMENT] and _TOKEN_VERSIONS['AppleWebKit'].match(tokens[1][1] or ''):
+        # Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; Name/1.0; +https://...)
+        claimed = tokens[2][1]
+        if not claimed.startswith('KHTML, like Gecko; compatible; '):
+            return None
+        claimed = claimed[31:]
+    elif names == [names[0]] or names == [names[0], COMMENT]:
+        # Name/1.0, optionally followed by a (URL)
+        name, version = tokens[0]
+        library = _CLIENT_LIBRARIES.get(name)
+        if library is not None:
+            family, needed, parts, device = library
+            found = _version(version, parts)
+            if found is None or version.count('.') < needed - 1 or len(tokens) > 1:
+                return None
+            return _parsed(family, found, _NO_OS, device, user_agent_string)
+        claimed = f"{name}/{version}"
+        if len(tokens) > 1:
+            claimed += f"; {tokens[1][1]}"
+    else:
+        return None
+
+    # Only the claimed product and its own contact link may follow
+    product, _, rest = claimed.partition('; ')
+    name, _, version = product.partition('/')
+    links = _KNOWN_BOTS.get(name)
+    if links is None or (rest and rest not in links):
+        return None
+    found = _version(version)
+    if found is None:
+        return None
+    return _parsed(name, found, _NO_OS, _SPIDER_DEVICE, user_agent_string)
+
+def classify_user_agent(user_agent_string: str) -> Optional[Dict]:
+    """
+    Parse a user agent of a common shape without the full regex cascade
+
+    Args:
+        user_agent_string: The raw user agent string from the request
+
+    Returns:
+        The result ua_parser.user_agent_parser.Parse would give, or None
+        if the string needs the full parser
+    """
+    tokens = []
+    position, end = 0, len(user_agent_string)
+    while position < end:
+        found = _TOKEN.match(user_agent_string, position)
+        if found is None or found.end() == position:
+            return None
+        comment, name, version = found.groups()
+        tokens.append((name, version) if name else (COMMENT, comment))
+        position = found.end()
+    if not tokens:
+        return None
+
+    node = _TRIE
+    for name, _ in tokens:
+        node = node.get(name)
+        if node is None:
+            return _classify_bot(tokens, user_agent_string)
+    leaf = node.get(None)
+    if leaf is None:
+        return _classify_bot(tokens, user_agent_string)
+
+    comments = [value for name, value in tokens if name == COMMENT]
+    gecko = len(comments) == 1
+    if not gecko and comments[1] != 'KHTML, like Gecko':
+        return None
+    platform = _platform(comments[0], gecko)
+    if platform is None or platform[0] not in leaf.platforms:
+        return None
+
+    version = None
+    for name, value in tokens:
+        if name == leaf.version_token:
+            if value is None or not leaf.version.match(value):
+                return None
+            version = _version(value)
+        elif name != COMMENT:
+            expected = _TOKEN_VERSIONS[name]
+            if value is None and name == 'Mobile':
+                continue
+            if value is None or not expected.match(value):
+                return None
+    if version is None:
+        return None
+
+    _, os, device = platform
+    return _parsed(leaf.family, version, os, device, user_agent_string)
@@ -0,0 +1,53 @@
+# tf-backend/api/detection/utils/verdict_cache.py
+
+import hashlib
+from functools import lru_cache
+from typing import Dict, Optional
+from core.cache import TTLCache
+from core.config import get_settings
+from .constants import BROWSER_HEADERS
+
+@lru_cache()
+def get_verdict_cache() -> Optional[TTLCache]:
+    """
+    Process-wide cache of detection verdicts, or None when
+    VERDICT_CACHE_TTL is 0
+    """
+    settings = get_settings()
+    if settings.VERDICT_CACHE_TTL <= 0:
+        return None
+    return TTLCache(settings.VERDICT_CACHE_SIZE, settings.VERDICT_CACHE_TTL, name="verdict")
+
+def header_fingerprint(headers: Dict) -> str:
+    """
+    Summarize the header features the client-side checks look at: which
+    browser headers are present, whether the request is a JSON API call
+    and the client hint mobile flag.
+    """
+    mask = 0
+    for bit, header in enumerate(BROWSER_HEADERS):
+        if header in headers:
+            mask |= 1 << bit
+    
+    is_api_call = headers.get('content-type') == 'application/json'
+    return f"{mask:x}:{int(is_api_call)}:{headers.get('sec-ch-ua-mobile', '')}"
+
+def verdict_key(publisher_id: str, ip: str, user_agent: str, headers: Dict,
+                header_order: str, client_hints: str) -> bytes:
+    """
+    Cache key for a detection verdict. Requests that share a key get the
+    same answer from every check except the history-based ones.
+    
+    Args:
+        publisher_id: Unique identifier for the publisher
+        ip: Client IP address
+        user_agent: User agent string
+        headers: Lowercased request headers
+        header_order: Header-order fingerprint from header_order_fingerprint,
+            which the distributed crawl check counts
+        client_hints: Client hint state from the same call
+    """
+    material = "\x1f".join((
+        publisher_id, ip, user_agent, header_fingerprint(headers), header_order, client_hints
+    ))
+    return hashlib.blake2b(material.encode("utf-8", "surrogatepass"), digest_size=16).digest()
@@ -70,7 +70,7 @@ class OnboardingService:
                            company_name=company_name)       
                          
                 # Create session for new publisher
-                session_id = self.session_manager.create_session({
+                session_id = await self.session_manager.create_session({
                     "id": str(publisher.id),
                     "email": publisher.email,
                     "name": publisher.name,
@@ -241,7 +241,7 @@ class OnboardingService:
                     token_result = await token_service.create_company_token(str(company.id))
                     
                     # Create session for new AI company
-                    session_id = self.session_manager.create_session({
+                    session_id = await self.session_manager.create_session({
                         "id": str(company.id),
                         "email": company.email,
                         "name": company.name,
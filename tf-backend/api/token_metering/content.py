@@ -0,0 +1,236 @@
+# tf-backend/api/token_metering/content.py
+
+"""
+Content cleaning and token counting, free of database and request state
+so they can run in the offload executor's worker processes.
+"""
+
+from functools import lru_cache
+from html.entities import html5
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+import tiktoken
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+TOKENIZER_MODEL = "gpt-4o"
+
+# Elements dropped before extracting text, and those text is taken from
+NON_CONTENT_TAGS = ['script', 'style', 'meta', 'link', 'noscript', 'iframe']
+TEXT_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li']
+
+# Tags html.parser never sees closed, and tags whose strings are not
+# plain text (ruby annotations, templates)
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer'
+])
+STRING_CONTAINER_TAGS = frozenset(['rt', 'rp', 'template', 'script', 'style'])
+
+@lru_cache()
+def get_tokenizer() -> tiktoken.Encoding:
+    """Tokenizer for TOKENIZER_MODEL, loaded once per process"""
+    return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text using tiktoken"""
+    try:
+        return len(get_tokenizer().encode(text))
+    except Exception as e:
+        logger.error("token_counting_failed",
+                   error=str(e),
+                   text_length=len(text))
+        # Return approximate count as fallback (1 token ≈ 4 characters)
+        return len(text) // 4
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    Collects the text of TEXT_TAGS elements in one pass over the markup,
+    without building a document tree.
+
+    The output matches BeautifulSoup(content, 'html.parser') with
+    NON_CONTENT_TAGS decomposed and get_text(strip=True) taken from every
+    TEXT_TAGS element, so token counts stay the same. That includes its
+    tree rules: end tags close up to the most recent open tag of that
+    name, strings are stripped whole between markup events, and text of
+    nested elements is counted once per enclosing element.
+
+    Memory held is the stack of open elements and the text collected.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.texts: List[Optional[str]] = []
+
+        # (tag name, index into texts for TEXT_TAGS elements)
+        self._stack: List[Tuple[str, Optional[int]]] = []
+        self._collecting = {}
+        self._skipped = 0
+        self._containers = 0
+        self._data: List[str] = []
+        self._closed_void_tags: List[str] = []
+
+    def _flush(self, cdata: bool = False) -> None:
+        """End the current string and give it to every open text element"""
+        if not self._data:
+            return
+        text = ''.join(self._data).strip()
+        self._data = []
+        if not text or self._skipped or (self._containers and not cdata):
+            return
+        for strings in self._collecting.values():
+            strings.append(text)
+
+    def _push(self, tag: str) -> None:
+        self._flush()
+        slot = None
+        if tag in NON_CONTENT_TAGS:
+            self._skipped += 1
+        elif tag in TEXT_TAGS and not self._skipped:
+            slot = len(self.texts)
+            self.texts.append(None)
+            self._collecting[slot] = []
+        if tag in STRING_CONTAINER_TAGS:
+            self._containers += 1
+        self._stack.append((tag, slot))
+
+    def _pop_to(self, tag: str) -> None:
+        self._flush()
+        if not any(name == tag for name, _ in self._stack):
+            return
+        while True:
+            name, slot = self._stack.pop()
+            if name in NON_CONTENT_TAGS:
+                self._skipped -= 1
+            if name in STRING_CONTAINER_TAGS:
+                self._containers -= 1
+            if slot is not None:
+                self.texts[slot] = ''.join(self._collecting.pop(slot))
+            if name == tag:
+                return
+
+    def handle_starttag(self, tag, attrs):
+        self._push(tag)
+        if tag in VOID_TAGS:
+            # A later </br> for this tag is redundant
+            self._pop_to(tag)
+            self._closed_void_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._push(tag)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_void_tags:
+            self._closed_void_tags.remove(tag)
+        else:
+            self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        codepoint = int(name[1:], 16) if name[:1] in ('x', 'X') else int(name)
+        data = None
+        if codepoint < 256:
+            # Numeric references in 128-159 usually mean Windows-1252
+            try:
+                data = bytes([codepoint]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(codepoint)
+            except (ValueError, OverflowError):
+                pass
+        self._data.append(data or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_entityref(self, name):
+        self._data.append(html5.get(name + ';', '&' + name))
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            self._data.append(data[len('CDATA['):])
+            self._flush(cdata=True)
+
+    def close(self) -> None:
+        """Finish the markup and close every element still open"""
+        super().close()
+        self._flush()
+        while self._stack:
+            self._pop_to(self._stack[-1][0])
+
+def extract_text(content: str) -> str:
+    """
+    Text of the content elements of an HTML document, each followed by
+    '. ', the way clean_and_type_content reports it
+    """
+    extractor = HTMLTextExtractor()
+    extractor.feed(content)
+    extractor.close()
+    return ' '.join(text + '. ' for text in extractor.texts if text).strip()
+
+def clean_and_type_content(content: str) -> Tuple[str, str]:
+    """
+    Clean content and determine type
+
+    Args:
+        content (str): raw content
+
+    Returns:
+        Tuple[str, str]: Tuple of (cleaned_content, content_type)
+    """
+    try:
+        # Check if content is HTML
+        if '<html' in content.lower() or '<body' in content.lower():
+            try:
+                cleaned = extract_text(content)
+                logger.debug("html_content_cleaned",
+                           original_length=len(content),
+                           cleaned_length=len(cleaned))
+
+                return cleaned, 'text/html'
+            except Exception as e:
+                logger.error("html_cleaning_failed",
+                           error=str(e),
+                           exc_info=True)
+                # Fallback to raw content
+                return content, 'text/html'
+
+        # Basic content type detection
+        if content.startswith('{') and content.endswith('}'):
+            return content, 'application/json'
+        elif '<xml' in content.lower() or '<?xml' in content:
+            return content, 'application/xml'
+        else:
+            return content, 'text/plain'
+
+    except Exception as e:
+        logger.error("content_cleaning_failed",
+                   error=str(e),
+                   exc_info=True)
+        return content, 'text/plain'
+
+def analyze_text(content: str) -> Tuple[str, int, int]:
+    """
+    Clean, type and count one document in a single executor job, so a
+    large document crosses to a worker process once and only the
+    numbers come back
+
+    Returns:
+        Tuple of (content_type, token_count, content_size_bytes)
+    """
+    clean_content, content_type = clean_and_type_content(content)
+    return content_type, count_tokens(clean_content), len(content.encode('utf-8'))
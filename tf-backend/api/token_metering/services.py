@@ -5,11 +5,11 @@ from fastapi import HTTPException
 from datetime import datetime, timezone
 from typing import Dict, Optional, Tuple
 import logging
-from bs4 import BeautifulSoup
-import tiktoken
 from core.models.payment import UsageRecord, UsageType
 from api.access_tokens.services import AccessTokenService
+from core.executors import get_offload_executor
 from core.logging_config import get_logger, LogOperation
+from .content import TOKENIZER_MODEL, analyze_text, clean_and_type_content, count_tokens, get_tokenizer
 
 logger = get_logger(__name__)
 
@@ -20,8 +20,8 @@ class TokenMeteringService:
         
         # Initialize tokenizer - cache as instance variable for reuse
         try:
-            self.tokenizer = tiktoken.encoding_for_model("gpt-4o")
-            logger.info("tokenizer_initialized", model="gpt-4")
+            self.tokenizer = get_tokenizer()
+            logger.info("tokenizer_initialized", model=TOKENIZER_MODEL)
         except Exception as e:
             logger.error("tokenizer_initialization_failed", error=str(e), exc_info=True)
             raise
@@ -29,21 +29,17 @@ class TokenMeteringService:
         self.RATE_PER_TOKEN = 0.0002 # $0.20 per 1000 tokens
         self.PLATFORM_FEE_PERCENTAGE = 0.03 # 3% platform fee
         
+        # Parsing and tokenizing run off the event loop
+        self.executor = get_offload_executor()
+        
     def count_tokens(self, text: str) -> int:
         """Count tokens in text using tiktoken"""
         with LogOperation("count_tokens", text_length=len(text)):
-            try:
-                token_count = len(self.tokenizer.encode(text))
-                logger.debug("tokens_counted", 
-                           token_count=token_count, 
-                           text_length=len(text))
-                return token_count
-            except Exception as e:
-                logger.error("token_counting_failed", 
-                           error=str(e), 
-                           text_length=len(text))
-                # Return approximate count as fallback (1 token ≈ 4 characters)
-                return len(text) // 4
+            token_count = count_tokens(text)
+            logger.debug("tokens_counted", 
+                       token_count=token_count, 
+                       text_length=len(text))
+            return token_count
     
     async def process_bot_request(
         self,
@@ -164,12 +160,14 @@ class TokenMeteringService:
         with LogOperation("analyze_content", content_length=len(content)):
 
             try:
-                clean_content, content_type = self.clean_and_type_content(content)
-                token_count = self.count_tokens(clean_content)
+                # Large documents go to a worker process, small ones to a thread
+                content_type, token_count, content_size_bytes = await self.executor.run(
+                    analyze_text, content, size=len(content)
+                )
                 
                 analysis_results = {
                     'token_count': token_count,
-                    'content_size_bytes': len(content.encode('utf-8')),
+                    'content_size_bytes': content_size_bytes,
                     'content_type': content_type,
                     'estimated_cost': token_count * self.RATE_PER_TOKEN
                 }
@@ -199,46 +197,7 @@ class TokenMeteringService:
             Tuple[str, str]: Tuple of (cleaned_content, content_type)
         """
         with LogOperation("clean_and_type_content", content_length=len(content)):
-            try:
-                # Check if content is HTML
-                if '<html' in content.lower() or '<body' in content.lower():
-                    try:
-                        soup = BeautifulSoup(content, 'html.parser')
-                        # Remove non-content elements
-                        for tag in soup(['script', 'style', 'meta', 'link', 'noscript', 'iframe']):
-                            tag.decompose()
-                        
-                        # Get text preserving some structure
-                        content = ' '.join([
-                            (tag.get_text(strip=True) + '. ')
-                            for tag in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li'])
-                            if tag.get_text(strip=True)
-                        ])
-                        logger.debug("html_content_cleaned",
-                                   original_length=len(content),
-                                   cleaned_length=len(content))
-                        
-                        return content.strip(), 'text/html'
-                    except Exception as e:
-                        logger.error("html_cleaning_failed",
-                                   error=str(e),
-                                   exc_info=True)
-                        # Fallback to raw content
-                        return content, 'text/html'
-                
-                # Basic content type detection
-                if content.startswith('{') and content.endswith('}'):
-                    return content, 'application/json'
-                elif '<xml' in content.lower() or '<?xml' in content:
-                    return content, 'application/xml'
-                else:
-                    return content, 'text/plain'
-                
-            except Exception as e:
-                logger.error("content_cleaning_failed",
-                           error=str(e),
-                           exc_info=True)
-                return content, 'text/plain'
+            return clean_and_type_content(content)
     
     async def get_usage_analytics(
         self,
@@ -0,0 +1,210 @@
+# tf-backend/core/access_logs.py
+
+"""
+Readers for web server access logs.
+
+Each line becomes a request descriptor of the shape
+BotDetectorService.analyze_batch takes: ip, user_agent, headers, path,
+method and timestamp. Two formats are understood:
+
+    combined  Apache/nginx combined log format
+    json      one object per line with flat, nginx-style field names
+              (remote_addr, http_user_agent, time_iso8601, request, ...)
+              and optionally a headers object
+
+Combined logs only carry the user agent and referer, so header-based
+checks see every other browser header as missing. Files ending in .gz
+are decompressed on the fly and "-" reads standard input.
+"""
+
+import gzip
+import json
+import re
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, TextIO
+
+COMBINED_LOG = re.compile(
+    r'^(?P<ip>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)(?: [^"]*)?" \d{3} \S+'
+    r'(?: "(?P<referer>(?:[^"\\]|\\.)*)" "(?P<user_agent>(?:[^"\\]|\\.)*)")?'
+)
+COMBINED_TIME_FORMAT = "%d/%b/%Y:%H:%M:%S %z"
+
+# Field names tried in order for each descriptor field in JSON logs
+JSON_FIELDS = {
+    'ip': ('ip', 'remote_addr', 'client_ip', 'remote_ip'),
+    'user_agent': ('user_agent', 'http_user_agent', 'useragent'),
+    'timestamp': ('timestamp', 'time', 'time_iso8601', 'time_local', '@timestamp', 'ts'),
+    'method': ('method', 'request_method'),
+    'path': ('path', 'request_uri', 'uri'),
+    'referer': ('referer', 'http_referer'),
+}
+
+LOG_FORMATS = ("auto", "combined", "json")
+
+def parse_timestamp(value) -> float:
+    """
+    Unix seconds from epoch seconds or milliseconds, ISO 8601 or the
+    combined log time format
+
+    Raises:
+        ValueError: If the value is none of these
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = float(value)
+        # Epoch milliseconds
+        return value / 1000.0 if value > 1e11 else value
+    if not isinstance(value, str):
+        raise ValueError(f"Unsupported timestamp: {value!r}")
+
+    try:
+        return parse_timestamp(float(value))
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return datetime.strptime(value, COMBINED_TIME_FORMAT).timestamp()
+
+def _unescape(value: str) -> str:
+    """Undo the quote escaping Apache (\\") and nginx (\\x22) apply"""
+    if '\\' not in value:
+        return value
+    return value.replace('\\x22', '"').replace('\\"', '"').replace('\\\\', '\\')
+
+def parse_combined(line: str, _times: Dict = {}) -> Optional[Dict]:
+    """Descriptor for a combined log line, or None if it does not parse"""
+    found = COMBINED_LOG.match(line)
+    if found is None:
+        return None
+
+    # Neighbouring lines mostly share a second, and strptime is slow
+    time = found.group('time')
+    timestamp = _times.get(time)
+    if timestamp is None:
+        try:
+            timestamp = datetime.strptime(time, COMBINED_TIME_FORMAT).timestamp()
+        except ValueError:
+            return None
+        if len(_times) > 4096:
+            _times.clear()
+        _times[time] = timestamp
+
+    user_agent = _unescape(found.group('user_agent') or "")
+    headers = {'user-agent': user_agent} if user_agent and user_agent != "-" else {}
+    referer = found.group('referer')
+    if referer and referer != "-":
+        headers['referer'] = _unescape(referer)
+
+    return {
+        'ip': found.group('ip'),
+        'user_agent': headers.get('user-agent', ""),
+        'headers': headers,
+        'path': found.group('path'),
+        'method': found.group('method'),
+        'timestamp': timestamp
+    }
+
+def _field(entry: Dict, name: str):
+    for key in JSON_FIELDS[name]:
+        value = entry.get(key)
+        if value not in (None, "", "-"):
+            return value
+    return None
+
+def parse_json(line: str) -> Optional[Dict]:
+    """Descriptor for a JSON log line, or None if it does not parse"""
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+
+    ip = _field(entry, 'ip')
+    timestamp = _field(entry, 'timestamp')
+    if ip is None or timestamp is None:
+        return None
+    try:
+        timestamp = parse_timestamp(timestamp)
+    except ValueError:
+        return None
+
+    method, path = _field(entry, 'method'), _field(entry, 'path')
+    request = entry.get('request')
+    if isinstance(request, str) and (method is None or path is None):
+        # "GET /path HTTP/1.1"
+        parts = request.split(' ')
+        if len(parts) >= 2:
+            method, path = method or parts[0], path or parts[1]
+
+    headers = entry.get('headers')
+    headers = {str(k).lower(): str(v) for k, v in headers.items()} if isinstance(headers, dict) else {}
+    user_agent = _field(entry, 'user_agent')
+    if user_agent is not None:
+        headers.setdefault('user-agent', str(user_agent))
+    referer = _field(entry, 'referer')
+    if referer is not None:
+        headers.setdefault('referer', str(referer))
+
+    return {
+        'ip': str(ip),
+        'user_agent': headers.get('user-agent', ""),
+        'headers': headers,
+        'path': str(path or "/"),
+        'method': str(method or "GET").upper(),
+        'timestamp': timestamp
+    }
+
+def open_log(path: str) -> TextIO:
+    """Open an access log as text, decompressing gzip files"""
+    if path == "-":
+        return sys.stdin
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    if compressed:
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+class AccessLogReader:
+    """
+    Streams request descriptors from access log files, in file order.
+    Lines that do not parse are skipped and counted.
+    """
+
+    def __init__(self, paths: Iterable[str], log_format: str = "auto"):
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format: {log_format}")
+        self.paths = list(paths)
+        self.log_format = log_format
+        self.lines = 0
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[Dict]:
+        for path in self.paths:
+            f = open_log(path)
+            try:
+                yield from self._parse(f)
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+
+    def _parse(self, lines: Iterable[str]) -> Iterator[Dict]:
+        parse = None if self.log_format == "auto" else \
+            (parse_json if self.log_format == "json" else parse_combined)
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            self.lines += 1
+            if parse is None:
+                # Decided by the first line of each file
+                parse = parse_json if line.startswith('{') else parse_combined
+
+            descriptor = parse(line)
+            if descriptor is None:
+                self.skipped += 1
+                continue
+            yield descriptor
@@ -0,0 +1,161 @@
+# tf-backend/core/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, Hashable, Optional
+
+def freeze(value: Any) -> Any:
+    """
+    Recursively convert dicts and lists into read-only equivalents so a
+    cached value can be shared between callers without being modified.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(freeze(item) for item in value)
+    return value
+
+def thaw(value: Any) -> Any:
+    """
+    Copy a value holding frozen mappings back into plain dicts and lists,
+    e.g. before handing it to a JSON encoder.
+    """
+    if isinstance(value, (dict, MappingProxyType)):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    if isinstance(value, frozenset):
+        return set(thaw(item) for item in value)
+    return value
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded least-recently-used cache with hit, miss and
+    eviction counters.
+    """
+
+    def __init__(self, capacity: int, name: str = "cache"):
+        if capacity <= 0:
+            raise ValueError("Cache capacity must be positive")
+
+        self.name = name
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value for key, marking it as recently used"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Insert or replace a value, evicting the least recently used entry when full"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = value
+
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict:
+        """Snapshot of cache size and counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class TTLCache(LRUCache):
+    """
+    LRUCache whose entries also expire a fixed number of seconds after
+    they were stored. Expired entries are dropped lazily on lookup.
+    """
+
+    def __init__(self, capacity: int, ttl: float, name: str = "cache"):
+        if ttl <= 0:
+            raise ValueError("Cache TTL must be positive")
+
+        super().__init__(capacity, name)
+        self.ttl = ttl
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value for key if it has not expired"""
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Insert or replace a value, restarting its TTL"""
+        super().put(key, (time.monotonic() + self.ttl, value))
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single entry if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.expirations = 0
+        super().clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["ttl"] = self.ttl
+        stats["expirations"] = self.expirations
+        return stats
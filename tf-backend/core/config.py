@@ -57,6 +57,8 @@ class Settings(BaseSettings):
     REDIS_SOCKET_TIMEOUT: int = 5
     REDIS_RETRY_ON_TIMEOUT: bool = True
     REDIS_MAX_CONNECTIONS: int = 10
+    REDIS_ASYNC_MAX_CONNECTIONS: int = 50
+    DETECTION_REDIS_DB: Optional[int] = None # detection state DB, REDIS_DB when unset
     
     # Helper method to get Redis connection parameters
     def get_redis_connection_params(self) -> dict:
@@ -73,6 +75,62 @@ class Settings(BaseSettings):
         
         return params
     
+    # Detection cache settings
+    UA_CACHE_SIZE: int = int(os.getenv("UA_CACHE_SIZE", "10000"))
+    UA_FAST_PATH: bool = os.getenv("UA_FAST_PATH", "true").lower() == "true"
+    VERDICT_CACHE_SIZE: int = int(os.getenv("VERDICT_CACHE_SIZE", "50000"))
+    VERDICT_CACHE_TTL: float = float(os.getenv("VERDICT_CACHE_TTL", "5")) # seconds, 0 disables
+    
+    # Published crawler IP ranges (defaults to ~/.cache/trainfair/crawler_ranges),
+    # downloaded by scripts/fetch_crawler_ranges.py or, when an interval is
+    # set, in the background; see api/detection/utils/ip_ranges.py
+    CRAWLER_RANGES_DIR: Optional[str] = os.getenv("CRAWLER_RANGES_DIR")
+    CRAWLER_RANGES_RELOAD_INTERVAL: float = 30.0 # seconds between file change checks
+    CRAWLER_RANGES_FETCH_INTERVAL: float = float(os.getenv("CRAWLER_RANGES_FETCH_INTERVAL", "0")) # seconds, 0 disables
+    
+    # Reverse-then-forward DNS verification of claimed crawlers
+    DNS_VERIFY_POSITIVE_TTL: float = 86400 # seconds to trust a verified IP
+    DNS_VERIFY_NEGATIVE_TTL: float = 3600 # seconds to remember a failed verification
+    DNS_VERIFY_TIMEOUT: float = 2.0
+    DNS_VERIFY_CACHE_SIZE: int = 50000
+    
+    # Per-stage detection latency histograms, served at /metrics
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    
+    # Executors for CPU-bound parsing and tokenization
+    OFFLOAD_THREADS: int = int(os.getenv("OFFLOAD_THREADS", "4"))
+    OFFLOAD_PROCESSES: Optional[int] = None # defaults to half the CPUs, 0 keeps everything in threads
+    OFFLOAD_PROCESS_THRESHOLD: int = 256 * 1024 # bytes; larger jobs run in the process pool
+    
+    # Seconds between bot pattern checks when no update is announced
+    BOT_PATTERNS_RELOAD_INTERVAL: float = 60.0
+    
+    # Per-publisher allowlists of IPs, CIDR ranges and fingerprints
+    ALLOWLIST_RELOAD_INTERVAL: float = 60.0 # seconds between checks when no update is announced
+    ALLOWLIST_BLOOM_ERROR_RATE: float = 0.001
+    
+    # JSON file overriding detection scoring weights and thresholds
+    DETECTION_SCORING_FILE: Optional[str] = os.getenv("DETECTION_SCORING_FILE")
+    
+    # Request log write-behind buffer
+    REQUEST_LOG_BATCH_SIZE: int = 500
+    REQUEST_LOG_FLUSH_INTERVAL: float = 0.25 # seconds
+    REQUEST_LOG_MAX_PENDING: int = 20000
+    REQUEST_LOG_INSERT_ATTEMPTS: int = 3 # tries per batch before its rows are dropped
+    REQUEST_LOG_RETRY_DELAY: float = 0.5 # seconds before the first retry, doubled after each
+    # Keep 1 in N non-bot request logs (weighted by N); 1 keeps every row.
+    # Publishers can override it with request_log_sample_rate in their settings
+    REQUEST_LOG_HUMAN_SAMPLE_RATE: int = int(os.getenv("REQUEST_LOG_HUMAN_SAMPLE_RATE", "10"))
+    
+    # Hourly unique-IP HyperLogLogs per publisher
+    UNIQUE_IPS_RETENTION_HOURS: int = 192 # 8 days
+    
+    # Decayed per-publisher leaderboards of high-risk IPs
+    HIGH_RISK_HALF_LIFE: float = float(os.getenv("HIGH_RISK_HALF_LIFE", "3600")) # seconds
+    HIGH_RISK_MAX_IPS: int = 10000 # per publisher
+    HIGH_RISK_MIN_SCORE: float = 0.05 # decayed score below which an IP is dropped
+    HIGH_RISK_SWEEP_INTERVAL: float = 60.0 # seconds
+    
     # AWS Settings
     AWS_ACCESS_KEY_ID: Optional[str] = os.getenv("AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY: Optional[str] = os.getenv("AWS_SECRET_ACCESS_KEY")
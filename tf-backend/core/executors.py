@@ -0,0 +1,203 @@
+# tf-backend/core/executors.py
+
+"""
+Managed executors for CPU-bound work called from async handlers.
+
+HTML parsing, tokenization and user agent parsing are plain Python and
+hold the GIL. Run inline, one large document stalls every other request
+on the worker. OffloadExecutor.run sends a job to one of two lanes by
+its size:
+
+    thread   small jobs, where handing a few kilobytes to a process
+             would cost more than the work itself
+    process  jobs of at least process_threshold bytes, parsed in a
+             separate interpreter so the event loop keeps running
+
+Each lane admits as many jobs as it has workers. Callers beyond that
+wait on an asyncio semaphore, so the pools' own queues stay empty and
+every waiting job is visible in the lane's queue depth. Wait and run
+times go to the detection stage histograms as executor_<lane>_wait and
+executor_<lane>_run.
+
+Functions sent to the process lane, and their arguments and results,
+must be picklable, so they have to be module-level functions.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
+from typing import Callable, Dict, Optional
+from core.config import get_settings
+from core.logging_config import get_logger
+from core.metrics import get_stage_metrics
+
+logger = get_logger(__name__)
+
+class ExecutorLane:
+    """One pool and the admission limit in front of it"""
+
+    def __init__(self, name: str, workers: int, factory: Callable[[int], Executor]):
+        self.name = name
+        self.workers = workers
+        self.factory = factory
+        self.pool: Optional[Executor] = None
+
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> Executor:
+        if self.pool is None:
+            self.pool = self.factory(self.workers)
+        return self.pool
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # Created on first use, inside the event loop that awaits it
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._slots
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=wait, cancel_futures=True)
+            self.pool = None
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+class OffloadExecutor:
+    """
+    Runs CPU-bound functions off the event loop, in threads or
+    processes depending on the size of the job.
+    """
+
+    def __init__(self, threads: int, processes: int, process_threshold: int):
+        """
+        Args:
+            threads: Thread lane workers
+            processes: Process lane workers; 0 sends everything to threads
+            process_threshold: Job size in bytes from which the process
+                lane is used
+        """
+        self.process_threshold = process_threshold
+        self.metrics = get_stage_metrics()
+
+        self.lanes = {
+            "thread": ExecutorLane("thread", max(1, threads),
+                                   lambda workers: ThreadPoolExecutor(workers, thread_name_prefix="offload")),
+        }
+        if processes > 0:
+            # Spawned workers don't inherit the event loop, Redis pools or
+            # database connections of the parent
+            self.lanes["process"] = ExecutorLane("process", processes, lambda workers: ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+            ))
+
+    def lane_for(self, size: int) -> ExecutorLane:
+        if size >= self.process_threshold and "process" in self.lanes:
+            return self.lanes["process"]
+        return self.lanes["thread"]
+
+    async def run(self, func: Callable, *args, size: int = 0):
+        """
+        Run func(*args) in the lane for a job of this size and wait for
+        the result without blocking the event loop
+
+        Args:
+            func: Function to run; module-level if it may go to the process lane
+            size: Job size in bytes, or an estimate of equivalent work
+
+        Returns:
+            What func returns
+
+        Raises:
+            Whatever func raises. BrokenProcessPool if a worker process
+            died, in which case the pool is replaced for later jobs.
+        """
+        lane = self.lane_for(size)
+        metrics = self.metrics
+
+        started = metrics.start()
+        lane.waiting += 1
+        try:
+            await lane.slots.acquire()
+        finally:
+            lane.waiting -= 1
+        metrics.observe(f"executor_{lane.name}_wait", started)
+
+        started = metrics.start()
+        lane.running += 1
+        try:
+            pool = lane.start()
+            result = await asyncio.get_running_loop().run_in_executor(pool, partial(func, *args))
+            lane.completed += 1
+            return result
+        except BrokenProcessPool:
+            lane.failed += 1
+            logger.error("offload_process_pool_broken",
+                        lane=lane.name,
+                        size=size)
+            lane.shutdown(wait=False)
+            raise
+        except Exception:
+            lane.failed += 1
+            raise
+        finally:
+            lane.running -= 1
+            lane.slots.release()
+            metrics.observe(f"executor_{lane.name}_run", started)
+
+    def start(self) -> None:
+        """Create the pools now rather than on the first job"""
+        for lane in self.lanes.values():
+            lane.start()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pools, cancelling jobs that have not started"""
+        for lane in self.lanes.values():
+            lane.shutdown(wait=wait)
+
+    def stats(self) -> Dict:
+        """Workers, queue depth, jobs running and finished per lane"""
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def render(self, name: str = "tf_offload") -> str:
+        """Prometheus gauges and counters for every lane"""
+        lines = []
+        for metric, kind, description in (
+            ("waiting", "gauge", "Jobs waiting for a free worker"),
+            ("running", "gauge", "Jobs running"),
+            ("completed", "counter", "Jobs finished"),
+            ("failed", "counter", "Jobs that raised"),
+        ):
+            suffix = "_total" if kind == "counter" else ""
+            lines.append(f"# HELP {name}_{metric}{suffix} {description}")
+            lines.append(f"# TYPE {name}_{metric}{suffix} {kind}")
+            for lane_name, lane in self.lanes.items():
+                lines.append(f'{name}_{metric}{suffix}{{lane="{lane_name}"}} {getattr(lane, metric)}')
+        return "\n".join(lines) + "\n"
+
+@lru_cache()
+def get_offload_executor() -> OffloadExecutor:
+    """Process-wide executor for CPU-bound work, shut down by the app lifespan"""
+    settings = get_settings()
+    processes = settings.OFFLOAD_PROCESSES
+    if processes is None:
+        processes = max(1, (os.cpu_count() or 2) // 2)
+    return OffloadExecutor(
+        threads=settings.OFFLOAD_THREADS,
+        processes=processes,
+        process_threshold=settings.OFFLOAD_PROCESS_THRESHOLD
+    )
@@ -0,0 +1,349 @@
+# tf-backend/core/ingestion.py
+
+import asyncio
+import random
+import uuid
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional
+from sqlalchemy import insert
+from core.config import get_settings
+from core.database import SessionLocal
+from core.models.detection import RequestLog
+from core.models.publisher import Publisher
+from core.cache import TTLCache
+from core.logging_config import get_logger
+from core.metrics import get_stage_metrics
+from core.unique_ips import UniqueIPCounter, get_unique_ip_counter
+
+logger = get_logger(__name__)
+
+_STOP = object()
+
+class RequestLogSampler:
+    """
+    Decides which RequestLog rows are persisted.
+
+    Bot rows are always kept with weight 1. Other rows are kept 1-in-N at
+    random with weight N, so sums of sample_weight are unbiased estimates
+    of request counts. Rows that are not kept get weight 0: they still
+    count towards the unique-IP sketches but are never written.
+
+    N defaults to REQUEST_LOG_HUMAN_SAMPLE_RATE and can be overridden per
+    publisher with request_log_sample_rate in the publisher's settings.
+    Rates are looked up by load_rates, in a worker thread; apply only
+    reads the cached rates.
+    """
+
+    def __init__(self, default_rate: int,
+                 lookup_rates: Optional[Callable[[List[str]], Dict[str, Optional[int]]]] = None,
+                 overrides_ttl: float = 300.0, rng: Optional[random.Random] = None):
+        """
+        Args:
+            default_rate: Keep 1 in this many non-bot rows; 1 keeps all
+            lookup_rates: Looks up several publishers' own rates at once;
+                publishers left out, or mapped to None, use the default
+            overrides_ttl: Seconds to cache each publisher's rate
+            rng: Random source, for reproducible sampling in tests
+        """
+        self.default_rate = max(1, int(default_rate))
+        self.lookup_rates = lookup_rates
+        self.rates = TTLCache(10000, overrides_ttl, name="sample_rate")
+        self.random = (rng or random.Random()).random
+
+    async def load_rates(self, publisher_ids: Iterable[str]) -> None:
+        """
+        Cache the rates of publishers that are not cached yet, with one
+        lookup in a worker thread. Publishers with no rate of their own
+        are cached with the default, so they are not looked up again
+        until their entry expires.
+        """
+        if self.lookup_rates is None:
+            return
+
+        missing = sorted({
+            publisher_id for publisher_id in publisher_ids
+            if self.rates.get(publisher_id) is None
+        })
+        if not missing:
+            return
+
+        loaded = await asyncio.to_thread(self.lookup_rates, missing)
+        for publisher_id in missing:
+            rate = loaded.get(publisher_id) or self.default_rate
+            self.rates.put(publisher_id, max(1, int(rate)))
+
+    def rate_for(self, publisher_id: str) -> int:
+        """A publisher's cached rate, or the default if it is not loaded"""
+        return self.rates.get(publisher_id, self.default_rate)
+
+    def apply(self, rows: List[Dict]) -> List[Dict]:
+        """Set sample_weight on each row in place; call load_rates first"""
+        rates = {}
+        for row in rows:
+            if row['is_bot']:
+                row['sample_weight'] = 1.0
+                continue
+
+            publisher_id = row['publisher_id']
+            rate = rates.get(publisher_id)
+            if rate is None:
+                rate = rates[publisher_id] = self.rate_for(publisher_id)
+
+            if rate == 1:
+                row['sample_weight'] = 1.0
+            else:
+                row['sample_weight'] = float(rate) if self.random() * rate < 1.0 else 0.0
+        return rows
+
+    async def sample(self, rows: List[Dict]) -> List[Dict]:
+        """Load any missing rates for the rows' publishers, then apply"""
+        await self.load_rates(row['publisher_id'] for row in rows if not row['is_bot'])
+        return self.apply(rows)
+
+def persisted(rows: List[Dict]) -> List[Dict]:
+    """Rows the sampler kept"""
+    return [row for row in rows if row.get('sample_weight', 1.0) > 0]
+
+def _publisher_sample_rates(publisher_ids: List[str]) -> Dict[str, Optional[int]]:
+    """Publishers' own non-bot sampling rates from their settings, if any. Blocking."""
+    ids = {}
+    for publisher_id in publisher_ids:
+        try:
+            ids[uuid.UUID(publisher_id)] = publisher_id
+        except ValueError:
+            continue # Not a registered publisher, so no settings
+    if not ids:
+        return {}
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Publisher.id, Publisher.settings).filter(Publisher.id.in_(list(ids))).all()
+        return {
+            ids[publisher_id]: (settings or {}).get("request_log_sample_rate")
+            for publisher_id, settings in rows
+        }
+    except Exception as e:
+        logger.warning("publisher_sample_rate_lookup_failed",
+                      publishers=len(ids),
+                      error=str(e))
+        return {}
+    finally:
+        db.close()
+
+class RequestLogBuffer:
+    """
+    Write-behind buffer for RequestLog rows.
+
+    Rows are queued in memory and written by a background task with one
+    multi-row INSERT per flush. A flush happens when batch_size rows are
+    waiting or flush_interval seconds after the first unflushed row,
+    whichever comes first. The queue is bounded by max_pending; producers
+    wait for space when it is full, which pushes back on callers instead
+    of growing memory.
+
+    When given a RequestLogSampler, each flushed batch is sampled first,
+    so publisher rates are looked up by the flush task and never on the
+    request path. When given a UniqueIPCounter, each flushed batch is also
+    added to the publishers' unique-IP sketches, including rows the sampler
+    gave weight 0, which are then left out of the insert.
+
+    A failed insert is retried up to insert_attempts times in all, waiting
+    retry_delay seconds and doubling it after each failure, before its
+    rows are dropped. A flush that fails any other way drops its batch and
+    the task goes on with the next one.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int,
+                 unique_ips: Optional[UniqueIPCounter] = None,
+                 sampler: Optional[RequestLogSampler] = None,
+                 insert_attempts: int = 3, retry_delay: float = 0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.unique_ips = unique_ips
+        self.sampler = sampler
+        self.insert_attempts = max(1, insert_attempts)
+        self.retry_delay = retry_delay
+        self.metrics = get_stage_metrics()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_sampled_out = 0
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Start the background flush task on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+        logger.info("request_log_buffer_started",
+                   batch_size=self.batch_size,
+                   flush_interval=self.flush_interval,
+                   max_pending=self.max_pending)
+
+    async def stop(self) -> None:
+        """Flush everything still queued and stop the background task"""
+        if not self.running:
+            return
+
+        task = self._task
+        await self._queue.put(_STOP)
+        await task
+        self._task = None
+        logger.info("request_log_buffer_stopped",
+                   rows_written=self.rows_written,
+                   rows_dropped=self.rows_dropped)
+
+    async def put(self, row: Dict) -> None:
+        """Queue one RequestLog row, waiting if the buffer is full"""
+        await self._queue.put(row)
+
+    async def put_many(self, rows: List[Dict]) -> None:
+        """Queue several RequestLog rows in order"""
+        for row in rows:
+            await self._queue.put(row)
+
+    def stats(self) -> Dict:
+        """Snapshot of queue depth and write counters"""
+        return {
+            "running": self.running,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_pending": self.max_pending,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "rows_sampled_out": self.rows_sampled_out,
+            "flushes": self.flushes
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # Lose this batch, not the task
+                self.rows_dropped += len(batch)
+                logger.error("request_log_flush_failed",
+                            rows=len(batch),
+                            error=str(e),
+                            exc_info=True)
+
+    async def _flush(self, rows: List[Dict]) -> None:
+        """Write a batch in a worker thread so the event loop keeps serving requests"""
+        if self.sampler is not None:
+            try:
+                await self.sampler.sample(rows)
+            except Exception as e:
+                # Publishers whose rates could not be loaded get the default
+                logger.warning("request_log_sampling_failed",
+                              rows=len(rows),
+                              error=str(e))
+                self.sampler.apply(rows)
+
+        if self.unique_ips is not None:
+            try:
+                await self.unique_ips.record(rows)
+            except Exception as e:
+                logger.error("unique_ips_record_failed",
+                            rows=len(rows),
+                            error=str(e),
+                            exc_info=True)
+
+        # Sampled-out rows only count towards unique IPs
+        kept = persisted(rows)
+        self.rows_sampled_out += len(rows) - len(kept)
+        rows = kept
+        if not rows:
+            return
+
+        delay = self.retry_delay
+        for attempt in range(1, self.insert_attempts + 1):
+            try:
+                started = self.metrics.start()
+                await asyncio.to_thread(_insert_rows, rows)
+                self.metrics.observe("postgres_write_batch", started)
+                self.rows_written += len(rows)
+                self.flushes += 1
+                return
+            except Exception as e:
+                if attempt == self.insert_attempts:
+                    self.rows_dropped += len(rows)
+                    logger.error("request_log_flush_failed",
+                                rows=len(rows),
+                                attempts=attempt,
+                                error=str(e),
+                                exc_info=True)
+                    return
+                logger.warning("request_log_insert_retry",
+                              rows=len(rows),
+                              attempt=attempt,
+                              error=str(e))
+                await asyncio.sleep(delay)
+                delay *= 2
+
+def _insert_rows(rows: List[Dict]) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(insert(RequestLog), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@lru_cache()
+def get_request_log_sampler() -> RequestLogSampler:
+    """Process-wide sampler for non-bot RequestLog rows"""
+    return RequestLogSampler(
+        get_settings().REQUEST_LOG_HUMAN_SAMPLE_RATE,
+        lookup_rates=_publisher_sample_rates
+    )
+
+@lru_cache()
+def get_request_log_buffer() -> RequestLogBuffer:
+    """Process-wide RequestLog buffer, started and stopped by the app lifespan"""
+    settings = get_settings()
+    return RequestLogBuffer(
+        batch_size=settings.REQUEST_LOG_BATCH_SIZE,
+        flush_interval=settings.REQUEST_LOG_FLUSH_INTERVAL,
+        max_pending=settings.REQUEST_LOG_MAX_PENDING,
+        unique_ips=get_unique_ip_counter(),
+        sampler=get_request_log_sampler(),
+        insert_attempts=settings.REQUEST_LOG_INSERT_ATTEMPTS,
+        retry_delay=settings.REQUEST_LOG_RETRY_DELAY
+    )
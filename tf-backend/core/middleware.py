@@ -2,12 +2,13 @@
 
 from fastapi import Request, HTTPException, Depends
 from fastapi.responses import JSONResponse
-from .session import SessionManager
+from .session import PUBLISHER_KEY_HEADER, PublisherKeyManager, SessionManager
 from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 session_manager = SessionManager()
+publisher_keys = PublisherKeyManager()
 
 async def get_session(request: Request) -> dict:
     """ 
@@ -22,7 +23,7 @@ async def get_session(request: Request) -> dict:
         logger.warning("No session ID found in cookies")
         raise HTTPException(status_code=401, detail="No session found")
     
-    session = session_manager.get_session(session_id)
+    session = await session_manager.get_session(session_id)
     
     if not session:
         logger.warning(f"Invalid or expired session ID: {session_id}")
@@ -39,6 +40,23 @@ async def require_publisher(session: dict = Depends(get_session)):
         raise HTTPException(status_code=403, detail="Publisher access required")
     return session
 
+async def require_publisher_key(request: Request) -> dict:
+    """
+    Verify the request carries a publisher API key, as edge middleware
+    sends. Returns the publisher in the same shape as a session.
+    """
+    key = request.headers.get(PUBLISHER_KEY_HEADER)
+    if not key:
+        logger.warning("No publisher API key in request")
+        raise HTTPException(status_code=401, detail="Publisher API key required")
+    
+    publisher_id = await publisher_keys.get_publisher(key)
+    if not publisher_id:
+        logger.warning("Invalid or revoked publisher API key")
+        raise HTTPException(status_code=401, detail="Invalid publisher API key")
+    
+    return {"user_id": publisher_id, "user_type": "publisher"}
+
 async def require_ai_company(session: dict = Depends(get_session)):
     """Verify the user is an AI company"""
     if session["user_type"] != "ai-company":
@@ -70,7 +88,7 @@ async def verify_session(request: Request):
         logger.warning("No session_id cookie found")
         raise HTTPException(status_code=401, detail="No session found")
     
-    session = session_manager.get_session(session_id)
+    session = await session_manager.get_session(session_id)
     logger.info(f"Session found: {session is not None}")
     
     if not session:
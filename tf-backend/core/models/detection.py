@@ -20,6 +20,7 @@ class RequestLog(Base):
     confidence_score = Column(Float)
     detection_methods = Column(String) #JSON string of detection methods
     publisher_id = Column(String, index=True)
+    sample_weight = Column(Float, nullable=False, default=1.0, server_default="1") # Requests this row stands for
     
     def __repr__(self):
         return f"<RequestLog(id={self.id}, ip={self.ip_address}, bot={self.is_bot})>"
\ No newline at end of file
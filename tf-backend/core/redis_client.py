@@ -1,7 +1,9 @@
 # tf-backend/core/redis_client.py
 
 import redis
+import redis.asyncio
 from redis.retry import Retry
+from redis.asyncio.retry import Retry as AsyncRetry
 from redis.backoff import ExponentialBackoff
 from redis.exceptions import ConnectionError, TimeoutError
 import logging
@@ -12,6 +14,9 @@ logger = logging.getLogger(__name__)
 
 class RedisClientFactory:
     _instance: Optional[redis.Redis] = None
+    _async_instance: Optional[redis.asyncio.Redis] = None
+    _async_pool: Optional[redis.asyncio.ConnectionPool] = None
+    _detection_instance: Optional[redis.asyncio.Redis] = None
     
     @classmethod
     def get_client(cls) -> redis.Redis:
@@ -52,4 +57,80 @@ class RedisClientFactory:
         """
         if cls._instance is not None:
             cls._instance.close()
-            cls._instance = None
\ No newline at end of file
+            cls._instance = None
+    
+    @classmethod
+    def get_async_client(cls) -> redis.asyncio.Redis:
+        """
+        Get or create the shared asyncio Redis client.
+        
+        All async clients share one connection pool, so concurrent requests
+        overlap their round trips instead of blocking the event loop.
+        Connections are opened lazily on first command.
+        """
+        if cls._async_instance is None:
+            cls._async_instance = redis.asyncio.Redis(connection_pool=cls._create_async_pool())
+            cls._async_pool = cls._async_instance.connection_pool
+            logger.info("Created asyncio Redis connection pool")
+            
+        return cls._async_instance
+    
+    @classmethod
+    def get_detection_client(cls) -> redis.asyncio.Redis:
+        """
+        Get the asyncio Redis client for detection state: request history,
+        IP reputation, risk leaderboards and unique-IP counts.
+        
+        This is the shared client unless DETECTION_REDIS_DB names another
+        database, as log replays do to keep log-time state away from the
+        live workers. Bot patterns, allowlists, sessions and tokens always
+        use the shared client.
+        """
+        settings = get_settings()
+        if settings.DETECTION_REDIS_DB is None or settings.DETECTION_REDIS_DB == settings.REDIS_DB:
+            return cls.get_async_client()
+        
+        if cls._detection_instance is None:
+            cls._detection_instance = redis.asyncio.Redis(
+                connection_pool=cls._create_async_pool(settings.DETECTION_REDIS_DB)
+            )
+            logger.info(f"Created asyncio Redis connection pool for detection state in DB {settings.DETECTION_REDIS_DB}")
+            
+        return cls._detection_instance
+    
+    @classmethod
+    def _create_async_pool(cls, db: Optional[int] = None) -> redis.asyncio.ConnectionPool:
+        settings = get_settings()
+        connection_params = settings.get_redis_connection_params()
+        connection_params['max_connections'] = settings.REDIS_ASYNC_MAX_CONNECTIONS
+        if db is not None:
+            connection_params['db'] = db
+        
+        # Configure retry strategy
+        retry = AsyncRetry(
+            ExponentialBackoff(),
+            3  # maximum number of retries
+        )
+        
+        # Wait for a free connection rather than failing under load
+        return redis.asyncio.BlockingConnectionPool(
+            **connection_params,
+            timeout=settings.REDIS_CONNECTION_TIMEOUT,
+            retry=retry,
+            decode_responses=True  # Automatically decode responses to strings
+        )
+    
+    @classmethod
+    async def close_async_connection(cls):
+        """
+        Close the asyncio Redis clients and their connection pools if they exist
+        """
+        if cls._detection_instance is not None:
+            await cls._detection_instance.aclose()
+            await cls._detection_instance.connection_pool.disconnect()
+            cls._detection_instance = None
+        if cls._async_instance is not None:
+            await cls._async_instance.aclose()
+            await cls._async_pool.disconnect()
+            cls._async_instance = None
+            cls._async_pool = None
@@ -1,6 +1,8 @@
 # tf-backend/core/session.py
 
+import hashlib
 import json
+import secrets
 import uuid
 import logging
 from datetime import datetime, timedelta
@@ -15,18 +17,15 @@ settings = get_settings()
 class SessionManager:
     def __init__(self):
         try:
-            self.redis = RedisClientFactory.get_client()
+            # Shared asyncio client; connections are opened lazily on first use
+            self.redis = RedisClientFactory.get_async_client()
             self.session_duration = 1800 # session ends after 30 mins
             
-            # Test connection
-            pong = self.redis.ping()
-            logger.info(f"Session Manager Redis connection test: {pong}")
-            
         except RedisError as e:
             logger.error(f"Redis connection failed in SessionManager: {str(e)}")
             raise
     
-    def create_session(self, user_data: Dict) -> str:
+    async def create_session(self, user_data: Dict) -> str:
         """ 
         Create a new session for a user
         """
@@ -55,7 +54,7 @@ class SessionManager:
         
         # Store session in Redis with expiration
         try:
-            with self.redis.pipeline() as pipe:
+            async with self.redis.pipeline() as pipe:
                 pipe.setex(
                     session_key,
                     self.session_duration,
@@ -67,7 +66,7 @@ class SessionManager:
                 pipe.sadd(user_sessions_key, session_id)
                 pipe.expire(user_sessions_key, self.session_duration)
                 
-                pipe.execute()
+                await pipe.execute()
                 
             logger.info(f"Session created: {session_key}")
             return session_id
@@ -79,7 +78,7 @@ class SessionManager:
             logger.error(f"Unexpected error creating session: {str(e)}")
             raise
     
-    def get_session(self, session_id: str) -> Optional[Dict]:
+    async def get_session(self, session_id: str) -> Optional[Dict]:
         """ 
         Retrieve and validate a session
         """
@@ -87,7 +86,7 @@ class SessionManager:
         logger.info(f"Looking up session: {session_key}")
         
         try: 
-            session_data = self.redis.get(session_key)
+            session_data = await self.redis.get(session_key)
             
             if not session_data:
                 return None
@@ -95,7 +94,7 @@ class SessionManager:
             session = json.loads(session_data)
             
             # Update last activity and extend session using pipeline
-            with self.redis.pipeline() as pipe:
+            async with self.redis.pipeline() as pipe:
                 session["last_activity"] = datetime.now().isoformat()
                 pipe.setex(
                     session_key,
@@ -106,7 +105,7 @@ class SessionManager:
                 user_sessions_key = f"{{sess}}:user:{session['user_id']}:sessions"
                 pipe.expire(user_sessions_key, self.session_duration)
                 
-                pipe.execute()
+                await pipe.execute()
                 
             return session
         
@@ -117,7 +116,7 @@ class SessionManager:
             logger.error(f"Error processing session: {str(e)}")
             return None
     
-    def end_session(self, session_id: str) -> bool:
+    async def end_session(self, session_id: str) -> bool:
         """ 
         End a user session
         """
@@ -125,17 +124,17 @@ class SessionManager:
             session_key = f"{{sess}}:session:{session_id}"
             
             # Get session first to get user_id
-            session_data = self.redis.get(session_key)
+            session_data = await self.redis.get(session_key)
             if session_data:
                 session = json.loads(session_data)
                 user_id = session.get("user_id")
                 
                 if user_id:
                     # Remove session and update user's sessions set atomically
-                    with self.redis.pipeline() as pipe:
+                    async with self.redis.pipeline() as pipe:
                         pipe.delete(session_key)
                         pipe.srem(f"{{sess}}:user:{user_id}:sessions", session_id)
-                        pipe.execute()
+                        await pipe.execute()
                         return True
         
             return False
@@ -144,7 +143,7 @@ class SessionManager:
             logger.error(f"Redis error ending session: {str(e)}")
             return False
     
-    def get_user_sessions(self, user_id: str) -> list:
+    async def get_user_sessions(self, user_id: str) -> list:
         """ 
         Get all active sessions for a user
         """
@@ -153,19 +152,19 @@ class SessionManager:
             sessions = []
             
             # Get all session IDs for this user from their set
-            session_ids = self.redis.smembers(user_sessions_key)
+            session_ids = await self.redis.smembers(user_sessions_key)
             
             if not session_ids:
                 return []
             
             # Use pipeline to get all sessions in one round trip
-            with self.redis.pipeline() as pipe:
+            async with self.redis.pipeline() as pipe:
                 # Queue up all the session gets
                 for session_id in session_ids:
                     pipe.get(f"{{sess}}:session:{session_id}")
                 
                 # Execute pipeline and process results
-                results = pipe.execute()
+                results = await pipe.execute()
                 
                 for session_id, data in zip(session_ids, results):
                     if data:  # If session exists
@@ -178,10 +177,10 @@ class SessionManager:
                         except json.JSONDecodeError:
                             logger.error(f"Invalid session data for session {session_id}")
                             # Clean up invalid session
-                            self.redis.srem(user_sessions_key, session_id)
+                            await self.redis.srem(user_sessions_key, session_id)
                     else:
                         # Session was expired/deleted, remove from user's set
-                        self.redis.srem(user_sessions_key, session_id)
+                        await self.redis.srem(user_sessions_key, session_id)
             
             return sessions
             
@@ -192,19 +191,65 @@ class SessionManager:
             logger.error(f"Unexpected error getting user sessions: {str(e)}")
             return []
     
-    def cleanup_expired_sessions(self):
+    async def cleanup_expired_sessions(self):
         """
         Cleanup any expired sessions
         """
         try:
             pattern = f"{{sess}}:session:*"
-            for key in self.redis.scan_iter(pattern):
-                if self.redis.ttl(key) <= 0:
-                    self.redis.delete(key)
+            async for key in self.redis.scan_iter(pattern):
+                if await self.redis.ttl(key) <= 0:
+                    await self.redis.delete(key)
         
         except RedisError as e:
             logger.error(f"Redis error during session cleanup: {str(e)}")
-    
-    def __del__(self):
-        """Cleanup when the SessionManager is destroyed"""
-        RedisClientFactory.close_connection()
\ No newline at end of file
+
+PUBLISHER_KEY_HEADER = "x-trainfair-key"
+
+class PublisherKeyManager:
+    """
+    API keys that identify a publisher's edge middleware to the API.
+
+    Each publisher has at most one key. Only its SHA-256 digest is stored,
+    mapped to the publisher; issuing a new key revokes the previous one.
+    """
+
+    def __init__(self):
+        # Shared asyncio client; connections are opened lazily on first use
+        self.redis = RedisClientFactory.get_async_client()
+
+    async def create_key(self, publisher_id: str) -> str:
+        """
+        Issue a new key for a publisher, replacing any previous key
+
+        Returns:
+            The key, which is not stored and cannot be retrieved later
+        """
+        key = f"tfk_{secrets.token_urlsafe(32)}"
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        publisher_key = f"publisher:{publisher_id}:api_key"
+
+        try:
+            previous = await self.redis.get(publisher_key)
+            async with self.redis.pipeline() as pipe:
+                if previous:
+                    pipe.delete(f"api_key:{previous}")
+                pipe.set(f"api_key:{digest}", str(publisher_id))
+                pipe.set(publisher_key, digest)
+                await pipe.execute()
+
+            logger.info(f"Publisher API key issued for publisher {publisher_id}")
+            return key
+
+        except RedisError as e:
+            logger.error(f"Redis error issuing publisher API key: {str(e)}")
+            raise
+
+    async def get_publisher(self, key: str) -> Optional[str]:
+        """The publisher a key belongs to, or None if it is not a current key"""
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        try:
+            return await self.redis.get(f"api_key:{digest}")
+        except RedisError as e:
+            logger.error(f"Redis error checking publisher API key: {str(e)}")
+            return None
@@ -0,0 +1,87 @@
+# tf-backend/core/unique_ips.py
+
+"""
+Approximate unique-IP counts per publisher.
+
+Every logged request adds its IP to a HyperLogLog for its publisher and
+hour at unique_ips:{publisher}:{hour}, where hour is hours since the
+epoch. The count for any window is the cardinality of the union of the
+window's hourly sketches, which PFCOUNT computes over several keys at
+once without storing the merge.
+
+Redis HyperLogLogs have a standard error of 0.81%, so counts are within
+about 1% of the exact figure most of the time. Each sketch takes at most
+12KB. Windows are rounded out to whole hours.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import redis.asyncio
+from core.config import get_settings
+from core.redis_client import RedisClientFactory
+
+HOUR = 3600
+
+def hour_bucket(timestamp: datetime) -> int:
+    """Hours since the epoch; naive datetimes are taken as local time"""
+    return int(timestamp.timestamp() // HOUR)
+
+def unique_ips_key(publisher_id: str, hour: int) -> str:
+    return f"unique_ips:{publisher_id}:{hour}"
+
+class UniqueIPCounter:
+    """Records and counts unique IPs per publisher in hourly HyperLogLogs"""
+
+    def __init__(self, client: Optional[redis.asyncio.Redis] = None, retention_hours: int = 192):
+        """
+        Args:
+            client: Async Redis client, the detection state client by default
+            retention_hours: How long each hourly sketch is kept
+        """
+        self.client = client or RedisClientFactory.get_detection_client()
+        self.retention = retention_hours * HOUR
+
+    async def record(self, rows: Iterable[Dict]) -> int:
+        """
+        Add the IPs of RequestLog rows to their publisher's hourly sketches,
+        with one PFADD per publisher and hour in a single pipeline
+
+        Returns:
+            Number of sketches updated
+        """
+        buckets: Dict[Tuple[str, int], set] = {}
+        for row in rows:
+            key = (str(row['publisher_id']), hour_bucket(row['timestamp']))
+            buckets.setdefault(key, set()).add(row['ip_address'])
+
+        if not buckets:
+            return 0
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for (publisher_id, hour), ips in buckets.items():
+                key = unique_ips_key(publisher_id, hour)
+                pipe.pfadd(key, *ips)
+                pipe.expire(key, self.retention)
+            await pipe.execute()
+
+        return len(buckets)
+
+    def window_keys(self, publisher_id: str, since: datetime, until: datetime) -> List[str]:
+        """Keys of the hourly sketches covering [since, until]"""
+        return [
+            unique_ips_key(publisher_id, hour)
+            for hour in range(hour_bucket(since), hour_bucket(until) + 1)
+        ]
+
+    async def count(self, publisher_id: str, since: datetime, until: datetime) -> int:
+        """Approximate number of distinct IPs seen by a publisher in a window"""
+        keys = self.window_keys(publisher_id, since, until)
+        if not keys:
+            return 0
+        return await self.client.pfcount(*keys)
+
+@lru_cache()
+def get_unique_ip_counter() -> UniqueIPCounter:
+    """Process-wide unique-IP counter on the detection state Redis client"""
+    return UniqueIPCounter(retention_hours=get_settings().UNIQUE_IPS_RETENTION_HOURS)
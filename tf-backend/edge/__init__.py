@@ -0,0 +1,3 @@
+from .middleware import DetectionMiddleware
+from .reporter import BatchReporter
+from .sync import EdgeSync
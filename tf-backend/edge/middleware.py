@@ -0,0 +1,266 @@
+# tf-backend/edge/middleware.py
+
+import time
+from typing import Dict, Optional
+import requests
+from starlette.responses import JSONResponse
+from api.detection.classifier import RequestClassifier
+from api.detection.utils import BotPatternIndex, RequestTimingStats, UserAgentAnalyzer, verdict_key
+from core.cache import LRUCache, TTLCache, freeze
+from core.logging_config import get_logger
+from core.session import PUBLISHER_KEY_HEADER
+from .reporter import BatchReporter
+from .sync import EdgeSync
+
+logger = get_logger(__name__)
+
+class DetectionMiddleware:
+    """
+    ASGI middleware that runs bot detection inside a publisher's app.
+
+    Detection uses the same checks as the /api/detection endpoint, with
+    user agents, verdicts and per-IP timing kept in local caches so most
+    requests are classified without any I/O. Detections and token usage
+    are uploaded to the API in the background, in batches.
+
+    The verdict is exposed to the app as request.state.bot_detection.
+
+    Usage:
+        app.add_middleware(
+            DetectionMiddleware,
+            publisher_id="...",
+            api_url="https://api.trainfair.io",
+            api_key="tfk_...",
+            block_ai_crawlers=True
+        )
+    """
+
+    def __init__(self, app, publisher_id: str, api_url: Optional[str] = None,
+                 api_key: Optional[str] = None,
+                 block_ai_crawlers: bool = False,
+                 token_header: str = "x-trainfair-token",
+                 client_ip_header: Optional[str] = None,
+                 cache_size: int = 10000,
+                 verdict_ttl: float = 5.0,
+                 report_batch_size: int = 200,
+                 report_interval: float = 5.0,
+                 max_pending: int = 10000,
+                 sync_interval: float = 300.0,
+                 timeout: float = 5.0):
+        """
+        Args:
+            app: The ASGI app to wrap
+            publisher_id: Publisher ID issued by TrainFair
+            api_url: TrainFair API base URL; None runs detection offline
+                with no reporting, whitelist sync or crawler range refresh
+            api_key: Publisher API key, required with api_url; sent with
+                every report and whitelist sync
+            block_ai_crawlers: Answer 403 to detected AI crawlers that do
+                not present a whitelisted access token
+            token_header: Header carrying an AI company access token
+            client_ip_header: Header holding the client IP when behind a
+                proxy (e.g. x-forwarded-for); the first address is used
+            cache_size: Entries in each local cache
+            verdict_ttl: Seconds a verdict is reused for a repeat client
+            report_batch_size: Events per upload
+            report_interval: Maximum seconds an event waits for upload
+            max_pending: Events held while the API is unreachable
+            sync_interval: Seconds between pattern and whitelist refreshes
+            timeout: HTTP timeout for API calls, in seconds
+        """
+        self.app = app
+        self.publisher_id = publisher_id
+        self.block_ai_crawlers = block_ai_crawlers
+        self.token_header = token_header.lower()
+        self.client_ip_header = client_ip_header.lower() if client_ip_header else None
+
+        self.classifier = RequestClassifier(
+            UserAgentAnalyzer(cache=LRUCache(cache_size, name="edge_user_agent"))
+        )
+        self.verdicts = TTLCache(cache_size, verdict_ttl, name="edge_verdict")
+        self.timing = LRUCache(cache_size, name="edge_timing")
+
+        self.sync: Optional[EdgeSync] = None
+        self.detection_reporter: Optional[BatchReporter] = None
+        self.usage_reporter: Optional[BatchReporter] = None
+        self._started = False
+
+        if api_url:
+            if not api_key:
+                raise ValueError("api_key is required to report to the TrainFair API")
+            api_url = api_url.rstrip("/")
+            session = requests.Session()
+            session.headers[PUBLISHER_KEY_HEADER] = api_key
+            self.sync = EdgeSync(
+                api_url, publisher_id, session,
+                interval=sync_interval,
+                timeout=timeout,
+                on_patterns=self._set_patterns
+            )
+            self.detection_reporter = BatchReporter(
+                f"{api_url}/api/detection/report", "detections", publisher_id, session,
+                batch_size=report_batch_size,
+                flush_interval=report_interval,
+                max_pending=max_pending,
+                timeout=timeout
+            )
+            self.usage_reporter = BatchReporter(
+                f"{api_url}/api/access-tokens/usage/report", "events", publisher_id, session,
+                batch_size=report_batch_size,
+                flush_interval=report_interval,
+                max_pending=max_pending,
+                timeout=timeout
+            )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.app(scope, self._lifespan_receive(receive), send)
+            return
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if not self._started:
+            await self.start()
+
+        descriptor = self._describe_request(scope)
+        token = descriptor['headers'].get(self.token_header)
+
+        if token and self.sync is not None and self.sync.is_allowed_token(token):
+            # Licensed crawler: meter it instead of classifying it
+            self.usage_reporter.submit({
+                'token': token,
+                'timestamp': descriptor['timestamp'],
+                'ip_address': descriptor['ip'],
+                'user_agent': descriptor['user_agent'],
+                'path': descriptor['path']
+            })
+            scope.setdefault("state", {})["bot_detection"] = None
+            await self.app(scope, receive, send)
+            return
+
+        results = self.detect(descriptor)
+        scope.setdefault("state", {})["bot_detection"] = results
+
+        if self.detection_reporter is not None:
+            self.detection_reporter.submit(self._build_report(descriptor, results))
+
+        if self.block_ai_crawlers and results['is_bot'] and results['is_ai_crawler']:
+            response = JSONResponse(
+                status_code=403,
+                content={"detail": "An access token is required for AI crawlers"}
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    def detect(self, descriptor: Dict):
+        """
+        Classify a request descriptor, reusing a recent verdict for the
+        same client. Timing state advances on every request.
+
+        Returns:
+            Read-only detection results
+        """
+        ip = descriptor['ip']
+
+        stats = self.timing.get(ip)
+        if stats is None:
+            stats = RequestTimingStats()
+            self.timing.put(ip, stats)
+        stats.update(descriptor['timestamp'])
+
+        fingerprint, hints = self.classifier.fingerprint(descriptor)
+        key = verdict_key(self.publisher_id, ip, descriptor['user_agent'], descriptor['headers'], fingerprint, hints)
+        verdict = self.verdicts.get(key)
+        if verdict is not None:
+            return verdict
+
+        results = self.classifier.analyze_client(descriptor)
+        self.classifier.evaluate_request_patterns(stats.features(), results)
+        verdict = freeze(self.classifier.finalize(results))
+        self.verdicts.put(key, verdict)
+        return verdict
+
+    async def start(self) -> None:
+        """Start background sync, reporting and range refreshes on the running event loop"""
+        self._started = True
+        if self.sync is not None:
+            await self.classifier.crawler_ranges.start()
+            await self.sync.start()
+            await self.detection_reporter.start()
+            await self.usage_reporter.start()
+
+    async def stop(self) -> None:
+        """Flush pending reports and stop background tasks"""
+        if self.sync is not None:
+            await self.sync.stop()
+            await self.detection_reporter.stop()
+            await self.usage_reporter.stop()
+            await self.classifier.crawler_ranges.stop()
+        self._started = False
+
+    def stats(self) -> Dict:
+        """Local cache and reporting counters"""
+        return {
+            "user_agent": self.classifier.ua_analyzer.cache.stats(),
+            "verdict": self.verdicts.stats(),
+            "timing": self.timing.stats(),
+            "detections": self.detection_reporter.stats() if self.detection_reporter else None,
+            "usage": self.usage_reporter.stats() if self.usage_reporter else None
+        }
+
+    def _lifespan_receive(self, receive):
+        """Flush reports when the server signals shutdown, before the app sees it"""
+        async def wrapped():
+            message = await receive()
+            if message["type"] == "lifespan.shutdown":
+                await self.stop()
+            return message
+        return wrapped
+
+    def _set_patterns(self, index: BotPatternIndex) -> None:
+        """Swap in a refreshed pattern index and drop verdicts based on the old one"""
+        self.classifier.pattern_index = index
+        self.verdicts.clear()
+
+    def _describe_request(self, scope) -> Dict:
+        """Reduce an ASGI scope to the descriptor used by detection"""
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+        }
+
+        ip = None
+        if self.client_ip_header and self.client_ip_header in headers:
+            ip = headers[self.client_ip_header].split(",")[0].strip()
+        if not ip:
+            client = scope.get("client")
+            ip = client[0] if client else "unknown"
+
+        return {
+            'ip': ip,
+            'user_agent': headers.get("user-agent", ""),
+            'headers': headers,
+            'path': scope.get("path", "/"),
+            'method': scope.get("method", "GET"),
+            'timestamp': time.time()
+        }
+
+    def _build_report(self, descriptor: Dict, results) -> Dict:
+        """Detection event in the shape accepted by POST /api/detection/report"""
+        return {
+            'ip': descriptor['ip'],
+            'user_agent': descriptor['user_agent'],
+            'path': descriptor['path'],
+            'method': descriptor['method'],
+            'timestamp': descriptor['timestamp'],
+            'is_bot': results['is_bot'],
+            'is_ai_crawler': results['is_ai_crawler'],
+            'bot_name': results['bot_name'],
+            'bot_type': results['bot_type'],
+            'confidence_score': results['confidence_score'],
+            'detection_methods': list(results['detection_methods'])
+        }
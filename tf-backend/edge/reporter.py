@@ -0,0 +1,145 @@
+# tf-backend/edge/reporter.py
+
+import asyncio
+from typing import Dict, List, Optional
+import requests
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_STOP = object()
+
+class BatchReporter:
+    """
+    Fire-and-forget uploader for edge events.
+
+    Events are queued in memory and POSTed to the API by a background task
+    as {"publisher_id": ..., <field>: [events]}, one request per batch_size
+    events or per flush_interval seconds, whichever comes first. The queue
+    is bounded by max_pending; when the API is slow or unreachable new
+    events are dropped rather than delaying the publisher's responses.
+    """
+
+    def __init__(self, url: str, field: str, publisher_id: str,
+                 session: requests.Session, batch_size: int = 200,
+                 flush_interval: float = 5.0, max_pending: int = 10000,
+                 timeout: float = 5.0):
+        self.url = url
+        self.field = field
+        self.publisher_id = publisher_id
+        self.session = session
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.events_sent = 0
+        self.events_dropped = 0
+        self.events_failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Start the background upload task on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Upload everything still queued and stop the background task"""
+        if not self.running:
+            return
+
+        task = self._task
+        try:
+            self._queue.put_nowait(_STOP)
+        except asyncio.QueueFull:
+            # Make room for the sentinel; the oldest event is lost
+            self._queue.get_nowait()
+            self.events_dropped += 1
+            self._queue.put_nowait(_STOP)
+        await task
+        self._task = None
+        logger.info("edge_reporter_stopped",
+                   url=self.url,
+                   events_sent=self.events_sent,
+                   events_dropped=self.events_dropped,
+                   events_failed=self.events_failed)
+
+    def submit(self, event: Dict) -> None:
+        """Queue one event without waiting; dropped if the queue is full"""
+        if not self.running:
+            self.events_dropped += 1
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.events_dropped += 1
+
+    def stats(self) -> Dict:
+        """Snapshot of queue depth and upload counters"""
+        return {
+            "running": self.running,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_pending": self.max_pending,
+            "events_sent": self.events_sent,
+            "events_dropped": self.events_dropped,
+            "events_failed": self.events_failed
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        event = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+                if event is _STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+
+            await self._send(batch)
+
+    async def _send(self, events: List[Dict]) -> None:
+        """POST a batch in a worker thread so the event loop keeps serving requests"""
+        try:
+            await asyncio.to_thread(self._post, events)
+            self.events_sent += len(events)
+        except Exception as e:
+            self.events_failed += len(events)
+            logger.error("edge_report_failed",
+                        url=self.url,
+                        events=len(events),
+                        error=str(e))
+
+    def _post(self, events: List[Dict]) -> None:
+        response = self.session.post(
+            self.url,
+            json={"publisher_id": self.publisher_id, self.field: events},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
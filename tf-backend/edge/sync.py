@@ -0,0 +1,88 @@
+# tf-backend/edge/sync.py
+
+import asyncio
+from typing import Callable, FrozenSet, Optional
+import requests
+from api.detection.utils import BotPatternIndex
+from api.access_tokens.services import token_digest
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+class EdgeSync:
+    """
+    Keeps local copies of the bot patterns and the publisher's token
+    whitelist, refreshed from the API every interval seconds.
+
+    Until the first refresh succeeds, the patterns bundled with the
+    package are used and the whitelist is empty.
+    """
+
+    def __init__(self, api_url: str, publisher_id: str, session: requests.Session,
+                 interval: float = 300.0, timeout: float = 5.0,
+                 on_patterns: Optional[Callable[[BotPatternIndex], None]] = None):
+        self.api_url = api_url
+        self.publisher_id = publisher_id
+        self.session = session
+        self.interval = interval
+        self.timeout = timeout
+        self.on_patterns = on_patterns
+
+        self.token_digests: FrozenSet[str] = frozenset()
+        self._patterns_etag: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_allowed_token(self, token: str) -> bool:
+        """Whether a presented access token is on the publisher's whitelist"""
+        return token_digest(token) in self.token_digests
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error("edge_sync_failed",
+                            api_url=self.api_url,
+                            error=str(e))
+            await asyncio.sleep(self.interval)
+
+    def refresh(self) -> None:
+        """Fetch the whitelist and, if changed, the bot patterns"""
+        response = self.session.get(
+            f"{self.api_url}/api/access-tokens/publisher/{self.publisher_id}/whitelist",
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        self.token_digests = frozenset(response.json().get("digests", []))
+
+        headers = {"If-None-Match": self._patterns_etag} if self._patterns_etag else {}
+        response = self.session.get(
+            f"{self.api_url}/api/detection/bot-patterns",
+            headers=headers,
+            timeout=self.timeout
+        )
+        if response.status_code == 304:
+            return
+        response.raise_for_status()
+
+        index = BotPatternIndex(response.json()["patterns"])
+        self._patterns_etag = response.headers.get("ETag")
+        if self.on_patterns is not None:
+            self.on_patterns(index)
+
+        logger.info("edge_sync_refreshed",
+                   patterns=len(index),
+                   whitelisted_tokens=len(self.token_digests))
@@ -20,6 +20,14 @@ from api.contact import router as contact_router
 from api.auth import router as auth_router
 from api.token_metering import router as metering_router
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+import asyncio
+from core.redis_client import RedisClientFactory
+from core.ingestion import get_request_log_buffer
+from api.detection.utils import get_pattern_registry, get_allowlist, get_crawler_ranges
+from api.detection.leaderboard import get_risk_leaderboard
+from core.metrics import get_stage_metrics, PROMETHEUS_CONTENT_TYPE
+from core.executors import get_offload_executor
 #from api.payments import router as payments_router
 
 # Initialize settings
@@ -29,9 +37,49 @@ settings = get_settings()
 setup_logging()
 logger = get_logger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    request_log_buffer = get_request_log_buffer()
+    await request_log_buffer.start()
+    
+    # Follow bot pattern updates published by any worker
+    pattern_registry = get_pattern_registry()
+    await pattern_registry.start()
+    
+    # Follow publisher allowlist changes
+    allowlist = get_allowlist()
+    await allowlist.start()
+    
+    # Pick up crawler range file changes and refresh the published ranges
+    crawler_ranges = get_crawler_ranges()
+    await crawler_ranges.start()
+    
+    # Drop decayed IPs from the high-risk leaderboards
+    risk_leaderboard = get_risk_leaderboard()
+    await risk_leaderboard.start()
+    
+    yield
+    
+    await risk_leaderboard.stop()
+    await crawler_ranges.stop()
+    await allowlist.stop()
+    await pattern_registry.stop()
+    
+    # Stop parsing workers without blocking the event loop
+    await asyncio.to_thread(get_offload_executor().shutdown)
+    
+    # Flush buffered request logs before the process exits
+    await request_log_buffer.stop()
+    
+    # Release shared connections on shutdown
+    logger.info("Closing Redis connections")
+    await RedisClientFactory.close_async_connection()
+    RedisClientFactory.close_connection()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="TrainFair Bot Detection System",
+    lifespan=lifespan,
     #root_path="/api",
     #root_path_in_servers=False
 )
@@ -164,6 +212,15 @@ async def health_check():
     logger.info("Health check completed", **status_info)
     return status_info        
 
+# Prometheus scrape endpoint for detection stage latencies and executor queues
+@app.get("/metrics")
+async def metrics():
+    stage_metrics = get_stage_metrics()
+    if not stage_metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    content = stage_metrics.render() + get_offload_executor().render()
+    return Response(content=content, media_type=PROMETHEUS_CONTENT_TYPE)
+
 # Temporary checking routes
 @app.get("/routes")
 def get_routes():
@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine, text
+from core.config import get_settings
+
+def add_request_log_sample_weight():
+    """
+    Add the sample_weight column to an existing request_logs table.
+    Existing rows were all persisted, so they get weight 1.
+    """
+    settings = get_settings()
+    engine = create_engine(settings.SQLALCHEMY_DATABASE_URL)
+    
+    try:
+        with engine.begin() as connection:
+            connection.execute(text(
+                "ALTER TABLE request_logs "
+                "ADD COLUMN IF NOT EXISTS sample_weight DOUBLE PRECISION NOT NULL DEFAULT 1"
+            ))
+        
+        print("Added sample_weight to request_logs")
+        
+    except Exception as e:
+        print(f"Error adding sample_weight column: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    add_request_log_sample_weight()
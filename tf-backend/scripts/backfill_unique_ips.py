@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from core.config import get_settings
+from core.database import SessionLocal
+from core.models.detection import RequestLog
+from core.redis_client import RedisClientFactory
+from core.unique_ips import UniqueIPCounter
+
+BATCH_SIZE = 5000
+
+async def backfill_unique_ips():
+    """
+    Build the hourly unique-IP sketches from request_logs for the
+    retention window.
+
+    New requests are added to the sketches as they are logged, so this is
+    only needed once after deploying, to cover traffic logged before.
+    Adding an IP that is already in a sketch is a no-op, so it is safe to
+    run while traffic is being logged. The sketches are written to the
+    detection state database, as the live counter writes them.
+    """
+    settings = get_settings()
+    counter = UniqueIPCounter(
+        RedisClientFactory.get_detection_client(),
+        retention_hours=settings.UNIQUE_IPS_RETENTION_HOURS
+    )
+    since = datetime.now(timezone.utc) - timedelta(hours=settings.UNIQUE_IPS_RETENTION_HOURS)
+
+    db = SessionLocal()
+    recorded = 0
+
+    try:
+        query = db.query(
+            RequestLog.publisher_id,
+            RequestLog.timestamp,
+            RequestLog.ip_address
+        ).filter(RequestLog.timestamp >= since).yield_per(BATCH_SIZE)
+
+        batch = []
+        for publisher_id, timestamp, ip_address in query:
+            batch.append({'publisher_id': publisher_id, 'timestamp': timestamp, 'ip_address': ip_address})
+            if len(batch) >= BATCH_SIZE:
+                await counter.record(batch)
+                recorded += len(batch)
+                batch = []
+
+        if batch:
+            await counter.record(batch)
+            recorded += len(batch)
+
+        print(f"Added {recorded} request log rows to unique-IP sketches")
+
+    except Exception as e:
+        print(f"Error backfilling unique-IP sketches: {str(e)}")
+        raise
+
+    finally:
+        db.close()
+        await RedisClientFactory.close_async_connection()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_unique_ips())
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import contextlib
+import ipaddress
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+# Stage histograms are read from the app's own metrics, so they have to be
+# on before anything reads the settings
+os.environ.setdefault("METRICS_ENABLED", "true")
+
+from sqlalchemy import ARRAY, create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
+import core.database
+from core.redis_client import RedisClientFactory
+
+PUBLISHER_PREFIX = "bench-publisher-"
+
+CHROME_WINDOWS = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{major}.0.0.0 Safari/537.36"
+CHROME_ANDROID = "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{major}.0.0.0 Mobile Safari/537.36"
+SAFARI_IPHONE = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_{minor} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{minor} Mobile/15E148 Safari/604.1"
+FIREFOX_WINDOWS = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{major}.0) Gecko/20100101 Firefox/{major}.0"
+SAMSUNG_ANDROID = "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/{major}.0.0.0 Mobile Safari/537.36"
+
+# Declared crawlers: (user agent, genuine IP range, reverse DNS name for
+# genuine IPs or None if the operator is not DNS-verified)
+CRAWLERS = [
+    ("Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+     "66.249.66.0/24", "crawl-{dashed}.googlebot.com"),
+    ("Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+     "157.55.39.0/24", "msnbot-{dashed}.search.msn.com"),
+    ("Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; GPTBot/1.2; +https://openai.com/gptbot)",
+     "20.171.207.0/24", None),
+    ("Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; ClaudeBot/1.0; +claudebot@anthropic.com)",
+     "160.79.104.0/24", None),
+    ("Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; PerplexityBot/1.0; +https://perplexity.ai/perplexitybot)",
+     "44.221.181.0/24", None),
+    ("CCBot/2.0 (https://commoncrawl.org/faq/)", "18.97.9.0/24", None),
+]
+
+# Visitor addresses per profile. Browsers come from a wide pool, scrapers
+# from a few addresses each sending a lot, spoofed crawlers from anywhere
+BROWSER_NETWORK = ipaddress.ip_network("100.64.0.0/12")
+SCRAPER_NETWORK = ipaddress.ip_network("203.0.113.0/24")
+SPOOFED_NETWORK = ipaddress.ip_network("198.51.100.0/24")
+
+def random_address(rng, network):
+    return str(network[rng.randrange(network.num_addresses)])
+
+def browser_headers(rng):
+    """Headers in the order a real browser sends them"""
+    kind = rng.choices(["chrome", "android", "iphone", "firefox", "samsung"], [45, 20, 20, 10, 5])[0]
+    major = rng.randint(118, 125)
+    headers = [("host", "publisher.example"), ("connection", "keep-alive")]
+
+    if kind in ("chrome", "android", "samsung"):
+        mobile = "?0" if kind == "chrome" else "?1"
+        platform = '"Windows"' if kind == "chrome" else '"Android"'
+        headers += [
+            ("sec-ch-ua", f'"Chromium";v="{major}", "Google Chrome";v="{major}", "Not-A.Brand";v="99"'),
+            ("sec-ch-ua-mobile", mobile),
+            ("sec-ch-ua-platform", platform),
+        ]
+    template = {
+        "chrome": CHROME_WINDOWS, "android": CHROME_ANDROID, "iphone": SAFARI_IPHONE,
+        "firefox": FIREFOX_WINDOWS, "samsung": SAMSUNG_ANDROID
+    }[kind]
+
+    headers += [
+        ("upgrade-insecure-requests", "1"),
+        ("user-agent", template.format(major=major, minor=rng.randint(0, 5))),
+        ("accept", "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8"),
+        ("sec-fetch-site", "none"),
+        ("sec-fetch-mode", "navigate"),
+        ("sec-fetch-user", "?1"),
+        ("sec-fetch-dest", "document"),
+        ("accept-encoding", "gzip, deflate, br"),
+        ("accept-language", rng.choice(["en-US,en;q=0.9", "en-GB,en;q=0.8", "es-ES,es;q=0.9,en;q=0.7"])),
+    ]
+    if rng.random() < 0.6:
+        headers.append(("cookie", f"session={rng.getrandbits(64):016x}"))
+    return headers
+
+def crawler_headers(user_agent):
+    return [
+        ("host", "publisher.example"),
+        ("user-agent", user_agent),
+        ("accept", "*/*"),
+        ("accept-encoding", "gzip, deflate, br"),
+    ]
+
+def scraper_headers(rng):
+    """A current browser user agent sent by an HTTP library"""
+    return [
+        ("host", "publisher.example"),
+        ("user-agent", CHROME_WINDOWS.format(major=rng.randint(118, 125))),
+        ("accept-encoding", "gzip, deflate"),
+        ("accept", "*/*"),
+        ("connection", "keep-alive"),
+    ]
+
+def build_traffic(count, mix, publishers, seed):
+    """
+    Synthetic visitor requests as (profile, client IP, headers, publisher)
+
+    Args:
+        count: Number of requests
+        mix: Weights of browsers, declared crawlers and disguised scrapers
+        publishers: Number of publishers the traffic is spread over
+        seed: Random seed, so runs can be compared
+    """
+    rng = random.Random(seed)
+    scraper_ips = [random_address(rng, SCRAPER_NETWORK) for _ in range(20)]
+    genuine = {}
+
+    traffic = []
+    for _ in range(count):
+        profile = rng.choices(["browser", "crawler", "scraper"], mix)[0]
+        publisher_id = f"{PUBLISHER_PREFIX}{rng.randrange(publishers)}"
+
+        if profile == "browser":
+            ip = random_address(rng, BROWSER_NETWORK)
+            headers = browser_headers(rng)
+        elif profile == "crawler":
+            user_agent, network, hostname = rng.choice(CRAWLERS)
+            if rng.random() < 0.8:
+                ip = random_address(rng, ipaddress.ip_network(network))
+                if hostname is not None:
+                    genuine[ip] = hostname.format(dashed=ip.replace(".", "-"))
+            else:
+                # Someone else borrowing the crawler's name
+                profile = "spoofed crawler"
+                ip = random_address(rng, SPOOFED_NETWORK)
+            headers = crawler_headers(user_agent)
+        else:
+            ip = rng.choice(scraper_ips)
+            headers = scraper_headers(rng)
+
+        traffic.append((profile, ip, headers, publisher_id))
+    return traffic, genuine
+
+def use_memory_database():
+    """
+    Point the app's engine and sessions at an in-memory SQLite database.
+    Must run before main is imported, since it creates tables on import.
+    """
+    @compiles(JSONB, "sqlite")
+    def compile_jsonb(type_, compiler, **kw):
+        return "JSON"
+
+    @compiles(ARRAY, "sqlite")
+    def compile_array(type_, compiler, **kw):
+        return "JSON"
+
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    core.database.engine = engine
+    core.database.SessionLocal.configure(bind=engine)
+
+async def post_detection(app, ip, headers, publisher_id):
+    """
+    Send one POST /api/detection through the ASGI app, as uvicorn would
+    for a client at ip
+
+    Returns:
+        Tuple of (status code, response body)
+    """
+    body = json.dumps({"publisher_id": publisher_id}).encode()
+    raw_headers = [(name.encode(), value.encode()) for name, value in headers]
+    raw_headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/detection",
+        "raw_path": b"/api/detection",
+        "query_string": b"",
+        "root_path": "",
+        "headers": raw_headers,
+        "client": (ip, random.randint(1024, 65535)),
+        "server": ("127.0.0.1", 8000),
+    }
+
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    finished = asyncio.Event()
+    status = None
+    chunks = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, b"".join(chunks)
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def histogram_quantile(bounds, counts, q):
+    """Quantile from bucket counts, interpolated within a bucket as Prometheus does"""
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+    rank = q * total
+    seen = 0
+    lower = 0.0
+    for bound, count in zip(list(bounds) + [bounds[-1]], counts):
+        if count and seen + count >= rank:
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+    return bounds[-1]
+
+async def run(args, app):
+    from core.metrics import get_stage_metrics
+    from core.ingestion import get_request_log_buffer
+    from api.detection.utils import StubResolver, get_dns_verifier
+
+    total = args.warmup + args.requests
+    traffic, genuine = build_traffic(total, args.mix, args.publishers, args.seed)
+
+    # Answer reverse-then-forward DNS checks locally
+    get_dns_verifier().resolver = StubResolver(
+        ptr={ip: [hostname] for ip, hostname in genuine.items()},
+        addresses={hostname: [ip] for ip, hostname in genuine.items()}
+    )
+
+    if args.flush_redis:
+        await RedisClientFactory.get_async_client().flushdb()
+
+    metrics = get_stage_metrics()
+    latencies = defaultdict(list)
+    verdicts = defaultdict(Counter)
+    statuses = Counter()
+    position = 0
+    measuring = False
+
+    async def worker():
+        nonlocal position
+        while position < len(traffic):
+            profile, ip, headers, publisher_id = traffic[position]
+            position += 1
+
+            started = time.perf_counter()
+            status, body = await post_detection(app, ip, headers, publisher_id)
+            elapsed = time.perf_counter() - started
+
+            if not measuring:
+                continue
+            statuses[status] += 1
+            latencies[profile].append(elapsed)
+            if status == 200:
+                results = json.loads(body)["results"]
+                verdicts[profile]["bot" if results["is_bot"] else "human"] += 1
+
+    async with app.router.lifespan_context(app):
+        if args.warmup:
+            traffic, rest = traffic[:args.warmup], traffic[args.warmup:]
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            traffic, position = rest, 0
+
+        metrics.reset()
+        measuring = True
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stages = metrics.snapshot()
+        # Let the request log buffer write what is queued
+        buffer = get_request_log_buffer()
+    buffer_stats = buffer.stats()
+
+    return elapsed, latencies, verdicts, statuses, stages, metrics.buckets, buffer_stats
+
+def report(args, elapsed, latencies, verdicts, statuses, stages, buckets, buffer_stats, out):
+    everything = sorted(value for values in latencies.values() for value in values)
+    count = len(everything)
+
+    print(f"Requests:      {count} in {elapsed:.2f} s, concurrency {args.concurrency}, "
+          f"{args.publishers} publishers, {args.database} database", file=out)
+    print(f"Throughput:    {count / elapsed:.1f} req/s", file=out)
+    print(f"Latency (ms):  p50 {percentile(everything, 0.50) * 1e3:.2f}  "
+          f"p95 {percentile(everything, 0.95) * 1e3:.2f}  "
+          f"p99 {percentile(everything, 0.99) * 1e3:.2f}  "
+          f"max {everything[-1] * 1e3 if everything else 0.0:.2f}", file=out)
+    print(f"Status codes:  {', '.join(f'{code} x {n}' for code, n in sorted(statuses.items()))}", file=out)
+
+    print("", file=out)
+    print(f"{'profile':<16} {'requests':>8} {'bot':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}", file=out)
+    for profile in ("browser", "crawler", "spoofed crawler", "scraper"):
+        values = sorted(latencies.get(profile, []))
+        if not values:
+            continue
+        flagged = verdicts[profile]["bot"] / max(1, sum(verdicts[profile].values()))
+        print(f"{profile:<16} {len(values):>8} {flagged:>7.1%} "
+              f"{percentile(values, 0.50) * 1e3:>8.2f} {percentile(values, 0.95) * 1e3:>8.2f} "
+              f"{percentile(values, 0.99) * 1e3:>8.2f}", file=out)
+
+    if stages:
+        print("", file=out)
+        print(f"{'stage':<24} {'count':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ms/req':>8}", file=out)
+        for stage, data in sorted(stages.items(), key=lambda item: -item[1]["sum"]):
+            quantiles = [histogram_quantile(buckets, data["buckets"], q) * 1e3 for q in (0.50, 0.95, 0.99)]
+            print(f"{stage:<24} {data['count']:>8} {data['sum'] / data['count'] * 1e3:>8.3f} "
+                  f"{quantiles[0]:>8.3f} {quantiles[1]:>8.3f} {quantiles[2]:>8.3f} "
+                  f"{data['sum'] / max(1, count) * 1e3:>8.3f}", file=out)
+
+    print("", file=out)
+    print(f"Request logs:  {buffer_stats['rows_written']} written, {buffer_stats['rows_sampled_out']} sampled out, "
+          f"{buffer_stats['rows_dropped']} dropped in {buffer_stats['flushes']} flushes", file=out)
+
+def benchmark(args):
+    if args.database == "memory":
+        use_memory_database()
+
+    out = sys.stdout
+    logs = contextlib.nullcontext() if args.logs else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with logs:
+        # main creates its tables and logging on import
+        from main import app
+        results = asyncio.run(run(args, app))
+
+    report(args, *results, out=out)
+
+def parse_mix(value):
+    weights = [float(weight) for weight in value.split(",")]
+    if len(weights) != 3 or any(weight < 0 for weight in weights) or not any(weights):
+        raise argparse.ArgumentTypeError("mix is three non-negative weights: browsers,crawlers,scrapers")
+    return weights
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-test POST /api/detection in-process with a synthetic traffic mix"
+    )
+    parser.add_argument("--requests", type=int, default=5000, help="Measured requests")
+    parser.add_argument("--warmup", type=int, default=500, help="Requests sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--publishers", type=int, default=5)
+    parser.add_argument("--mix", type=parse_mix, default=[70, 15, 15],
+                        help="Weights of browsers, declared crawlers and disguised scrapers (default: 70,15,15)")
+    parser.add_argument("--database", choices=["memory", "postgres"], default="memory",
+                        help="In-memory SQLite stand-in or the configured Postgres")
+    parser.add_argument("--flush-redis", action="store_true",
+                        help="FLUSHDB the configured Redis database before starting")
+    parser.add_argument("--logs", action="store_true", help="Keep the app's log output")
+    parser.add_argument("--seed", type=int, default=22)
+    benchmark(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import random
+import time
+import ua_parser.user_agent_parser
+from api.detection.utils.ua_fastpath import classify_user_agent
+
+# Rough traffic mix: (weight, template). {chrome} etc. are filled with random versions
+BROWSER_TEMPLATES = [
+    (30, "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome} Safari/537.36"),
+    (8, "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome} Safari/537.36"),
+    (3, "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome} Safari/537.36"),
+    (6, "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome} Safari/537.36 Edg/{edge}"),
+    (5, "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{gecko}) Gecko/20100101 Firefox/{gecko}"),
+    (2, "Mozilla/5.0 (Macintosh; Intel Mac OS X {mac_dot}; rv:{gecko}) Gecko/20100101 Firefox/{gecko}"),
+    (1, "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:{gecko}) Gecko/20100101 Firefox/{gecko}"),
+    (5, "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{safari} Safari/605.1.15"),
+    (12, "Mozilla/5.0 (iPhone; CPU iPhone OS {ios} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{safari} Mobile/15E148 Safari/604.1"),
+    (2, "Mozilla/5.0 (iPad; CPU OS {ios} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{safari} Mobile/15E148 Safari/604.1"),
+    (2, "Mozilla/5.0 (iPhone; CPU iPhone OS {ios} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/{chrome} Mobile/15E148 Safari/604.1"),
+    (14, "Mozilla/5.0 (Linux; Android {android}; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome} Mobile Safari/537.36"),
+    # Shapes the fast path leaves to ua_parser
+    (3, "Mozilla/5.0 (Linux; Android {android}; SM-S{model}B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome} Mobile Safari/537.36"),
+    (2, "Mozilla/5.0 (Linux; Android {android}; SAMSUNG SM-A{model}F) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/{samsung} Chrome/{chrome} Mobile Safari/537.36"),
+    (2, "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome} Safari/537.36 OPR/{opera}"),
+    (1, "Mozilla/5.0 (X11; CrOS x86_64 {cros}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome} Safari/537.36"),
+    (1, "Mozilla/5.0 (iPhone; CPU iPhone OS {ios} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 [FBAN/FBIOS;FBAV/{samsung}]"),
+]
+
+BOT_TEMPLATES = [
+    (3, "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"),
+    (2, "Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; GPTBot/1.{minor}; +https://openai.com/gptbot)"),
+    (2, "Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; ClaudeBot/1.0; +claudebot@anthropic.com)"),
+    (1, "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)"),
+    (1, "Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)"),
+    (1, "CCBot/2.0 (https://commoncrawl.org/faq/)"),
+    (1, "Mozilla/5.0 (compatible; Bytespider; spider-feedback@bytedance.com)"),
+    (2, "python-requests/2.{minor}.0"),
+    (2, "curl/8.{minor}.0"),
+    (1, "Go-http-client/1.1"),
+    (1, "Scrapy/2.{minor}.0 (+https://scrapy.org)"),
+    (1, "Mozilla/5.0 (compatible; {random_bot}/{minor}.0; +https://example.com/bot)"),
+]
+
+def random_fields(rng):
+    chrome_major = rng.randint(100, 124)
+    return {
+        'chrome': f"{chrome_major}.0.{rng.randint(4000, 6400)}.{rng.randint(0, 200)}",
+        'edge': f"{chrome_major}.0.{rng.randint(1000, 2500)}.{rng.randint(0, 100)}",
+        'gecko': f"{rng.randint(100, 125)}.0",
+        'safari': rng.choice(["16.6", "17.0", "17.1", "17.2.1", "17.4"]),
+        'ios': rng.choice(["16_6", "17_0", "17_1_2", "17_2", "17_4_1"]),
+        'mac_dot': rng.choice(["10.15", "14.1", "13.6"]),
+        'android': str(rng.randint(10, 14)),
+        'model': str(rng.randint(100, 999)),
+        'samsung': f"{rng.randint(20, 24)}.0",
+        'opera': f"{rng.randint(95, 110)}.0.0.0",
+        'cros': f"{rng.randint(14000, 15800)}.0.0",
+        'minor': str(rng.randint(0, 30)),
+        'random_bot': ''.join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(6)).title() + "Bot",
+    }
+
+def build_corpus(size, bot_share, seed):
+    """Synthetic UA strings in a rough real-world mix, most of them unique"""
+    rng = random.Random(seed)
+    browsers = [template for _, template in BROWSER_TEMPLATES]
+    browser_weights = [weight for weight, _ in BROWSER_TEMPLATES]
+    bots = [template for _, template in BOT_TEMPLATES]
+    bot_weights = [weight for weight, _ in BOT_TEMPLATES]
+
+    corpus = []
+    for _ in range(size):
+        if rng.random() < bot_share:
+            template = rng.choices(bots, bot_weights)[0]
+        else:
+            template = rng.choices(browsers, browser_weights)[0]
+        corpus.append(template.format(**random_fields(rng)))
+    return corpus
+
+def time_per_ua(parse, corpus):
+    started = time.perf_counter()
+    for user_agent in corpus:
+        parse(user_agent)
+    return (time.perf_counter() - started) / len(corpus) * 1e6
+
+def full_parse(user_agent):
+    return ua_parser.user_agent_parser.Parse(user_agent)
+
+def with_fast_path(user_agent):
+    return classify_user_agent(user_agent) or ua_parser.user_agent_parser.Parse(user_agent)
+
+def benchmark(args):
+    if args.corpus:
+        with open(args.corpus) as f:
+            corpus = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        corpus = build_corpus(args.size, args.bot_share, args.seed)
+
+    # Warm up compiled regexes on both sides
+    for user_agent in corpus[:100]:
+        with_fast_path(user_agent)
+        full_parse(user_agent)
+
+    resolved = 0
+    mismatches = []
+    for user_agent in corpus:
+        fast = classify_user_agent(user_agent)
+        if fast is None:
+            continue
+        resolved += 1
+        full = full_parse(user_agent)
+        if any(fast[part] != full[part] for part in ('user_agent', 'os', 'device')):
+            mismatches.append(user_agent)
+
+    fast_only = [user_agent for user_agent in corpus if classify_user_agent(user_agent) is not None]
+    fallthrough = [user_agent for user_agent in corpus if classify_user_agent(user_agent) is None]
+
+    print(f"User agents:            {len(corpus)} ({len(set(corpus))} unique)")
+    print(f"Resolved by fast path:  {resolved} ({resolved / len(corpus):.1%})")
+    print(f"Disagreeing with full:  {len(mismatches)}")
+    print(f"Full parser:            {time_per_ua(full_parse, corpus):8.1f} us/UA")
+    print(f"Fast path + fallback:   {time_per_ua(with_fast_path, corpus):8.1f} us/UA")
+    if fast_only:
+        print(f"  resolved UAs:         {time_per_ua(classify_user_agent, fast_only):8.1f} us/UA")
+    if fallthrough:
+        print(f"  fall-through UAs:     {time_per_ua(with_fast_path, fallthrough):8.1f} us/UA")
+
+    for user_agent in mismatches[:10]:
+        print(f"MISMATCH {user_agent}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the user agent fast path against ua_parser")
+    parser.add_argument("--corpus", help="File with one user agent per line (default: synthetic)")
+    parser.add_argument("--size", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--bot-share", type=float, default=0.2, help="Share of bot UAs in the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=21)
+    benchmark(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
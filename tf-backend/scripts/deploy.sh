@@ -16,6 +16,10 @@ source tfenv/bin/activate
 pip install --upgrade pip
 pip install -r requirements.txt
 
+# Fetch published crawler IP ranges (workers refresh them when
+# CRAWLER_RANGES_FETCH_INTERVAL is set)
+python -m scripts.fetch_crawler_ranges
+
 # Copy systemd serice file
 sudo cd deployment/trainfair.service /etc/systemd/system/
 sudo systemctl daemon-reload
@@ -0,0 +1,30 @@
+from pathlib import Path
+from core.config import get_settings
+from api.detection.utils.ip_ranges import DEFAULT_RANGES_DIR, PUBLISHED_RANGES, fetch_published_ranges
+
+def fetch_crawler_ranges():
+    """
+    Download published crawler IP ranges into the crawler ranges directory.
+
+    Run it before the first start and periodically, or set
+    CRAWLER_RANGES_FETCH_INTERVAL for workers to fetch them in the
+    background. Each operator is written to its own JSON file, replaced
+    atomically so running workers pick up the new ranges on their next
+    reload check.
+
+    Run it as a module from tf-backend:
+
+        python -m scripts.fetch_crawler_ranges
+    """
+    settings = get_settings()
+    directory = Path(settings.CRAWLER_RANGES_DIR) if settings.CRAWLER_RANGES_DIR else DEFAULT_RANGES_DIR
+
+    fetched = fetch_published_ranges(directory)
+    for operator in PUBLISHED_RANGES:
+        if operator in fetched:
+            print(f"{operator}: {fetched[operator]} ranges -> {directory}")
+        else:
+            print(f"{operator}: fetch failed, previous ranges kept")
+
+if __name__ == "__main__":
+    fetch_crawler_ranges()
@@ -0,0 +1,57 @@
+import redis
+from core.config import get_settings
+from api.detection.redis_scripts import MIGRATE_HISTORY_LUA
+from api.detection.utils.timing import RATE_WINDOW, TIMING_WINDOW
+
+BATCH_SIZE = 500
+
+def migrate_request_history():
+    """
+    Convert legacy request histories (JSON lists or packed timestamps)
+    to streaming timing hashes.
+
+    The detection script converts keys lazily on first use and unconverted
+    keys expire with the history TTL, so this is only needed to reclaim
+    memory right away after deploying. Histories are detection state, so
+    it runs against DETECTION_REDIS_DB when that is set.
+    """
+    settings = get_settings()
+    connection_params = settings.get_redis_connection_params()
+    if settings.DETECTION_REDIS_DB is not None:
+        connection_params['db'] = settings.DETECTION_REDIS_DB
+    client = redis.Redis(**connection_params, decode_responses=True)
+    migrate = client.register_script(MIGRATE_HISTORY_LUA)
+
+    converted = 0
+    pending = []
+
+    try:
+        for key_type in ("list", "string"):
+            for key in client.scan_iter(match="requests:*", count=1000, _type=key_type):
+                pending.append(key)
+                if len(pending) >= BATCH_SIZE:
+                    converted += _migrate_batch(client, migrate, pending)
+                    pending = []
+
+        if pending:
+            converted += _migrate_batch(client, migrate, pending)
+
+        print(f"Converted {converted} request history keys")
+
+    except Exception as e:
+        print(f"Error migrating request history: {str(e)}")
+        raise
+
+    finally:
+        client.close()
+
+def _migrate_batch(client, migrate, keys) -> int:
+    """Run the migration script for a batch of keys in one pipeline"""
+    with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            migrate(keys=[key], args=[RATE_WINDOW, TIMING_WINDOW], client=pipe)
+        results = pipe.execute()
+    return sum(1 for result in results if result >= 0)
+
+if __name__ == "__main__":
+    migrate_request_history()
@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import contextlib
+import gzip
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from core.access_logs import LOG_FORMATS, AccessLogReader
+from core.config import get_settings
+
+RESULT_FIELDS = ('is_bot', 'is_ai_crawler', 'bot_name', 'bot_type', 'confidence_score', 'detection_methods')
+
+class SimulatedClock:
+    """
+    Replay time, following the timestamps of the requests replayed so far.
+
+    Detection reads request timing from the descriptors, so rate and
+    interval features already see log time. The clock drives the
+    periodic work the app runs on wall time, like the risk leaderboard
+    sweep, every tick seconds of log time.
+    """
+
+    def __init__(self, tick: float):
+        self.tick = tick
+        self.now = None
+        self._next_tick = None
+
+    def advance(self, timestamp: float) -> bool:
+        """Move to a request's timestamp; True when a tick has passed since the last one"""
+        if self.now is None or timestamp > self.now:
+            self.now = timestamp
+        if self._next_tick is None:
+            self._next_tick = self.now + self.tick
+            return False
+        if self.now < self._next_tick:
+            return False
+        self._next_tick = self.now + self.tick
+        return True
+
+def shard_for(ip: str, shards: int) -> int:
+    """Every request from an IP goes to the same shard, so its history stays in order"""
+    return zlib.crc32(ip.encode()) % shards
+
+def batches_by_shard(descriptors, shards: int, batch_size: int):
+    """Group descriptors into per-shard batches, yielding (shard, batch) as they fill"""
+    pending = [[] for _ in range(shards)]
+    for descriptor in descriptors:
+        shard = shard_for(descriptor['ip'], shards)
+        batch = pending[shard]
+        batch.append(descriptor)
+        if len(batch) >= batch_size:
+            yield shard, batch
+            pending[shard] = []
+    for shard, batch in enumerate(pending):
+        if batch:
+            yield shard, batch
+
+def output_row(descriptor, results):
+    row = {
+        'timestamp': descriptor['timestamp'],
+        'ip': descriptor['ip'],
+        'method': descriptor['method'],
+        'path': descriptor['path'],
+        'user_agent': descriptor['user_agent'],
+    }
+    for field in RESULT_FIELDS:
+        value = results.get(field)
+        row[field] = list(value) if field == 'detection_methods' else value
+    return row
+
+async def replay_shard_async(shard, batches, results, options):
+    # Imported here so each worker process sets up its own clients
+    from core.database import SessionLocal
+    from core.ingestion import get_request_log_buffer
+    from core.redis_client import RedisClientFactory
+    from api.detection.leaderboard import get_risk_leaderboard
+    from api.detection.utils import get_allowlist, get_pattern_registry
+    from api.detection.services import BotDetectorService
+
+    # Same pattern version and allowlists as the running workers, read
+    # from the live database; detection state goes to the replay's own
+    await get_pattern_registry().load()
+    await get_allowlist().load()
+
+    buffer = get_request_log_buffer()
+    if options['load']:
+        await buffer.start()
+
+    db = SessionLocal()
+    leaderboard = get_risk_leaderboard()
+    clock = SimulatedClock(leaderboard.sweep_interval)
+    counts = Counter()
+
+    # Its own thread: background DNS checks can fill the default executor
+    loop = asyncio.get_running_loop()
+    receiver = ThreadPoolExecutor(max_workers=1)
+
+    try:
+        detector = BotDetectorService(db)
+        while True:
+            batch = await loop.run_in_executor(receiver, batches.get)
+            if batch is None:
+                break
+
+            verdicts = await detector.analyze_batch(batch, options['publisher_id'], log_requests=options['load'])
+            counts['requests'] += len(batch)
+            counts['bots'] += sum(1 for verdict in verdicts if verdict.get('is_bot'))
+            counts['ai_crawlers'] += sum(1 for verdict in verdicts if verdict.get('is_ai_crawler'))
+            if options['output']:
+                results.put([output_row(d, r) for d, r in zip(batch, verdicts)])
+
+            if clock.advance(batch[-1]['timestamp']):
+                await leaderboard.sweep(now=clock.now)
+    finally:
+        if options['load']:
+            await buffer.stop()
+            counts['rows_written'] = buffer.rows_written
+            counts['rows_dropped'] = buffer.rows_dropped
+        db.close()
+        receiver.shutdown()
+        await RedisClientFactory.close_async_connection()
+
+    return counts
+
+def replay_shard(shard, batches, results, options):
+    """Worker process entry point: analyze batches for one shard until a None arrives"""
+    logs = contextlib.nullcontext() if options['logs'] else contextlib.redirect_stdout(open(os.devnull, "w"))
+    counts = {}
+    try:
+        with logs:
+            counts = asyncio.run(replay_shard_async(shard, batches, results, options))
+    finally:
+        # Always report, so the writer does not wait on a failed shard
+        results.put(("done", shard, dict(counts)))
+
+def write_results(path, results, workers, totals):
+    """Writer thread: JSON lines from every shard into one file, until all shards are done"""
+    opener = gzip.open if path and path.endswith(".gz") else open
+    with (opener(path, "wt") if path else contextlib.nullcontext()) as out:
+        remaining = workers
+        while remaining:
+            item = results.get()
+            if isinstance(item, tuple):
+                totals.update(item[2])
+                remaining -= 1
+                continue
+            for row in item:
+                out.write(json.dumps(row))
+                out.write("\n")
+
+def replay(args):
+    # Log-time history, reputation and leaderboards stay out of the live database
+    os.environ["DETECTION_REDIS_DB"] = str(args.state_db)
+    if args.scoring:
+        os.environ["DETECTION_SCORING_FILE"] = args.scoring
+    # Each shard is already a process, and daemonic workers can't start a process pool
+    os.environ["OFFLOAD_PROCESSES"] = "0"
+
+    options = {
+        'publisher_id': args.publisher_id,
+        'output': args.output,
+        'load': args.load,
+        'logs': args.logs,
+    }
+
+    # Spawned workers start from clean module state, with no inherited event loop or connections
+    context = multiprocessing.get_context("spawn")
+    shard_queues = [context.Queue(maxsize=args.queue_depth) for _ in range(args.workers)]
+    results = context.Queue()
+    workers = [
+        context.Process(target=replay_shard, args=(shard, shard_queues[shard], results, options), daemon=True)
+        for shard in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    totals = Counter()
+    writer = threading.Thread(target=write_results, args=(args.output, results, args.workers, totals))
+    writer.start()
+
+    reader = AccessLogReader(args.paths, args.format)
+    started = time.perf_counter()
+    first = last = None
+
+    def timestamps(descriptors):
+        nonlocal first, last
+        for descriptor in descriptors:
+            if first is None:
+                first = descriptor['timestamp']
+            last = descriptor['timestamp']
+            yield descriptor
+
+    def send(shard, batch):
+        while True:
+            try:
+                shard_queues[shard].put(batch, timeout=1.0)
+                return
+            except queue.Full:
+                if not workers[shard].is_alive():
+                    raise RuntimeError(f"Replay worker {shard} exited early")
+
+    try:
+        for shard, batch in batches_by_shard(timestamps(reader), args.workers, args.batch_size):
+            send(shard, batch)
+    finally:
+        for shard, worker in enumerate(workers):
+            if worker.is_alive():
+                send(shard, None)
+
+    writer.join()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    span = (last - first) if first is not None else 0.0
+    print(f"Lines read:        {reader.lines} ({reader.skipped} skipped)")
+    print(f"Requests replayed: {totals['requests']} across {args.workers} workers in {elapsed:.1f} s "
+          f"({totals['requests'] / elapsed if elapsed else 0.0:.0f} req/s)")
+    print(f"Log time covered:  {span / 3600:.1f} h ({span / elapsed if elapsed else 0.0:.0f}x real time)")
+    print(f"Bots:              {totals['bots']} ({totals['bots'] / max(1, totals['requests']):.1%}), "
+          f"{totals['ai_crawlers']} AI crawlers")
+    if args.load:
+        print(f"Request logs:      {totals['rows_written']} written, {totals['rows_dropped']} dropped")
+    if args.output:
+        print(f"Verdicts written:  {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay access logs through bot detection, in log time"
+    )
+    parser.add_argument("paths", nargs="+", help="Access log files, gzipped or plain; - for stdin")
+    parser.add_argument("--publisher-id", required=True, help="Publisher the traffic belongs to")
+    parser.add_argument("--format", choices=LOG_FORMATS, default="auto")
+    parser.add_argument("--output", help="Write one JSON verdict per request here (.gz to compress)")
+    parser.add_argument("--load", action="store_true", help="Bulk load verdicts into request_logs")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--batch-size", type=int, default=500, help="Requests per analyze_batch call")
+    parser.add_argument("--queue-depth", type=int, default=8, help="Batches buffered per worker")
+    parser.add_argument("--state-db", type=int, required=True,
+                        help="Redis database for detection state; must not be the live REDIS_DB")
+    parser.add_argument("--scoring", help="Scoring rules file to evaluate (default: DETECTION_SCORING_FILE)")
+    parser.add_argument("--logs", action="store_true", help="Keep the detection log output")
+    args = parser.parse_args()
+
+    if not args.output and not args.load:
+        parser.error("nothing to do: pass --output and/or --load")
+    if args.state_db == get_settings().REDIS_DB:
+        parser.error(f"--state-db {args.state_db} is the live REDIS_DB; pick an unused database")
+    replay(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import json
+from core.config import get_settings
+from core.redis_client import RedisClientFactory
+from api.detection.utils.pattern_registry import PatternRegistry
+
+async def update_bot_patterns(args):
+    """
+    Publish a new bot pattern version. Running workers pick it up
+    through pub/sub without a restart.
+    """
+    registry = PatternRegistry(
+        RedisClientFactory.get_async_client(),
+        reload_interval=get_settings().BOT_PATTERNS_RELOAD_INTERVAL
+    )
+
+    try:
+        await registry.load()
+
+        if args.command == "show":
+            snapshot = registry.snapshot
+            patterns = {pattern: dict(info) for pattern, info in snapshot.patterns.items()}
+            print(json.dumps({"version": snapshot.version, "patterns": patterns}, indent=2))
+            return
+
+        if args.command == "set":
+            snapshot = await registry.update({args.pattern: {
+                "company": args.company,
+                "type": args.type,
+                "confidence": args.confidence
+            }})
+        elif args.command == "remove":
+            snapshot = await registry.update(removals=args.patterns)
+        else:
+            with open(args.file) as f:
+                patterns = json.load(f)
+            snapshot = await registry.update(patterns.get("patterns", patterns), replace=True)
+
+        print(f"Published bot patterns version {snapshot.version} ({len(snapshot.patterns)} patterns)")
+
+    except Exception as e:
+        print(f"Error updating bot patterns: {str(e)}")
+        raise
+
+    finally:
+        await RedisClientFactory.close_async_connection()
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the bot patterns served to detection workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("show", help="Print the current pattern table")
+
+    set_parser = commands.add_parser("set", help="Add or change one pattern")
+    set_parser.add_argument("pattern")
+    set_parser.add_argument("--company", required=True)
+    set_parser.add_argument("--type", required=True)
+    set_parser.add_argument("--confidence", type=float, required=True)
+
+    remove_parser = commands.add_parser("remove", help="Remove patterns")
+    remove_parser.add_argument("patterns", nargs="+")
+
+    load_parser = commands.add_parser("load", help="Replace the pattern table from a JSON file")
+    load_parser.add_argument("file")
+
+    asyncio.run(update_bot_patterns(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
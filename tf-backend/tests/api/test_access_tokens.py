@@ -0,0 +1,90 @@
+import uuid
+from datetime import datetime
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from core.database import get_db
+from core.middleware import publisher_keys
+from core.models.access_tokens import AccessToken, APIUsageRecord
+from core.redis_client import RedisClientFactory
+from core.session import PUBLISHER_KEY_HEADER
+from api.access_tokens import router as token_router
+from .test_detection import _call_api
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb(type_, compiler, **kw):
+    return "JSON"
+
+def _token_db():
+    """Session on an in-memory SQLite database holding access tokens and their usage"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    AccessToken.__table__.create(engine)
+    APIUsageRecord.__table__.create(engine)
+    return sessionmaker(bind=engine)()
+
+async def test_usage_report_needs_the_publisher_key_and_a_whitelisted_token():
+    """Test edge usage is only billed to the key's publisher, for tokens on its whitelist"""
+    publisher_id, other_publisher = str(uuid.uuid4()), str(uuid.uuid4())
+    db = _token_db()
+    listed, unlisted = (AccessToken(token=f"token-{uuid.uuid4()}", company_id=uuid.uuid4(),
+                                    total_api_requests=0, total_ai_tokens_processed=0) for _ in range(2))
+    db.add_all([listed, unlisted])
+    db.commit()
+    
+    app = FastAPI()
+    app.include_router(token_router)
+    app.dependency_overrides[get_db] = lambda: db
+    client = RedisClientFactory.get_async_client()
+    whitelist = f"publisher:{publisher_id}:allowed_tokens"
+    
+    try:
+        await client.sadd(whitelist, listed.token)
+        key = await publisher_keys.create_key(publisher_id)
+        other_key = await publisher_keys.create_key(other_publisher)
+        report = {
+            "publisher_id": publisher_id,
+            "events": [
+                {"token": listed.token, "timestamp": 1700000000.0, "path": "/a", "ai_tokens_processed": 120},
+                {"token": unlisted.token, "timestamp": 1700000001.0, "path": "/b", "ai_tokens_processed": 5000},
+                {"token": "unknown", "timestamp": 1700000002.0, "path": "/c", "ai_tokens_processed": 5000}
+            ]
+        }
+        
+        path = "/api/access-tokens/usage/report"
+        status, _ = await _call_api(app, "POST", path, report)
+        assert status == 401
+        status, _ = await _call_api(app, "POST", path, report, headers=[(PUBLISHER_KEY_HEADER, "tfk_wrong")])
+        assert status == 401
+        status, _ = await _call_api(app, "POST", path, report, headers=[(PUBLISHER_KEY_HEADER, other_key)])
+        assert status == 403
+        whitelist_path = f"/api/access-tokens/publisher/{publisher_id}/whitelist"
+        status, _ = await _call_api(app, "GET", whitelist_path, headers=[(PUBLISHER_KEY_HEADER, other_key)])
+        assert status == 403
+        assert db.query(APIUsageRecord).count() == 0
+        
+        status, body = await _call_api(app, "POST", path, report, headers=[(PUBLISHER_KEY_HEADER, key)])
+        assert status == 200 and body["recorded"] == 1
+        record = db.query(APIUsageRecord).one()
+        assert (record.access_token_id, record.request_path, record.ai_tokens_processed) == (listed.id, "/a", 120)
+        assert record.timestamp.replace(tzinfo=None) == datetime(2023, 11, 14, 22, 13, 20)
+        db.refresh(unlisted)
+        assert unlisted.total_api_requests == 0
+        
+        status, body = await _call_api(app, "GET", whitelist_path, headers=[(PUBLISHER_KEY_HEADER, key)])
+        assert status == 200 and len(body["digests"]) == 1
+        
+        # A new key replaces the old one
+        await publisher_keys.create_key(publisher_id)
+        status, _ = await _call_api(app, "GET", whitelist_path, headers=[(PUBLISHER_KEY_HEADER, key)])
+        assert status == 401
+    finally:
+        for publisher in (publisher_id, other_publisher):
+            digest = await client.get(f"publisher:{publisher}:api_key")
+            await client.delete(f"publisher:{publisher}:api_key", f"api_key:{digest}")
+        await client.delete(whitelist)
+        db.close()
+        # Connections belong to this test's event loop
+        await client.connection_pool.disconnect()
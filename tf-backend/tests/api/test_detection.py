@@ -0,0 +1,1064 @@
+import pytest
+import asyncio
+import json
+import queue
+import random
+import struct
+import threading
+import redis
+import redis.asyncio
+import ua_parser.user_agent_parser
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from core.config import get_settings
+from core.middleware import publisher_keys, session_manager
+from core.session import PUBLISHER_KEY_HEADER
+from core.redis_client import RedisClientFactory
+from core.database import get_db
+from core.ingestion import get_request_log_buffer, get_request_log_sampler
+from core.models import access_tokens # Every model must be mapped before the first query
+from core.models.detection import RequestLog
+from core.unique_ips import get_unique_ip_counter
+from api.detection.redis_scripts import DETECTION_STATE_LUA, REPUTATION_UPDATE_LUA, parse_detection_state
+from core.cache import LRUCache
+from core.executors import OffloadExecutor
+from api.detection.utils import BotPatternIndex, KNOWN_BOT_PATTERNS, UserAgentAnalyzer, get_pattern_index
+from api.detection.utils import RequestTimingStats, timing_regularity, verdict_key
+from api.detection.utils import CIDRIndex, CrawlerRangeRegistry, CrawlerDNSVerifier, Resolver, StubResolver
+from api.detection.utils import header_order_fingerprint, classify_user_agent, get_allowlist, get_pattern_registry
+from api.detection.utils.pattern_registry import PatternRegistry
+from api.detection.utils.ip_ranges import PUBLISHED_RANGES, fetch_published_ranges
+from api.detection.classifier import RequestClassifier
+from api.detection.scoring import FEATURES, ScoringEngine, feature_matrix
+from api.detection.utils.allowlist import Allowlist, allowlist_key, build_snapshot, parse_entry
+from api.detection.routes import router as detection_router
+from api.detection.services import BotDetectorService
+from api.detection.leaderboard import PUBLISHERS_KEY, RiskLeaderboard, get_risk_leaderboard, leaderboard_keys
+from api.detection.utils.timing import RATE_WINDOW, TIMING_WINDOW
+from scripts.replay_access_logs import replay_shard_async
+
+def test_pattern_index_returns_all_matches_most_specific_first():
+    """Test that every contained pattern is reported with the longest first"""
+    index = get_pattern_index()
+
+    matches = index.match("Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)")
+    patterns = [match.pattern for match in matches]
+
+    assert patterns[0] == "googlebot"
+    assert "bot" in patterns
+    assert index.best_match("GPTBot/1.0").company == "OpenAI"
+
+def test_pattern_index_no_match():
+    """Test that browser user agents do not match"""
+    index = get_pattern_index()
+
+    ua = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+    assert index.match(ua) == ()
+    assert index.best_match(ua) is None
+
+def test_pattern_index_overlapping_patterns():
+    """Test overlapping patterns that share suffixes and prefixes"""
+    index = BotPatternIndex({
+        'he': {'company': 'A', 'type': 'T', 'confidence': 0.5},
+        'she': {'company': 'B', 'type': 'T', 'confidence': 0.5},
+        'hers': {'company': 'C', 'type': 'T', 'confidence': 0.9},
+        'his': {'company': 'D', 'type': 'T', 'confidence': 0.5},
+    })
+
+    patterns = [match.pattern for match in index.match("USHERS")]
+    assert patterns == ["hers", "she", "he"]
+
+def test_pattern_index_matches_linear_scan():
+    """Test the automaton agrees with a naive substring scan"""
+    index = get_pattern_index()
+    user_agents = [
+        "CCBot/2.0 (https://commoncrawl.org/faq/)",
+        "Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; ClaudeBot/1.0; +claude-web)",
+        "Mozilla/5.0 (Linux; Android 5.0) AppleWebKit/537.36 (KHTML, like Gecko) Mobile Safari/537.36 (compatible; Bytespider)",
+        "SomeCrawler spider-bot",
+        "",
+    ]
+
+    for ua in user_agents:
+        expected = {pattern for pattern in KNOWN_BOT_PATTERNS if pattern in ua.lower()}
+        assert {match.pattern for match in index.match(ua)} == expected
+
+async def test_pattern_registry_broadcasts_new_versions():
+    """Test a pattern update reaches other workers through pub/sub"""
+    settings = get_settings()
+    clients = [redis.asyncio.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    ) for _ in range(2)]
+    bundled = {"gptbot": {"company": "OpenAI", "type": "AI Training", "confidence": 0.95}}
+    writer, worker = (PatternRegistry(client, reload_interval=30, bundled=bundled) for client in clients)
+    
+    try:
+        await worker.start()
+        snapshot = worker.snapshot
+        assert snapshot.version == 0
+        
+        swapped = asyncio.Event()
+        worker.on_swap.append(lambda snapshot: swapped.set())
+        published = await writer.update({"NewCrawler": {"company": "Example", "type": "AI Training", "confidence": 0.9}})
+        await asyncio.wait_for(swapped.wait(), 5)
+        
+        assert published.version == worker.snapshot.version == 1
+        assert published.etag == worker.snapshot.etag != snapshot.etag
+        assert worker.index.best_match("Mozilla/5.0 NewCrawler/2.0").company == "Example"
+        assert worker.index.best_match("GPTBot/1.0").company == "OpenAI"
+        
+        # Earlier snapshots stay usable and unchanged
+        assert snapshot.index.best_match("NewCrawler/2.0") is None
+        with pytest.raises(TypeError):
+            worker.snapshot.patterns["gptbot"] = {}
+        
+        with pytest.raises(ValueError):
+            await writer.update({"badbot": {"company": "Bad", "type": "Scraper", "confidence": 2}})
+    finally:
+        await worker.stop()
+        for client in clients:
+            await client.aclose()
+
+def test_user_agent_analysis_is_cached():
+    """Test repeated user agents are served from the shared cache"""
+    analyzer = UserAgentAnalyzer(cache=LRUCache(10))
+    ua = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148 Safari/604.1"
+    
+    first = analyzer.analyze_user_agent(ua)
+    second = analyzer.analyze_user_agent(ua)
+    
+    assert first is second
+    assert first['is_mobile'] is True
+    assert analyzer.cache.stats()['hits'] == 1
+    assert analyzer.cache.stats()['misses'] == 1
+    
+    with pytest.raises(TypeError):
+        first['is_bot'] = True
+
+async def test_user_agent_prepare_parses_misses_off_the_loop():
+    """Test prepare fills the cache, sending only unsettled user agents to the executor"""
+    analyzer = UserAgentAnalyzer(cache=LRUCache(10))
+    executor = OffloadExecutor(threads=1, processes=0, process_threshold=1024)
+    chrome = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    samsung = "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36"
+    try:
+        await analyzer.prepare([chrome, samsung, chrome], executor)
+    finally:
+        executor.shutdown()
+    
+    assert executor.stats()["thread"]["completed"] == 1
+    assert analyzer.analyze_user_agent(samsung)['browser']['family'] == "Samsung Internet"
+    assert analyzer.analyze_user_agent(chrome)['browser']['family'] == "Chrome"
+    assert analyzer.cache.stats()['misses'] == 0
+
+@pytest.mark.parametrize("ua", [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.2478.51",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; GPTBot/1.2; +https://openai.com/gptbot)",
+    "python-requests/2.31.0",
+    "Python-urllib/3.11.4",
+    "curl/8.4.0",
+])
+def test_ua_fast_path_matches_full_parser(ua):
+    """Test user agents settled by the token trie parse as ua_parser would"""
+    fast = classify_user_agent(ua)
+    
+    assert fast is not None
+    assert fast == ua_parser.user_agent_parser.Parse(ua)
+
+@pytest.mark.parametrize("ua", [
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 OPR/109.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) HeadlessChrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.example.com/android.html)",
+    "Mozilla/5.0 (compatible; MSIE 9.0; Windows NT 6.1; Trident/5.0)",
+    "Safari/537.36bot",
+    # ua_parser reads these as Chrome and Other, not Chrome Mobile and Python Requests
+    "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Mobile Safari/537.36",
+    "python-requests/2",
+    "",
+])
+def test_ua_fast_path_defers_uncommon_shapes(ua):
+    """Test anything outside the known shapes is left to the full parser"""
+    assert classify_user_agent(ua) is None
+
+def test_verdict_key_depends_on_header_presence_order_and_hints():
+    """Test that header values outside the fingerprints do not split the cache, and order and hints do"""
+    ua = "GPTBot/1.0"
+    fingerprint = "00112233aabbccdd"
+    base = verdict_key("pub", "192.0.2.10", ua, {"accept-language": "en-US", "accept": "*/*"}, fingerprint, "n")
+    
+    assert verdict_key("pub", "192.0.2.10", ua, {"accept-language": "de-DE", "accept": "text/html"}, fingerprint, "n") == base
+    assert verdict_key("pub", "192.0.2.10", ua, {}, fingerprint, "n") != base
+    assert verdict_key("pub", "192.0.2.10", ua, {"accept-language": "en-US", "accept": "*/*"}, "ffeeddccbbaa9988", "n") != base
+    assert verdict_key("pub", "192.0.2.10", ua, {"accept-language": "en-US", "accept": "*/*"}, fingerprint, "m") != base
+    assert verdict_key("pub", "192.0.2.11", ua, {"accept-language": "en-US"}, fingerprint, "n") != base
+    assert verdict_key("other", "192.0.2.10", ua, {"accept-language": "en-US"}, fingerprint, "n") != base
+
+def test_cidr_index_longest_prefix():
+    """Test nested IPv4 and IPv6 ranges report every containing operator"""
+    index = CIDRIndex()
+    index.add("66.249.64.0/19", "Google")
+    index.add("66.249.66.0/27", "Google-Special")
+    index.add("2001:4860:4801::/48", "Google")
+    
+    assert index.lookup("66.249.66.1") == ("Google", "Google-Special")
+    assert index.lookup("66.249.70.1") == ("Google",)
+    assert index.lookup("66.249.96.1") == ()
+    assert index.lookup("2001:4860:4801:10::1") == ("Google",)
+    assert index.lookup("not-an-ip") == ()
+    assert len(index) == 3
+
+def test_crawler_ranges_load_and_hot_reload(tmp_path):
+    """Test JSON and CSV range files load and changes are picked up"""
+    (tmp_path / "google.json").write_text(json.dumps({
+        "operator": "Google",
+        "prefixes": [{"ipv4Prefix": "66.249.64.0/27"}, {"ipv6Prefix": "2001:4860:4801:10::/64"}]
+    }))
+    (tmp_path / "OpenAI.csv").write_text("# cidr,operator\n20.15.240.64/28\n")
+    
+    registry = CrawlerRangeRegistry(tmp_path, reload_interval=3600)
+    assert registry.verify("66.249.64.5", "Google") is True
+    assert registry.verify("203.0.113.9", "Google") is False
+    assert registry.verify("20.15.240.70", "OpenAI") is True
+    assert registry.verify("203.0.113.9", "Anthropic") is None
+    
+    # Lookups never touch the files; the next reload swaps changes in
+    (tmp_path / "OpenAI.csv").write_text("20.15.240.64/28\n203.0.113.0/24\n")
+    assert registry.verify("203.0.113.9", "OpenAI") is False
+    assert registry.reload() is True
+    assert registry.verify("203.0.113.9", "OpenAI") is True
+    assert registry.reload() is False
+    
+    # A broken file keeps the previous index
+    (tmp_path / "broken.json").write_text("{")
+    assert registry.reload(force=True) is False
+    assert registry.verify("203.0.113.9", "OpenAI") is True
+
+async def test_crawler_ranges_reload_in_background(tmp_path):
+    """Test the started registry picks up range file changes off the request path"""
+    (tmp_path / "openai.csv").write_text("20.15.240.64/28,OpenAI\n")
+    registry = CrawlerRangeRegistry(tmp_path, reload_interval=0.01)
+    await registry.start()
+    try:
+        (tmp_path / "openai.csv").write_text("20.15.240.64/28,OpenAI\n203.0.113.0/24,OpenAI\n")
+        for _ in range(200):
+            if registry.verify("203.0.113.9", "OpenAI"):
+                break
+            await asyncio.sleep(0.01)
+        assert registry.verify("203.0.113.9", "OpenAI") is True
+    finally:
+        await registry.stop()
+
+def test_concurrent_range_fetches_write_whole_files(tmp_path, monkeypatch):
+    """Test processes fetching into the same directory never leave partial or temporary files"""
+    class Response:
+        def raise_for_status(self):
+            pass
+        def json(self):
+            return {"prefixes": [{"ipv4Prefix": f"203.0.{i}.0/24"} for i in range(200)]}
+    monkeypatch.setattr("api.detection.utils.ip_ranges.requests.get", lambda url, timeout: Response())
+    
+    threads = [threading.Thread(target=fetch_published_ranges, args=(tmp_path,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"{operator.lower()}.json" for operator in PUBLISHED_RANGES
+    )
+    registry = CrawlerRangeRegistry(tmp_path)
+    assert registry.verify("203.0.199.1", "OpenAI") is True
+
+def test_classifier_verifies_claimed_crawler_ip(tmp_path):
+    """Test claimed crawlers are verified or flagged by source IP"""
+    (tmp_path / "openai.csv").write_text("20.15.240.64/28,OpenAI\n")
+    classifier = RequestClassifier(
+        UserAgentAnalyzer(cache=LRUCache(10)),
+        crawler_ranges=CrawlerRangeRegistry(tmp_path)
+    )
+    
+    def analyze(ip):
+        return classifier.analyze_client({"ip": ip, "user_agent": "GPTBot/1.0", "headers": {}})
+    
+    verified = analyze("20.15.240.65")
+    assert verified["crawler_verified"] is True
+    assert "verified_crawler_ip" in verified["detection_methods"]
+    
+    spoofed = analyze("198.51.100.1")
+    assert spoofed["crawler_verified"] is False
+    assert "crawler_ip_mismatch" in spoofed["detection_methods"]
+
+def _score(engine, *methods, pattern_confidence=None):
+    return engine.score({
+        "detection_methods": list(methods),
+        "pattern_confidence": pattern_confidence,
+        "is_bot": False,
+        "confidence_score": 0.0
+    })
+
+def test_scoring_engine_default_rules():
+    """Test the default weights keep the two-signal, 0.8 confidence rule"""
+    engine = ScoringEngine()
+    
+    # One signal alone is discarded
+    single = _score(engine, "known_pattern", pattern_confidence=0.95)
+    assert single["is_bot"] is False
+    assert single["confidence_score"] == 0.0
+    assert single["detection_methods"] == []
+    
+    crawler = _score(engine, "known_pattern", "ai_crawler", pattern_confidence=0.95)
+    assert crawler["is_bot"] is True
+    assert crawler["confidence_score"] == pytest.approx(0.95)
+    
+    weak = _score(engine, "browser_fingerprint", "ip_reputation")
+    assert weak["is_bot"] is False
+    
+    # Signals that are not bot indicators are kept but never make a bot
+    mismatch = _score(engine, "mobile_mismatch", "crawler_ip_mismatch")
+    assert mismatch["is_bot"] is False
+    assert mismatch["confidence_score"] == pytest.approx(0.9)
+    assert mismatch["detection_methods"] == ["mobile_mismatch", "crawler_ip_mismatch"]
+
+def test_scoring_engine_custom_config(tmp_path):
+    """Test weights and thresholds load from a config file"""
+    config = tmp_path / "scoring.json"
+    config.write_text(json.dumps({"weights": {"ip_reputation": 0.85}, "min_methods": 1}))
+    engine = ScoringEngine.from_file(config)
+    
+    assert _score(engine, "ip_reputation")["is_bot"] is True
+    assert _score(engine, "browser_fingerprint")["is_bot"] is False
+    
+    with pytest.raises(ValueError):
+        ScoringEngine(weights={"unknown": 1.0})
+
+def test_scoring_engine_batch_matches_single():
+    """Test scoring a batch at once matches scoring one request at a time"""
+    engine = ScoringEngine()
+    rng = random.Random(13)
+    rows = [
+        ([name for name in FEATURES if rng.random() < 0.25], rng.choice([None, 0.7, 0.95]))
+        for _ in range(2000)
+    ]
+    
+    is_bot, confidence, _ = engine.score_matrix(feature_matrix(rows))
+    for i, (methods, pattern_confidence) in enumerate(rows):
+        single = _score(engine, *methods, pattern_confidence=pattern_confidence)
+        assert single["is_bot"] == is_bot[i]
+        assert single["confidence_score"] == pytest.approx(confidence[i])
+
+def _google_resolver():
+    return StubResolver(
+        ptr={
+            "66.249.66.1": ["crawl-66-249-66-1.googlebot.com."],
+            "203.0.113.5": ["crawl-203-0-113-5.googlebot.com.evil.example."],
+            "203.0.113.6": ["crawl-66-249-66-1.googlebot.com."],
+        },
+        addresses={"crawl-66-249-66-1.googlebot.com": ["66.249.66.1"]}
+    )
+
+async def test_dns_verifier_reverse_then_forward():
+    """Test hostnames must match the operator suffix and resolve back to the IP"""
+    verifier = CrawlerDNSVerifier(_google_resolver(), positive_ttl=60, negative_ttl=60)
+    
+    assert await verifier.verify("66.249.66.1", "Google") is True
+    assert await verifier.verify("203.0.113.5", "Google") is False # wrong suffix
+    assert await verifier.verify("203.0.113.6", "Google") is False # forward mismatch
+    assert await verifier.verify("198.51.100.1", "Google") is False # no PTR
+    assert await verifier.verify("66.249.66.1", "OpenAI") is None # no DNS verification
+    
+    assert verifier.cached("66.249.66.1", "Google") is True
+    assert verifier.cached("203.0.113.5", "Google") is False
+
+async def test_dns_verifier_deduplicates_and_reports_in_background():
+    """Test concurrent checks share one lookup and the callback sees the result"""
+    resolver = _google_resolver()
+    verifier = CrawlerDNSVerifier(resolver, positive_ttl=60, negative_ttl=60)
+    results = []
+    
+    async def on_result(ip, operator, verified):
+        results.append((ip, operator, verified))
+    
+    verifier.schedule("66.249.66.1", "Google", on_result)
+    verifier.schedule("66.249.66.1", "Google", on_result)
+    answers = await asyncio.gather(*[verifier.verify("66.249.66.1", "Google") for _ in range(10)])
+    
+    assert answers == [True] * 10
+    assert resolver.lookups == 1
+    assert results == [("66.249.66.1", "Google", True)]
+    assert verifier.stats()["inflight"] == 0
+
+async def test_dns_verifier_does_not_cache_failures():
+    """Test resolver errors and timeouts give no answer and are retried later"""
+    class SlowResolver(Resolver):
+        async def reverse(self, ip):
+            await asyncio.sleep(1)
+            return []
+    
+    verifier = CrawlerDNSVerifier(SlowResolver(), positive_ttl=60, negative_ttl=60, timeout=0.01)
+    
+    assert await verifier.verify("66.249.66.1", "Google") is None
+    assert verifier.cached("66.249.66.1", "Google") is None
+
+def _redis_client():
+    settings = get_settings()
+    return redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+
+def test_request_timing_stats_jittered_crawler():
+    """Test that a crawler with small timing jitter still reads as regular"""
+    rng = random.Random(42)
+    stats = RequestTimingStats()
+    for i in range(50):
+        stats.update(1000.0 + i * 2.0 + rng.uniform(-0.1, 0.1))
+    
+    features = stats.features()
+    assert features["count"] == 50
+    assert features["interval_mean"] == pytest.approx(2.0, abs=0.05)
+    assert features["interval_cv"] < 0.1
+    assert features["requests_per_second"] == pytest.approx(0.5, rel=0.05)
+    assert timing_regularity(features["interval_cv"]) > 0.9
+
+def test_request_timing_stats_human_browsing():
+    """Test that irregular browsing is not regular and short histories report nothing"""
+    rng = random.Random(7)
+    stats = RequestTimingStats()
+    ts = 1000.0
+    for _ in range(9):
+        ts += rng.expovariate(1 / 20.0)
+        stats.update(ts)
+    assert stats.features()["interval_cv"] is None
+    
+    for _ in range(40):
+        ts += rng.expovariate(1 / 20.0)
+        stats.update(ts)
+    assert stats.features()["interval_cv"] > 0.5
+
+def test_detection_state_script():
+    """Test the detection state script against a live Redis"""
+    r = _redis_client()
+    script = r.register_script(DETECTION_STATE_LUA)
+    history_key = "requests:test_publisher:192.0.2.1"
+    reputation_key = "ip_reputation:192.0.2.1"
+    rng = random.Random(1)
+    timestamps = [1000.0 + i * 0.5 + rng.uniform(-0.02, 0.02) for i in range(30)]
+    
+    try:
+        r.delete(history_key, reputation_key)
+        r.set(reputation_key, json.dumps({"score": 0.3}))
+        
+        stats = RequestTimingStats(RATE_WINDOW, TIMING_WINDOW)
+        for ts in timestamps:
+            stats.update(ts)
+            reply = script(
+                keys=[history_key, reputation_key],
+                args=[ts, RATE_WINDOW, TIMING_WINDOW, 3600]
+            )
+        
+        features, reputation = parse_detection_state(reply)
+        expected = stats.features()
+        
+        # Redis and the Python estimator agree
+        assert features["count"] == expected["count"] == 30
+        for name in ("requests_per_second", "interval_mean", "interval_cv"):
+            assert features[name] == pytest.approx(expected[name])
+        assert features["interval_cv"] < 0.1
+        assert json.loads(reputation)["score"] == 0.3
+        
+        # Fixed-size hash regardless of request count
+        assert r.type(history_key) == "hash"
+        assert r.hlen(history_key) == 6
+        assert r.ttl(history_key) > 0
+    finally:
+        r.delete(history_key, reputation_key)
+        r.close()
+
+CHROME_UA = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+def test_header_order_fingerprint():
+    """Test fingerprints follow header order, casing and client hint consistency"""
+    client_info = UserAgentAnalyzer(cache=LRUCache(10)).analyze_user_agent(CHROME_UA)
+    headers = {
+        "host": "example.com",
+        "sec-ch-ua": '"Chromium";v="120"',
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": '"Windows"',
+        "user-agent": CHROME_UA,
+        "accept": "text/html"
+    }
+    names = list(headers)
+    
+    fingerprint, hints = header_order_fingerprint(names, headers, client_info)
+    assert len(fingerprint) == 16
+    assert hints == "c"
+    assert header_order_fingerprint(names, dict(headers), client_info)[0] == fingerprint
+    
+    # Header order and name casing
+    assert header_order_fingerprint(names[::-1], headers, client_info)[0] != fingerprint
+    title_case = [name.title() for name in names]
+    assert header_order_fingerprint(title_case, headers, client_info)[0] != fingerprint
+    
+    # Client hints that disagree with the user agent
+    spoofed = dict(headers, **{"sec-ch-ua-mobile": "?1", "sec-ch-ua-platform": '"Linux"'})
+    spoofed_fingerprint, hints = header_order_fingerprint(names, spoofed, client_info)
+    assert hints == "mp"
+    assert spoofed_fingerprint != fingerprint
+
+def test_classifier_flags_distributed_fingerprint(tmp_path):
+    """Test a widely shared fingerprint only counts for non-browser-like requests"""
+    classifier = RequestClassifier(
+        UserAgentAnalyzer(cache=LRUCache(10)),
+        crawler_ranges=CrawlerRangeRegistry(tmp_path)
+    )
+    features = {"fingerprint_ips": 500, "fingerprint_publishers": 12}
+    
+    scraper = classifier.analyze_client({"ip": "198.51.100.7", "user_agent": CHROME_UA, "headers": {}})
+    classifier.evaluate_request_patterns(features, scraper)
+    assert "distributed_fingerprint" in scraper["detection_methods"]
+    assert classifier.finalize(scraper)["is_bot"] is True
+    
+    browser_headers = {header: "x" for header in classifier.BROWSER_HEADERS}
+    browser = classifier.analyze_client({"ip": "198.51.100.8", "user_agent": CHROME_UA, "headers": browser_headers})
+    classifier.evaluate_request_patterns(features, browser)
+    assert "distributed_fingerprint" not in browser["detection_methods"]
+
+def test_detection_state_script_counts_fingerprint_sketches():
+    """Test fingerprint sketches count distinct IPs and publishers"""
+    r = _redis_client()
+    script = r.register_script(DETECTION_STATE_LUA)
+    sketch_keys = ["fingerprint_ips:test", "fingerprint_publishers:test"]
+    ips = [f"198.51.{i // 256}.{i % 256}" for i in range(1000)]
+    
+    try:
+        r.delete(*sketch_keys)
+        for i, ip in enumerate(ips * 2):
+            keys = [f"requests:test_publisher:{ip}", f"ip_reputation:{ip}"] + sketch_keys
+            reply = script(keys=keys, args=[1000.0 + i, RATE_WINDOW, TIMING_WINDOW, 60, ip, f"pub{i % 3}", 600])
+        
+        features, _ = parse_detection_state(reply)
+        assert features["fingerprint_ips"] == pytest.approx(1000, rel=0.02)
+        assert features["fingerprint_publishers"] == 3
+        assert 0 < r.ttl(sketch_keys[0]) <= 600
+        
+        # Without sketch keys the script only tracks timing
+        features, _ = parse_detection_state(script(
+            keys=[f"requests:test_publisher:{ips[0]}", f"ip_reputation:{ips[0]}"],
+            args=[5000.0, RATE_WINDOW, TIMING_WINDOW, 60]
+        ))
+        assert "fingerprint_ips" not in features
+    finally:
+        r.delete(*sketch_keys)
+        for ip in ips:
+            r.delete(f"requests:test_publisher:{ip}")
+        r.close()
+
+@pytest.mark.parametrize("legacy", ["list", "packed"])
+def test_detection_state_script_migrates_legacy_history(legacy):
+    """Test that JSON list and packed timestamp histories are converted in place"""
+    r = _redis_client()
+    script = r.register_script(DETECTION_STATE_LUA)
+    history_key = "requests:test_publisher:192.0.2.2"
+    reputation_key = "ip_reputation:192.0.2.2"
+    timestamps = [2000.0 + i * 0.5 for i in range(10)]
+    
+    try:
+        r.delete(history_key, reputation_key)
+        if legacy == "list":
+            for ts in timestamps:
+                r.lpush(history_key, json.dumps({"timestamp": ts, "path": "/", "method": "GET"}))
+        else:
+            r.set(history_key, struct.pack(f"<{len(timestamps)}d", *timestamps))
+        r.expire(history_key, 3600)
+        
+        features, reputation = parse_detection_state(script(
+            keys=[history_key, reputation_key],
+            args=[2005.0, RATE_WINDOW, TIMING_WINDOW, 3600]
+        ))
+        
+        assert features["count"] == 11
+        assert features["interval_mean"] == pytest.approx(0.5)
+        assert features["interval_cv"] == pytest.approx(0.0, abs=1e-9)
+        assert reputation is None
+        assert r.type(history_key) == "hash"
+    finally:
+        r.delete(history_key, reputation_key)
+        r.close()
+
+def test_reputation_update_keeps_crawler_verification():
+    """Test a plain reputation write does not erase a finished verification"""
+    r = _redis_client()
+    script = r.register_script(REPUTATION_UPDATE_LUA)
+    reputation_key = "ip_reputation:192.0.2.3"
+    
+    try:
+        r.set(reputation_key, json.dumps({"score": 1.0, "crawler_verified": True, "verified_operator": "Google"}))
+        previous = script(keys=[reputation_key], args=[json.dumps({"score": 0.3, "detection_methods": []}), 60])
+        
+        assert json.loads(previous)["crawler_verified"] is True
+        stored = json.loads(r.get(reputation_key))
+        assert stored["crawler_verified"] is True
+        assert stored["verified_operator"] == "Google"
+        assert stored["score"] == 1.0
+        
+        # An explicit new result replaces the old one
+        script(keys=[reputation_key], args=[json.dumps({"score": 0.1, "crawler_verified": False, "verified_operator": "Google"}), 60])
+        assert json.loads(r.get(reputation_key))["crawler_verified"] is False
+    finally:
+        r.delete(reputation_key)
+        r.close()
+
+async def test_risk_leaderboard_decays_ranks_and_sweeps():
+    """Test scores decay by half-life, top-K is ranked and stale IPs are swept"""
+    settings = get_settings()
+    client = redis.asyncio.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+    board = RiskLeaderboard(client, half_life=100, max_size=3, min_score=0.1)
+    keys = leaderboard_keys("test_publisher")
+    
+    def bot(confidence):
+        return {"is_bot": True, "confidence_score": confidence, "bot_name": "GPTBot", "bot_type": "AI Training"}
+    
+    try:
+        await client.delete(keys[0], keys[1])
+        
+        # Two hits a half-life apart: 0.9 decayed once plus 0.9
+        await board.record(client, "test_publisher", "192.0.2.10", bot(0.9), 1000.0)
+        await board.record(client, "test_publisher", "192.0.2.10", bot(0.9), 1100.0)
+        await board.record(client, "test_publisher", "192.0.2.11", bot(1.0), 1100.0)
+        await board.record(client, "test_publisher", "192.0.2.12", bot(0.5), 1050.0)
+        assert await board.record(client, "test_publisher", "192.0.2.13", {"is_bot": False}, 1100.0) is None
+        
+        top = await board.top("test_publisher", limit=10, now=1100.0)
+        assert [entry["ip"] for entry in top] == ["192.0.2.10", "192.0.2.11", "192.0.2.12"]
+        assert top[0]["risk_score"] == pytest.approx(1.35, abs=1e-3)
+        assert top[0]["detections"] == 2
+        
+        # A newer hit decays later, so it ranks above an older equal one
+        top = await board.top("test_publisher", limit=1, min_confidence=0.8, now=1300.0)
+        assert [entry["ip"] for entry in top] == ["192.0.2.10"]
+        assert top[0]["risk_score"] == pytest.approx(1.35 / 4, abs=1e-3)
+        
+        # The lowest score gives way once the board is full
+        await board.record(client, "test_publisher", "192.0.2.14", bot(0.95), 1200.0)
+        assert await client.zcard(keys[0]) == 3
+        assert await client.hexists(keys[1], "192.0.2.12") is False
+        
+        # Scores fall below 0.1 after three to four half-lives
+        assert await board.sweep(now=1400.0) == 0
+        assert await board.sweep(now=1500.0) == 2
+        assert await client.zrange(keys[0], 0, -1) == ["192.0.2.14"]
+        assert await board.sweep(now=1550.0) == 1
+        assert await client.exists(keys[0], keys[1]) == 0
+        assert await client.sismember(PUBLISHERS_KEY, "test_publisher") == 0
+    finally:
+        await client.delete(keys[0], keys[1])
+        await client.srem(PUBLISHERS_KEY, "test_publisher")
+        await client.aclose()
+
+async def test_allowlist_matches_ips_ranges_and_fingerprints():
+    """Test allowlist entries match once a change is applied and stop matching once removed"""
+    settings = get_settings()
+    clients = [redis.asyncio.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    ) for _ in range(2)]
+    client = clients[0]
+    allowlist, worker = (Allowlist(client, reload_interval=30) for client in clients)
+    
+    try:
+        await client.delete(allowlist_key("test_publisher"))
+        assert parse_entry("10.1.2.3/16") == "cidr:10.1.0.0/16"
+        assert parse_entry("2001:db8::1/48") == "cidr:2001:db8::/48"
+        for value in ("not-an-ip", "0.0.0.0/0", "10.0.0.0/8", "::/0", "2001:db8::/32"):
+            with pytest.raises(ValueError):
+                parse_entry(value)
+        await worker.start()
+        
+        # Updating only announces the change
+        version = await allowlist.update("test_publisher", add=["192.0.2.20", "2001:db8::20", "198.51.100.0/24", "00112233aabbccdd"])
+        assert not allowlist.covers("test_publisher")
+        assert await allowlist.apply(version, "test_publisher")
+        assert allowlist.snapshot.version == version
+        assert allowlist.covers("test_publisher")
+        assert not allowlist.covers("other_publisher")
+        assert allowlist.checks_fingerprints("test_publisher")
+        
+        assert await allowlist.match("test_publisher", "192.0.2.20") == "ip:192.0.2.20"
+        assert await allowlist.match("test_publisher", "198.51.100.77") == "cidr"
+        assert await allowlist.match("test_publisher", "192.0.2.21", "00112233aabbccdd") == "fp:00112233aabbccdd"
+        assert await allowlist.match("test_publisher", "192.0.2.21", "ffffffffffffffff") is None
+        assert await allowlist.match("other_publisher", "192.0.2.20") is None
+        
+        # Client addresses match however the IPv6 form is written
+        for written in ("2001:db8::20", "2001:DB8::20", "2001:0db8:0000:0000:0000:0000:0000:0020"):
+            assert await allowlist.match("test_publisher", written) == "ip:2001:db8::20"
+        assert await allowlist.match("test_publisher", "not an address") is None
+        
+        # Confirmed matches are remembered until the next change, which
+        # rebuilds only that publisher
+        assert allowlist.confirmed.get("test_publisher\x00ip:192.0.2.20") is True
+        version = await allowlist.update("test_publisher", remove=["192.0.2.20"])
+        assert await allowlist.match("test_publisher", "192.0.2.20") == "ip:192.0.2.20"
+        assert await allowlist.apply(version, "test_publisher")
+        assert not await allowlist.apply(version, "test_publisher")
+        assert await allowlist.match("test_publisher", "192.0.2.20") is None
+        assert await allowlist.match("test_publisher", "198.51.100.77") == "cidr"
+        
+        # Other workers follow the announcements
+        for _ in range(50):
+            if worker.snapshot.version == version:
+                break
+            await asyncio.sleep(0.1)
+        assert worker.snapshot.version == version
+        assert await worker.match("test_publisher", "198.51.100.77") == "cidr"
+        assert await worker.match("test_publisher", "192.0.2.20") is None
+    finally:
+        await worker.stop()
+        await client.delete(allowlist_key("test_publisher"))
+        await client.srem("allowlist:publishers", "test_publisher")
+        for client in clients:
+            await client.aclose()
+
+async def test_allowlist_fingerprint_check_parses_user_agent_off_the_loop(monkeypatch):
+    """Test fingerprinting a request for the allowlist leaves user agent parsing to the executor"""
+    service = BotDetectorService(None)
+    service.ua_analyzer.cache = LRUCache(10)
+    service.allowlist = Allowlist(RedisClientFactory.get_async_client())
+    service.allowlist.snapshot = build_snapshot(1, {"test_publisher": ["fp:00112233aabbccdd"]})
+    
+    parse = ua_parser.user_agent_parser.Parse
+    threads = []
+    def recording_parse(user_agent_string):
+        threads.append(threading.current_thread())
+        return parse(user_agent_string)
+    monkeypatch.setattr(ua_parser.user_agent_parser, "Parse", recording_parse)
+    
+    samsung = "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36"
+    descriptor = service._normalize_descriptor({'ip': "192.0.2.30", 'headers': {'User-Agent': samsung, 'Accept': "*/*"}})
+    assert await service._match_allowlist(descriptor, "test_publisher") is None
+    
+    assert threads and threading.main_thread() not in threads
+    assert service.ua_analyzer.cache.stats()['size'] == 1
+
+async def _call_api(app, method, path, body=None, query="", cookies=None, ip="192.0.2.1", headers=()):
+    """Send one request through the ASGI app and return (status, decoded JSON body)"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(name.encode(), value.encode()) for name, value in headers]
+    headers += [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    if cookies:
+        headers.append((b"cookie", "; ".join(f"{name}={value}" for name, value in cookies.items()).encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": headers,
+        "client": (ip, 4321),
+        "server": ("127.0.0.1", 8000),
+    }
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+    response = {}
+    chunks = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], json.loads(b"".join(chunks) or b"null")
+
+def _detection_app(db=None):
+    app = FastAPI()
+    app.include_router(detection_router)
+    if db is not None:
+        app.dependency_overrides[get_db] = lambda: db
+    return app
+
+def _request_log_db():
+    """Session on an in-memory SQLite database holding only request_logs"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    RequestLog.__table__.create(engine)
+    return sessionmaker(bind=engine)()
+
+def _logged(db):
+    return [
+        (row.ip_address, row.user_agent, row.is_bot, row.bot_name, row.confidence_score, json.loads(row.detection_methods))
+        for row in db.query(RequestLog).order_by(RequestLog.id)
+    ]
+
+async def _clear_detection_state(client, publisher_id, ips):
+    keys = [f"requests:{publisher_id}:{ip}" for ip in ips] + [f"ip_reputation:{ip}" for ip in ips]
+    keys += leaderboard_keys(publisher_id) + [allowlist_key(publisher_id)]
+    for pattern in ("fingerprint_ips:*", "fingerprint_publishers:*", f"unique_ips:{publisher_id}:*"):
+        keys += [key async for key in client.scan_iter(pattern)]
+    await client.delete(*keys)
+
+async def test_allowlist_routes_require_the_publishers_session():
+    """Test reading and changing an allowlist need the publisher's own session, and broad ranges are refused"""
+    app = _detection_app()
+    session_id = await session_manager.create_session(
+        {"id": "test_publisher", "email": "publisher@example.com", "user_type": "publisher"}
+    )
+    cookies = {"session_id": session_id}
+    
+    try:
+        status, _ = await _call_api(app, "GET", "/api/detection/allowlist/test_publisher")
+        assert status == 401
+        status, _ = await _call_api(app, "GET", "/api/detection/allowlist/other_publisher", cookies=cookies)
+        assert status == 403
+        
+        status, _ = await _call_api(app, "POST", "/api/detection/allowlist/test_publisher", {"add": ["192.0.2.0/24"]})
+        assert status == 401
+        status, _ = await _call_api(app, "POST", "/api/detection/allowlist/other_publisher",
+                                    {"add": ["192.0.2.0/24"]}, cookies=cookies)
+        assert status == 403
+        status, _ = await _call_api(app, "POST", "/api/detection/allowlist/test_publisher",
+                                    {"add": ["0.0.0.0/0"]}, cookies=cookies)
+        assert status == 400
+        
+        report = "/api/detection/report-false-positive"
+        status, _ = await _call_api(app, "POST", report, query="ip_address=192.0.2.1&publisher_id=test_publisher")
+        assert status == 401
+        status, _ = await _call_api(app, "POST", report, query="ip_address=192.0.2.1", cookies=cookies)
+        assert status == 422
+        status, _ = await _call_api(app, "POST", report, query="ip_address=192.0.2.1&publisher_id=other_publisher",
+                                    cookies=cookies)
+        assert status == 403
+        status, _ = await _call_api(app, "POST", report, query="ip_address=::/0&publisher_id=test_publisher",
+                                    cookies=cookies)
+        assert status == 400
+    finally:
+        await session_manager.end_session(session_id)
+        # Connections belong to this test's event loop
+        await RedisClientFactory.get_async_client().connection_pool.disconnect()
+
+async def test_replay_keeps_detection_state_out_of_the_live_database(monkeypatch, redis_test_dbs):
+    """Test a replay reads patterns and allowlists from the live DB and writes state only to its own"""
+    settings = get_settings()
+    state_db = redis_test_dbs[1]
+    live, state = (redis.asyncio.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=db
+    ) for db in (settings.REDIS_DB, state_db))
+    
+    async def dump(client):
+        return {key: await client.dump(key) for key in await client.keys("*")}
+    
+    monkeypatch.setattr(settings, "DETECTION_REDIS_DB", state_db)
+    singletons = (get_pattern_registry, get_allowlist, get_risk_leaderboard, get_unique_ip_counter, get_request_log_buffer)
+    for getter in singletons:
+        getter.cache_clear()
+    
+    try:
+        await PatternRegistry(live, bundled={}).update(
+            {"ReplayBot": {"company": "Example", "type": "AI Training", "confidence": 0.9}}
+        )
+        await Allowlist(live).update("replay_publisher", add=["198.51.100.0/24"])
+        before = await dump(live)
+        
+        batches, results = queue.Queue(), queue.Queue()
+        batches.put([
+            {"ip": ip, "user_agent": user_agent, "headers": {"user-agent": user_agent},
+             "path": "/", "method": "GET", "timestamp": 1700000000.0 + i}
+            for i, (ip, user_agent) in enumerate([
+                ("198.51.100.7", "ReplayBot/1.0"),
+                ("203.0.113.7", "ReplayBot/1.0"),
+                ("203.0.113.7", "ReplayBot/1.0"),
+            ])
+        ])
+        batches.put(None)
+        counts = await replay_shard_async(0, batches, results, {
+            "publisher_id": "replay_publisher", "output": "-", "load": False, "logs": True
+        })
+        
+        rows = results.get_nowait()
+        assert counts["requests"] == 3
+        assert rows[0]["is_bot"] is False
+        assert rows[1]["is_bot"] is True and rows[1]["bot_name"] == "Example"
+        
+        assert await dump(live) == before
+        assert await state.exists("requests:replay_publisher:203.0.113.7", "ip_reputation:203.0.113.7") == 2
+    finally:
+        for getter in singletons:
+            getter.cache_clear()
+        await live.aclose()
+        await state.aclose()
+
+BROWSER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+SCRAPER_UA = "python-requests/2.31.0"
+CRAWLER_UA = "CCBot/2.0 (https://commoncrawl.org/faq/)"
+
+async def test_batch_verdicts_match_sequential_requests(monkeypatch):
+    """Test POST /batch gives the verdicts and log rows of the same requests sent one by one"""
+    sequence = ([("198.51.100.10", SCRAPER_UA)] * 10 + [("198.51.100.20", BROWSER_UA)] * 3
+                + [("198.51.100.30", CRAWLER_UA)] * 4)
+    random.Random(3).shuffle(sequence)
+    ips = {ip for ip, _ in sequence}
+    client = RedisClientFactory.get_detection_client()
+    
+    # Every request is analyzed and logged
+    monkeypatch.setattr("api.detection.services.get_verdict_cache", lambda: None)
+    monkeypatch.setattr(get_request_log_sampler(), "rate_for", lambda publisher_id: 1)
+    
+    # Keep the descriptors analyze_request built, to replay them as a batch
+    descriptors = []
+    describe = BotDetectorService._describe_request
+    def record(self, request):
+        descriptor = describe(self, request)
+        descriptors.append(descriptor)
+        return descriptor
+    monkeypatch.setattr(BotDetectorService, "_describe_request", record)
+    
+    sequential_db, batch_db = _request_log_db(), _request_log_db()
+    try:
+        await _clear_detection_state(client, "batch_publisher", ips)
+        sequential = []
+        app = _detection_app(sequential_db)
+        for ip, user_agent in sequence:
+            status, body = await _call_api(app, "POST", "/api/detection", {"publisher_id": "batch_publisher"},
+                                           ip=ip, headers=[("user-agent", user_agent)])
+            assert status == 200
+            sequential.append(body["results"])
+        
+        await _clear_detection_state(client, "batch_publisher", ips)
+        status, body = await _call_api(_detection_app(batch_db), "POST", "/api/detection/batch", {
+            "publisher_id": "batch_publisher",
+            "requests": [
+                {field: descriptor[field] for field in ("ip", "user_agent", "headers", "path", "method", "timestamp")}
+                for descriptor in descriptors
+            ]
+        })
+        assert status == 200
+        assert body["results"] == sequential
+        
+        # Both the scraper and the crawler were caught, and reputation carried between requests
+        assert {result["is_bot"] for result in sequential} == {True, False}
+        assert any("ip_reputation" in result["detection_methods"] for result in sequential)
+        
+        # One request_logs row per request, in order, from one bulk insert
+        logged = _logged(batch_db)
+        assert logged == _logged(sequential_db)
+        assert [(ip, user_agent) for ip, user_agent, *_ in logged] == sequence
+        assert [(is_bot, bot_name, confidence, methods) for *_, is_bot, bot_name, confidence, methods in logged] == [
+            (result["is_bot"], result["bot_name"], result["confidence_score"], result["detection_methods"])
+            for result in sequential
+        ]
+    finally:
+        await _clear_detection_state(client, "batch_publisher", ips)
+        sequential_db.close()
+        batch_db.close()
+        await client.connection_pool.disconnect()
+
+async def test_reported_detections_and_false_positive_report(monkeypatch):
+    """Test /report logs edge detections and a false positive report clears and allowlists the range"""
+    monkeypatch.setattr(get_request_log_sampler(), "rate_for", lambda publisher_id: 1)
+    client = RedisClientFactory.get_detection_client()
+    ips = ("198.51.100.40", "198.51.100.41")
+    db = _request_log_db()
+    app = _detection_app(db)
+    session_id = await session_manager.create_session(
+        {"id": "report_publisher", "email": "publisher@example.com", "user_type": "publisher"}
+    )
+    
+    key = await publisher_keys.create_key("report_publisher")
+    other_key = await publisher_keys.create_key("other_publisher")
+    
+    try:
+        await _clear_detection_state(client, "report_publisher", ips)
+        report = {
+            "publisher_id": "report_publisher",
+            "detections": [
+                {"ip": ips[0], "user_agent": CRAWLER_UA, "path": "/a", "timestamp": 1700000000.0, "is_bot": True,
+                 "is_ai_crawler": True, "bot_name": "Common Crawl", "bot_type": "AI Training",
+                 "confidence_score": 0.95, "detection_methods": ["known_pattern", "ai_crawler"]},
+                {"ip": ips[1], "user_agent": BROWSER_UA, "path": "/b", "timestamp": 1700000001.0, "is_bot": False}
+            ]
+        }
+        
+        # Only the publisher's own edge key may report for it
+        status, _ = await _call_api(app, "POST", "/api/detection/report", report)
+        assert status == 401
+        status, _ = await _call_api(app, "POST", "/api/detection/report", report,
+                                    headers=[(PUBLISHER_KEY_HEADER, other_key)])
+        assert status == 403
+        assert _logged(db) == []
+        
+        status, body = await _call_api(app, "POST", "/api/detection/report", report,
+                                       headers=[(PUBLISHER_KEY_HEADER, key)])
+        assert status == 200 and body["recorded"] == 2
+        assert _logged(db) == [
+            (ips[0], CRAWLER_UA, True, "Common Crawl", 0.95, ["known_pattern", "ai_crawler"]),
+            (ips[1], BROWSER_UA, False, None, 0.0, [])
+        ]
+        leaderboard = get_risk_leaderboard()
+        assert [entry["ip"] for entry in await leaderboard.top("report_publisher", now=1700000001.0)] == [ips[0]]
+        
+        await client.set(f"ip_reputation:{ips[0]}", json.dumps({"score": 0.3}))
+        status, body = await _call_api(
+            app, "POST", "/api/detection/report-false-positive",
+            query="ip_address=198.51.100.0/24&publisher_id=report_publisher",
+            cookies={"session_id": session_id}
+        )
+        assert status == 200
+        assert (body["reputations_reset"], body["leaderboard_cleared"]) == (1, 1)
+        assert not await client.exists(f"ip_reputation:{ips[0]}")
+        assert await leaderboard.top("report_publisher", now=1700000001.0) == []
+        
+        # The range is now allowlisted: analyzed but neither stored nor logged
+        await get_allowlist().load()
+        results = await BotDetectorService(db).analyze_batch(
+            [{"ip": ips[0], "user_agent": CRAWLER_UA, "timestamp": 1700000002.0}], "report_publisher"
+        )
+        assert results[0]["allowlisted"] == "cidr" and results[0]["is_bot"] is False
+        assert len(_logged(db)) == 2
+        assert not await client.exists(f"requests:report_publisher:{ips[0]}")
+    finally:
+        await session_manager.end_session(session_id)
+        for publisher in ("report_publisher", "other_publisher"):
+            digest = await client.get(f"publisher:{publisher}:api_key")
+            await client.delete(f"publisher:{publisher}:api_key", f"api_key:{digest}")
+        await _clear_detection_state(client, "report_publisher", ips)
+        db.close()
+        await client.connection_pool.disconnect()
@@ -0,0 +1,43 @@
+import pytest
+from bs4 import BeautifulSoup
+from api.token_metering.content import NON_CONTENT_TAGS, TEXT_TAGS, clean_and_type_content, extract_text
+
+def beautifulsoup_text(content):
+    """The tree-based extraction extract_text replaces"""
+    soup = BeautifulSoup(content, 'html.parser')
+    for tag in soup(NON_CONTENT_TAGS):
+        tag.decompose()
+    return ' '.join([
+        (tag.get_text(strip=True) + '. ')
+        for tag in soup.find_all(TEXT_TAGS)
+        if tag.get_text(strip=True)
+    ]).strip()
+
+@pytest.mark.parametrize("content", [
+    # Typical article markup
+    "<html><head><title>T</title><meta charset='utf-8'><style>p{color:red}</style></head><body>"
+    "<h1>Headline</h1><p>First <a href='/x'>linked</a> paragraph.</p><script>var p = '<p>no</p>';</script>"
+    "<ul><li>One</li><li>Two <b>bold</b></li></ul></body></html>",
+    # Nested text elements count their text once per element
+    "<body><ul><li><p>Inner</p> tail</li></ul><p>a<p>b</p>c</p></body>",
+    # Unclosed and stray end tags
+    "<body><li>one<li>two</ul></li></p><h2>open",
+    # Non-content elements drop the text elements inside them
+    "<body><noscript><p>enable js</p></noscript><p>before<iframe>x</iframe>after</p></body>",
+    # Strings are stripped whole, entities and character references included
+    "<body><p>  fish &amp; chips&nbsp;&#150;&#x41;&bogus;  </p><p> a<!-- note -->b </p><p>x<br>y</br>z</p></body>",
+    # Templates and ruby annotations are not plain text; CDATA is
+    "<body><p>漢<rt>kan</rt>字</p><template><p>hidden</p></template><p><![CDATA[raw]]> text</p></body>",
+])
+def test_extract_text_matches_beautifulsoup(content):
+    """Test streaming extraction gives the same text as the BeautifulSoup tree"""
+    assert extract_text(content) == beautifulsoup_text(content)
+
+def test_clean_and_type_content():
+    """Test HTML is reduced to its text and other content is typed"""
+    assert clean_and_type_content("<html><body><h1>Title</h1><div>menu</div><p>Body</p></body></html>") == (
+        "Title.  Body.", 'text/html'
+    )
+    assert clean_and_type_content('{"a": 1}') == ('{"a": 1}', 'application/json')
+    assert clean_and_type_content('<?xml version="1.0"?><a/>') == ('<?xml version="1.0"?><a/>', 'application/xml')
+    assert clean_and_type_content("plain words") == ("plain words", 'text/plain')
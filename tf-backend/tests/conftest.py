@@ -0,0 +1,64 @@
+# tf-backend/tests/conftest.py
+
+import os
+import pytest
+import redis
+from core.config import get_settings
+
+settings = get_settings()
+
+# Tests never use the configured Redis database. This runs before any test
+# module is imported, so every client, including the module-level
+# singletons, connects to the test databases instead.
+TEST_REDIS_DB = int(os.getenv("TEST_REDIS_DB", "15"))
+TEST_DETECTION_REDIS_DB = int(os.getenv("TEST_DETECTION_REDIS_DB", "14"))
+CONFIGURED_REDIS_DB = settings.REDIS_DB
+
+settings.REDIS_DB = TEST_REDIS_DB
+settings.DETECTION_REDIS_DB = None
+
+def _client(db: int) -> redis.Redis:
+    return redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=db
+    )
+
+@pytest.fixture(scope="session", autouse=True)
+def redis_test_dbs():
+    """
+    The (shared, detection state) Redis databases tests use, checked to
+    be distinct from the configured database and empty before any test
+    writes to them
+    """
+    dbs = (TEST_REDIS_DB, TEST_DETECTION_REDIS_DB)
+    if CONFIGURED_REDIS_DB in dbs or TEST_REDIS_DB == TEST_DETECTION_REDIS_DB:
+        pytest.exit(f"TEST_REDIS_DB and TEST_DETECTION_REDIS_DB must be two databases other than "
+                    f"REDIS_DB ({CONFIGURED_REDIS_DB})", returncode=1)
+
+    for db in dbs:
+        client = _client(db)
+        try:
+            if client.dbsize():
+                pytest.exit(f"Redis test database {db} is not empty; point TEST_REDIS_DB and "
+                            f"TEST_DETECTION_REDIS_DB at unused databases", returncode=1)
+        except redis.ConnectionError:
+            pass # Tests that need Redis fail on their own
+        finally:
+            client.close()
+
+    return dbs
+
+@pytest.fixture(autouse=True)
+def _empty_redis_test_dbs(redis_test_dbs):
+    """Leave the test databases empty for the next test"""
+    yield
+    for db in redis_test_dbs:
+        client = _client(db)
+        try:
+            client.flushdb()
+        except redis.ConnectionError:
+            pass
+        finally:
+            client.close()
@@ -0,0 +1,84 @@
+import gzip
+import json
+import pytest
+from core.access_logs import AccessLogReader, parse_combined, parse_json, parse_timestamp
+
+COMBINED_LINE = (
+    '66.249.66.1 - - [10/Oct/2025:13:55:36 +0000] "GET /article/1?page=2 HTTP/1.1" 200 5120 '
+    '"https://example.com/" "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"'
+)
+
+def test_parse_combined_line():
+    """Test a combined log line becomes a request descriptor"""
+    descriptor = parse_combined(COMBINED_LINE)
+
+    assert descriptor == {
+        'ip': "66.249.66.1",
+        'user_agent': "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+        'headers': {
+            'user-agent': "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+            'referer': "https://example.com/"
+        },
+        'path': "/article/1?page=2",
+        'method': "GET",
+        'timestamp': 1760104536.0
+    }
+
+def test_parse_combined_escaped_and_missing_fields():
+    """Test escaped quotes are restored and "-" fields are left out"""
+    escaped = parse_combined('10.0.0.1 - - [10/Oct/2025:13:55:36 +0200] "POST /x HTTP/1.1" 404 0 "-" "say \\"hi\\" bot"')
+    assert escaped['user_agent'] == 'say "hi" bot'
+    assert escaped['headers'] == {'user-agent': 'say "hi" bot'}
+    assert escaped['timestamp'] == 1760104536.0 - 7200
+
+    # Common log format, without referer and user agent
+    common = parse_combined('10.0.0.1 - - [10/Oct/2025:13:55:36 +0000] "GET / HTTP/1.0" 200 12')
+    assert common['user_agent'] == ""
+    assert common['headers'] == {}
+
+    assert parse_combined('not an access log line') is None
+
+def test_parse_json_line():
+    """Test nginx-style JSON fields, the request line and extra headers"""
+    descriptor = parse_json(json.dumps({
+        'remote_addr': "10.0.0.2",
+        'time_iso8601': "2025-10-10T13:55:36+00:00",
+        'request': "HEAD /feed.xml HTTP/2.0",
+        'http_user_agent': "curl/8.4.0",
+        'headers': {'Accept': "*/*"}
+    }))
+
+    assert descriptor == {
+        'ip': "10.0.0.2",
+        'user_agent': "curl/8.4.0",
+        'headers': {'accept': "*/*", 'user-agent': "curl/8.4.0"},
+        'path': "/feed.xml",
+        'method': "HEAD",
+        'timestamp': 1760104536.0
+    }
+
+    assert parse_json('{"remote_addr": "10.0.0.2"}') is None
+    assert parse_json('[1, 2]') is None
+
+@pytest.mark.parametrize("value", [1760104536, 1760104536000, "1760104536", "2025-10-10T13:55:36Z", "10/Oct/2025:13:55:36 +0000"])
+def test_parse_timestamp_formats(value):
+    """Test epoch seconds and milliseconds, ISO 8601 and combined log times"""
+    assert parse_timestamp(value) == 1760104536.0
+
+def test_access_log_reader_streams_gzip_and_counts_skipped(tmp_path):
+    """Test gzipped and plain files are read in order with the format detected per file"""
+    combined = tmp_path / "access.log.gz"
+    with gzip.open(combined, "wt") as f:
+        f.write(COMBINED_LINE + "\n\ngarbage\n")
+    structured = tmp_path / "access.json"
+    structured.write_text(json.dumps({'ip': "10.0.0.3", 'timestamp': 1760104600, 'path': "/a"}) + "\n")
+
+    reader = AccessLogReader([str(combined), str(structured)])
+    descriptors = list(reader)
+
+    assert [d['ip'] for d in descriptors] == ["66.249.66.1", "10.0.0.3"]
+    assert reader.lines == 3
+    assert reader.skipped == 1
+
+    with pytest.raises(ValueError):
+        AccessLogReader([str(combined)], "w3c")
@@ -0,0 +1,11 @@
+from core.bloom import BloomFilter
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    """Test every added item is found and unknown items rarely are"""
+    bloom = BloomFilter(10000, error_rate=0.01)
+    bloom.update(f"pub\x00ip:10.0.{i // 256}.{i % 256}" for i in range(10000))
+
+    assert len(bloom) == 10000
+    assert all(f"pub\x00ip:10.0.{i // 256}.{i % 256}" in bloom for i in range(10000))
+    false_positives = sum(f"other\x00ip:10.0.{i // 256}.{i % 256}" in bloom for i in range(10000))
+    assert false_positives < 200
@@ -0,0 +1,68 @@
+import pytest
+import core.cache
+from core.cache import LRUCache, TTLCache, freeze, thaw
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test capacity bound and eviction order"""
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    
+    # Touch "a" so "b" becomes least recently used
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 0
+
+def test_lru_cache_counts_misses():
+    """Test miss counter and default value"""
+    cache = LRUCache(1)
+    assert cache.get("missing") is None
+    assert cache.get("missing", "default") == "default"
+    assert cache.stats()["misses"] == 2
+
+def test_freeze_makes_values_read_only():
+    """Test that frozen values cannot be modified by callers"""
+    frozen = freeze({"browser": {"family": "Chrome"}, "tags": ["a", "b"]})
+    
+    with pytest.raises(TypeError):
+        frozen["browser"]["family"] = "Firefox"
+    
+    assert frozen["tags"] == ("a", "b")
+
+def test_thaw_restores_plain_values():
+    """Test thawed values are plain dicts and lists again"""
+    value = {"browser": {"family": "Chrome"}, "tags": ["a", "b"]}
+    thawed = thaw({"results": freeze(value)})
+    
+    assert thawed == {"results": value}
+    assert type(thawed["results"]["browser"]) is dict
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    """Test entries expire after the TTL and are counted as misses"""
+    now = [100.0]
+    monkeypatch.setattr(core.cache.time, "monotonic", lambda: now[0])
+    
+    cache = TTLCache(10, ttl=5)
+    cache.put("a", 1)
+    
+    now[0] = 104.9
+    assert cache.get("a") == 1
+    
+    now[0] = 105.0
+    assert "a" not in cache
+    assert cache.get("a") is None
+    
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expirations"] == 1
+    assert stats["size"] == 0
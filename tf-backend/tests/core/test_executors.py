@@ -0,0 +1,38 @@
+import asyncio
+import os
+import threading
+from core.executors import OffloadExecutor
+
+async def test_offload_executor_routes_by_size():
+    """Test small jobs run in threads and large ones in another process"""
+    executor = OffloadExecutor(threads=2, processes=1, process_threshold=1024)
+    try:
+        assert await executor.run(os.getpid, size=100) == os.getpid()
+        assert await executor.run(os.getpid, size=4096) != os.getpid()
+        
+        stats = executor.stats()
+        assert stats["thread"]["completed"] == 1
+        assert stats["process"]["completed"] == 1
+    finally:
+        executor.shutdown()
+
+async def test_offload_executor_limits_concurrency_and_counts_waiting():
+    """Test jobs beyond the lane's workers wait and show up in its queue depth"""
+    executor = OffloadExecutor(threads=1, processes=0, process_threshold=1024)
+    release = threading.Event()
+    try:
+        jobs = [asyncio.create_task(executor.run(release.wait, size=10**6)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        
+        # Without a process lane even large jobs run in threads
+        assert executor.stats() == {
+            "thread": {"workers": 1, "waiting": 2, "running": 1, "completed": 0, "failed": 0}
+        }
+        assert 'tf_offload_waiting{lane="thread"} 2' in executor.render()
+        
+        release.set()
+        assert await asyncio.gather(*jobs) == [True, True, True]
+        assert executor.stats()["thread"]["completed"] == 3
+    finally:
+        release.set()
+        executor.shutdown()
@@ -0,0 +1,87 @@
+import random
+import threading
+from core.ingestion import RequestLogBuffer, RequestLogSampler, persisted
+
+def _rows(publisher_id, count, bot_every=10):
+    return [
+        {'publisher_id': publisher_id, 'is_bot': i % bot_every == 0, 'ip_address': f"10.0.{i // 256 % 256}.{i % 256}"}
+        for i in range(count)
+    ]
+
+def test_request_log_sampler_keeps_bots_and_weights_humans():
+    """Test bots are always kept and weighted sums stay close to the true count"""
+    sampler = RequestLogSampler(10, rng=random.Random(18))
+    rows = sampler.apply(_rows("pub", 50000))
+    kept = persisted(rows)
+
+    assert all(row['sample_weight'] == 1.0 for row in rows if row['is_bot'])
+    assert {row['sample_weight'] for row in rows if not row['is_bot']} == {0.0, 10.0}
+    assert len(kept) < len(rows) / 4
+    assert abs(sum(row['sample_weight'] for row in kept) - len(rows)) / len(rows) < 0.03
+
+async def test_request_log_sampler_publisher_override():
+    """Test a publisher's own rate replaces the default and every rate is cached, off the loop"""
+    lookups = []
+    def lookup_rates(publisher_ids):
+        lookups.append((publisher_ids, threading.get_ident()))
+        return {"keep_all": 1, "default": None}
+
+    sampler = RequestLogSampler(10, lookup_rates=lookup_rates, rng=random.Random(18))
+    rows = await sampler.sample(_rows("keep_all", 1000) + _rows("default", 1000) + _rows("unknown", 1000))
+
+    assert all(row['sample_weight'] == 1.0 for row in rows if row['publisher_id'] == "keep_all")
+    assert any(row['sample_weight'] == 0.0 for row in rows if row['publisher_id'] == "default")
+    assert any(row['sample_weight'] == 0.0 for row in rows if row['publisher_id'] == "unknown")
+
+    # Publishers without their own rate are not looked up again
+    await sampler.sample(_rows("keep_all", 10) + _rows("unknown", 10))
+    assert [publisher_ids for publisher_ids, _ in lookups] == [["default", "keep_all", "unknown"]]
+    assert lookups[0][1] != threading.get_ident()
+
+    # Applying never looks rates up
+    sampler.apply(_rows("new", 10))
+    assert len(lookups) == 1
+
+async def test_request_log_buffer_samples_as_it_flushes():
+    """Test queued rows are sampled by the flush task, not when they are queued"""
+    sampler = RequestLogSampler(1000000, lookup_rates=lambda publisher_ids: {}, rng=random.Random(18))
+    buffer = RequestLogBuffer(batch_size=100, flush_interval=0.01, max_pending=1000, sampler=sampler)
+    rows = _rows("pub", 50, bot_every=1000)[1:]
+
+    await buffer.start()
+    await buffer.put_many(rows)
+    await buffer.stop()
+
+    assert sampler.rates.get("pub") == 1000000
+    assert buffer.rows_sampled_out == len(rows)
+    assert buffer.rows_written == 0
+
+async def test_request_log_buffer_survives_failed_flushes(monkeypatch):
+    """Test a failing insert is retried, a failing rate lookup falls back to the default, and the task keeps going"""
+    inserted, failures = [], [2]
+    def insert_rows(rows):
+        if failures[0]:
+            failures[0] -= 1
+            raise RuntimeError("database unavailable")
+        inserted.extend(rows)
+    monkeypatch.setattr("core.ingestion._insert_rows", insert_rows)
+
+    def lookup_rates(publisher_ids):
+        raise RuntimeError("lookup failed")
+    sampler = RequestLogSampler(1, lookup_rates=lookup_rates)
+    buffer = RequestLogBuffer(batch_size=10, flush_interval=0.01, max_pending=1000, sampler=sampler,
+                              insert_attempts=3, retry_delay=0.001)
+
+    await buffer.start()
+    await buffer.put_many(_rows("pub", 10))
+    await buffer.stop()
+    assert len(inserted) == buffer.rows_written == 10
+    assert buffer.rows_dropped == 0
+
+    # Past the last attempt the batch is dropped and the task carries on
+    failures[0] = 3
+    await buffer.start()
+    await buffer.put_many(_rows("pub", 20))
+    await buffer.stop()
+    assert buffer.rows_dropped == 10
+    assert len(inserted) == buffer.rows_written == 20
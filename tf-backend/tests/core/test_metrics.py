@@ -0,0 +1,30 @@
+from core.metrics import StageMetrics, NullStageMetrics
+
+def test_stage_metrics_histograms():
+    """Test observations land in the right buckets and render as Prometheus text"""
+    metrics = StageMetrics(buckets=(0.001, 0.01))
+    now = metrics.start()
+
+    metrics.observe("ua_parse", now)
+    metrics.observe("redis_write", now - 5_000_000)
+    metrics.observe("redis_write", now - 50_000_000)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["ua_parse"]["buckets"] == [1, 0, 0]
+    assert snapshot["redis_write"]["buckets"] == [0, 1, 1]
+    assert snapshot["redis_write"]["count"] == 2
+    assert snapshot["redis_write"]["sum"] >= 0.055
+
+    text = metrics.render()
+    assert "# TYPE tf_detection_stage_seconds histogram" in text
+    assert 'tf_detection_stage_seconds_bucket{stage="redis_write",le="0.01"} 1' in text
+    assert 'tf_detection_stage_seconds_bucket{stage="redis_write",le="+Inf"} 2' in text
+    assert 'tf_detection_stage_seconds_count{stage="ua_parse"} 1' in text
+
+def test_null_stage_metrics_records_nothing():
+    """Test disabled metrics accept the same calls and keep nothing"""
+    metrics = NullStageMetrics()
+    metrics.observe("ua_parse", metrics.start())
+
+    assert metrics.snapshot() == {}
+    assert metrics.render() == ""
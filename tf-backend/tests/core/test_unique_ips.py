@@ -0,0 +1,40 @@
+import pytest
+import redis.asyncio
+from datetime import datetime, timedelta, timezone
+from core.config import get_settings
+from core.unique_ips import UniqueIPCounter
+
+def _async_redis_client():
+    settings = get_settings()
+    return redis.asyncio.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+
+async def test_unique_ips_merge_hourly_sketches():
+    """Test unique IPs over a window merge hourly sketches within about 1%"""
+    client = _async_redis_client()
+    counter = UniqueIPCounter(client, retention_hours=2)
+    now = datetime.now(timezone.utc).replace(minute=30)
+    publisher_id = "unique_ips_test_publisher"
+
+    # 5000 IPs per hour over three hours, half of them seen again the next hour
+    rows = []
+    for hour in range(3):
+        timestamp = now - timedelta(hours=hour)
+        for i in range(hour * 2500, hour * 2500 + 5000):
+            rows.append({'publisher_id': publisher_id, 'timestamp': timestamp, 'ip_address': f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"})
+
+    keys = counter.window_keys(publisher_id, now - timedelta(hours=2), now)
+    try:
+        assert await counter.record(rows) == 3
+
+        assert await counter.count(publisher_id, now - timedelta(minutes=10), now) == pytest.approx(5000, rel=0.02)
+        assert await counter.count(publisher_id, now - timedelta(hours=2), now) == pytest.approx(10000, rel=0.02)
+        assert 0 < await client.ttl(keys[0]) <= 7200
+    finally:
+        await client.delete(*keys)
+        await client.aclose()
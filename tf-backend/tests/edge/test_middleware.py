@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from core.session import PUBLISHER_KEY_HEADER
+from edge import DetectionMiddleware, BatchReporter
+
+BROWSER_HEADERS = {
+    "accept-language": "en-US",
+    "accept-encoding": "gzip",
+    "sec-fetch-dest": "document",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-site": "none",
+    "sec-ch-ua": '"Chromium";v="120"',
+}
+
+async def _call(middleware, user_agent, headers=None, ip="198.51.100.7"):
+    """Send one GET through the middleware and return (status, state)"""
+    raw_headers = [(b"user-agent", user_agent.encode())]
+    raw_headers += [(name.encode(), value.encode()) for name, value in (headers or {}).items()]
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/article",
+        "headers": raw_headers,
+        "client": (ip, 4321),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    return messages[0]["status"], scope["state"]["bot_detection"]
+
+async def _app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+async def test_middleware_blocks_ai_crawlers():
+    """Test AI crawlers are blocked and browsers pass through with a verdict"""
+    middleware = DetectionMiddleware(_app, publisher_id="pub", block_ai_crawlers=True)
+
+    status, verdict = await _call(middleware, "Mozilla/5.0 AppleWebKit/537.36 (compatible; GPTBot/1.0)")
+    assert status == 403
+    assert verdict["is_ai_crawler"] is True
+    assert "known_pattern" in verdict["detection_methods"]
+
+    chrome = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+    status, verdict = await _call(middleware, chrome, BROWSER_HEADERS, ip="198.51.100.8")
+    assert status == 200
+    assert verdict["is_bot"] is False
+
+async def test_middleware_reuses_verdicts():
+    """Test repeat clients are served from the local verdict cache"""
+    middleware = DetectionMiddleware(_app, publisher_id="pub")
+
+    for _ in range(5):
+        status, verdict = await _call(middleware, "Mozilla/5.0 (compatible; anthropic-ai/1.0)")
+        assert status == 200
+        assert verdict["bot_name"] == "Anthropic"
+
+    stats = middleware.stats()
+    assert stats["verdict"]["hits"] == 4
+    assert stats["timing"]["size"] == 1
+    assert stats["detections"] is None
+
+async def test_middleware_does_not_share_verdicts_across_header_orders():
+    """Test the same user agent with its headers in another order is classified afresh"""
+    middleware = DetectionMiddleware(_app, publisher_id="pub")
+    chrome = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+
+    await _call(middleware, chrome, BROWSER_HEADERS)
+    await _call(middleware, chrome, dict(reversed(list(BROWSER_HEADERS.items()))))
+    await _call(middleware, chrome, BROWSER_HEADERS)
+
+    stats = middleware.stats()["verdict"]
+    assert stats["hits"] == 1
+    assert stats["size"] == 2
+
+class _RecordingSession:
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, json, timeout):
+        self.posts.append((url, json))
+        return self
+
+    def raise_for_status(self):
+        pass
+
+async def test_batch_reporter_batches_and_flushes_on_stop():
+    """Test events are uploaded in batches and nothing is lost on shutdown"""
+    session = _RecordingSession()
+    reporter = BatchReporter("http://api/report", "detections", "pub", session,
+                             batch_size=3, flush_interval=60)
+    await reporter.start()
+
+    for i in range(7):
+        reporter.submit({"i": i})
+    await asyncio.sleep(0.05)
+    await reporter.stop()
+
+    batches = [body["detections"] for _, body in session.posts]
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert [event["i"] for batch in batches for event in batch] == list(range(7))
+    assert all(body["publisher_id"] == "pub" for _, body in session.posts)
+    assert reporter.stats()["events_sent"] == 7
+
+def test_middleware_sends_the_publisher_key_to_the_api():
+    """Test reporting to the API needs the publisher's key, sent on every call"""
+    with pytest.raises(ValueError):
+        DetectionMiddleware(_app, publisher_id="pub", api_url="http://api")
+
+    middleware = DetectionMiddleware(_app, publisher_id="pub", api_url="http://api", api_key="tfk_test")
+    for session in (middleware.sync.session, middleware.detection_reporter.session, middleware.usage_reporter.session):
+        assert session.headers[PUBLISHER_KEY_HEADER] == "tfk_test"